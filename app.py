@@ -1,5 +1,23 @@
-from performance_chart_generator import create_report_from_file
-from flask import Flask, render_template, jsonify, request, redirect, url_for, send_from_directory
+from chart_scheduler import PrerenderScheduler, read_status_file
+from chart_cache import ChartCache
+from shared_chart_cache import SharedChartCache
+import chart_builder
+import chart_stream
+import fleet_aggregate
+import fleet_series
+import fleet_alerts
+import fast_json
+import json_reports
+import http_cache
+import perf_metrics
+import fleet_storage
+import fleet_rollups
+import warm_state
+import threading
+import atexit
+import time
+from fleet_inventory import get_inventory
+from flask import Flask, render_template, jsonify, request, redirect, url_for, send_from_directory, g, Response
 from datetime import datetime, timedelta
 from collections import defaultdict
 from itertools import groupby
@@ -22,6 +40,54 @@ os.makedirs(charts_folder, exist_ok=True)
 
 site_product_data_map_json = os.path.join(charts_folder, '__site_products_map.json')
 remote_servers = os.path.join(APP_ROOT, 'server_fleet')
+chart_hour_limit = chart_builder.DEFAULT_HOUR_LIMIT
+chart_max_points = chart_builder.DEFAULT_MAX_POINTS
+chart_hours_range = (1, 24 * 92)
+chart_max_points_range = (50, 20000)
+chart_cache_max_bytes = int(os.environ.get('CHART_CACHE_MAX_MB', 64)) * 1024 * 1024
+inventory_page_limit = 1000
+aggregate_max_buckets_range = (10, 5000)
+report_page_rows_range = (1, 5000)
+series_max_points = 2000000
+# live chart streams one worker process keeps open, each holds a server thread (serve.py sets it from --threads)
+stream_max_open = int(os.environ.get('STREAM_MAX_OPEN', 4))
+
+# prepared /v1/fetch_chart bodies (every encoding) keyed by (site, product, hours, max points, data version).
+# serve.py sets SHARED_CHART_CACHE_DIR so every worker process maps the same copy instead of holding its own.
+shared_chart_cache_dir = os.environ.get('SHARED_CHART_CACHE_DIR')
+if shared_chart_cache_dir:
+    chart_cache = SharedChartCache(chart_cache_max_bytes, cache_dir=shared_chart_cache_dir)
+else:
+    chart_cache = ChartCache(chart_cache_max_bytes, size_fn=chart_builder.chart_payload_size)
+
+# /v1/aggregate bodies keyed by (scope, metrics, window, data version), same sharing rules as the charts
+if shared_chart_cache_dir:
+    aggregate_cache = SharedChartCache(chart_cache_max_bytes // 4, cache_dir=os.path.join(shared_chart_cache_dir, 'aggregates'))
+else:
+    aggregate_cache = ChartCache(chart_cache_max_bytes // 4, size_fn=chart_builder.chart_payload_size)
+
+# /v1/fetch_json bodies keyed by (file, page, file version), same sharing rules as the charts
+if shared_chart_cache_dir:
+    report_cache = SharedChartCache(chart_cache_max_bytes // 4, cache_dir=os.path.join(shared_chart_cache_dir, 'reports'))
+else:
+    report_cache = ChartCache(chart_cache_max_bytes // 4, size_fn=chart_builder.chart_payload_size)
+
+# started from __main__ (or by a production entry point), see start_prerender_scheduler; it writes
+# its status every poll so workers in other processes can answer /v1/prerender_status
+prerender_scheduler = None
+prerender_status_file = os.path.join(charts_folder, '__prerender_status.json')
+prerender_status_max_age = 60
+
+# every serving process publishes its perf_metrics registry here, /metrics merges them
+metrics_folder = os.environ.get('METRICS_DIR', os.path.join(charts_folder, '__metrics'))
+
+# in-process state (inventory, rollup heads, device windows, the caches above) of a serving process
+# is snapshotted into its own slot of warm_state_file every warm_state_save_seconds and at exit,
+# and read back by start_warm_state, see warm_state.py
+warm_state_file = os.environ.get('WARM_STATE_FILE', os.path.join(charts_folder, '__warm_state.snapshot'))
+warm_state_save_seconds = int(os.environ.get('WARM_STATE_SAVE_SECONDS', 300))
+warm_state_saver = None
+warm_state_slot = None
 
 
 def is_file_older_than_minutes(file_path, minutes):
@@ -58,7 +124,7 @@ def is_file_older_than_minutes(file_path, minutes):
 
 
 def convert_json_to_table(data_is_json):
-    html_table = json2html.convert(json=data_is_json)
+    html_table = json_reports.convert_to_table(data_is_json)
     return html_table
 
 
@@ -71,39 +137,12 @@ def create_chart_site_map(site_map_file_path, just_map_list=False):
         return site_product_data_list
 
 
-    servers_list_file = os.path.join(remote_servers, 'devices.json')
-    with open(servers_list_file, "r", encoding="utf-8") as json_input:
-        servers_data = json.load(json_input)
-
-    sites_list = []
-    products_list = []
-    devices_list = []
-    for item in servers_data:
-        site_name = item["site_name"]
-        product_name = item["product_name"]
-        device_name = item["device_name"]
-        sites_list.append(site_name)
-        products_list.append(product_name)
-        devices_list.append(device_name)
-
-    sites_list = sorted(set(sites_list))
-    products_list = sorted(set(products_list))
-    devices_list = sorted(set(devices_list))
-    print("sites_list:", len(sites_list))
-    print("products_list:", len(products_list))
-    print("devices_list:", len(devices_list))
-
-    site_product_data_list = []
-    z = 0
-    for site_name in sites_list:           
-        for product_name in products_list:
-            k = {
-                "site_name": site_name,
-                "product_name": product_name,
-            }
-            if k not in site_product_data_list:
-                print('adding to site map:'.ljust(30), k)
-                site_product_data_list.append(k)
+    ''' site / product pairs straight from the inventory indexes, no per-pair list scans. '''
+    fleet_inventory = get_inventory(remote_servers)
+    site_product_data_list = fleet_inventory.site_product_pairs()
+    print("sites_list:", len(fleet_inventory.site_products))
+    print("products_list:", len(fleet_inventory.product_sites))
+    print("devices_list:", len(fleet_inventory.devices))
 
     p_site_product_data_map = json.dumps(site_product_data_list, indent=4)
     with open(site_map_file_path, 'w', encoding="utf-8") as f:
@@ -133,6 +172,7 @@ def v1():
 
 @app.route('/v1/fetch_json')  #  methods=['GET', 'POST']
 def fetch_json():
+    ''' report file as json + html table: whole, one page (?offset=&limit=), html only (?json=0) or streamed (?stream=1). '''
     if not request.args.get('file'):
         err_dict = {'api_code': 404, 'message': '?file=<YOUR_FILE.JSON>'}
         return jsonify(err_dict), 404
@@ -141,18 +181,51 @@ def fetch_json():
         json_path_value = os.path.join(json_folder, json_file_name)
 
         if json_file_name.lower().endswith('.json'):
-            with open(json_path_value, 'r') as json_file:
-                data = json.load(json_file)
-            html_table = convert_json_to_table(data)
-            html_table += '\n <br><br>end of content...'
-
-            success_dict = {
-                'api_code': 200,
-                'message': "success",
-                'json': data,
-                'html': html_table
-            }
-            return jsonify(success_dict), 200
+            ''' report files only change when replaced on disk, mtime + size is their version. '''
+            try:
+                report_version = json_reports.report_version(json_path_value)
+            except FileNotFoundError:
+                err_dict = {'api_code': 404, 'message': 'file is not available for download.'}
+                return jsonify(err_dict), 404
+
+            if request.args.get('stream', '0') not in ('0', ''):
+                return stream_json_report(json_file_name, json_path_value, report_version)
+
+            paged = 'offset' in request.args or 'limit' in request.args
+            offset = request.args.get('offset', 0, type=int)
+            limit = request.args.get('limit', json_reports.DEFAULT_PAGE_ROWS, type=int)
+            include_json = request.args.get('json', '1') != '0'
+            if offset < 0 or not report_page_rows_range[0] <= limit <= report_page_rows_range[1]:
+                err_dict = {'api_code': 404, 'message': f'offset must be >= 0, limit {report_page_rows_range[0]}-{report_page_rows_range[1]}.'}
+                return jsonify(err_dict), 404
+
+            cache_key = (json_file_name, paged, offset, limit, include_json, report_version)
+            json_etag = http_cache.make_etag(*cache_key)
+            if http_cache.is_not_modified(json_etag):
+                return http_cache.not_modified_response(json_etag, http_cache.JSON_FILE_CACHE_CONTROL)
+
+            def build_report_payload():
+                ''' converted once per file version and page, every encoding prepared up front. '''
+                with perf_metrics.phase('read_json'):
+                    data = json_reports.load_report(json_path_value)
+                success_dict = {'api_code': 200, 'message': "success"}
+                if paged:
+                    data, total_rows = json_reports.page_document(data, offset, limit)
+                    next_offset = offset + limit if total_rows is not None and offset + limit < total_rows else None
+                    success_dict.update({'offset': offset, 'limit': limit, 'total_rows': total_rows, 'next_offset': next_offset})
+                with perf_metrics.phase('json2html'):
+                    html_table = json_reports.convert_to_table(data)
+                if not paged:
+                    html_table += '\n <br><br>end of content...'
+                if include_json:
+                    success_dict['json'] = data
+                success_dict['html'] = html_table
+                with perf_metrics.phase('encode'):
+                    return http_cache.compress_variants(fast_json.dumps_bytes(success_dict))
+
+            with perf_metrics.phase('report_cache'):
+                report_payload = report_cache.get_or_build(cache_key, build_report_payload)
+            return http_cache.encoded_response(report_payload, json_etag, http_cache.JSON_FILE_CACHE_CONTROL)
 
         else:
             print('ERROR: file name:', f'[{json_file_name}]')
@@ -160,6 +233,32 @@ def fetch_json():
             return jsonify(err_dict)
 
 
+def stream_json_report(json_file_name, json_path_value, report_version):
+    ''' the html table alone, sent while it converts; once complete it is cached and later requests get it whole. '''
+    cache_key = (json_file_name, 'stream', report_version)
+    stream_etag = http_cache.make_etag(*cache_key)
+    cached_html = report_cache.get(cache_key)
+    if cached_html is not None:
+        return http_cache.encoded_response(cached_html, stream_etag, http_cache.JSON_FILE_CACHE_CONTROL, mimetype='text/html')
+    if http_cache.is_not_modified(stream_etag):
+        return http_cache.not_modified_response(stream_etag, http_cache.JSON_FILE_CACHE_CONTROL)
+
+    def generate():
+        parts = []
+        for html_chunk in json_reports.iter_table_html(json_reports.load_report(json_path_value)):
+            parts.append(html_chunk)
+            yield html_chunk
+        parts.append('\n <br><br>end of content...')
+        yield parts[-1]
+        report_cache.put(cache_key, http_cache.compress_variants(''.join(parts).encode('utf-8')))
+
+    response = Response(generate(), mimetype='text/html')
+    response.set_etag(stream_etag)
+    response.headers['Cache-Control'] = http_cache.JSON_FILE_CACHE_CONTROL
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @app.route('/v1/fetch_chart')
 def fetch_chart():
 
@@ -175,67 +274,306 @@ def fetch_chart():
     else:
         chart_product_name = request.args.get('product_name')        
 
-    file_name_base = f'{chart_site_name}__{chart_product_name}'
-    chart_html_file = os.path.join(charts_folder, f'{file_name_base}.html')
-    chart_json_file = os.path.join(charts_folder, f'{file_name_base}.json')
-    
-    regen_html_json = False
-    if not os.path.exists(chart_html_file):
-        regen_html_json = True
-    else:
-        is_old = is_file_older_than_minutes(chart_html_file, 5)
-        if is_old:
-            regen_html_json = True
+    ''' optional window and point budget, the defaults are what the pre-render scheduler prepares. '''
+    hour_limit = request.args.get('hours', chart_hour_limit, type=int)
+    max_points = request.args.get('max_points', chart_max_points, type=int)
+    if not chart_hours_range[0] <= hour_limit <= chart_hours_range[1] or not chart_max_points_range[0] <= max_points <= chart_max_points_range[1]:
+        err_dict = {
+            'api_code': 404,
+            'message': f'hours must be {chart_hours_range[0]}-{chart_hours_range[1]}, max_points {chart_max_points_range[0]}-{chart_max_points_range[1]}.'
+        }
+        return jsonify(err_dict), 404
 
-    if not os.path.exists(chart_json_file):
-        regen_html_json = True
-    else:
-        is_old = is_file_older_than_minutes(chart_json_file, 5)
-        if is_old:
-            regen_html_json = True    
-    
-    if regen_html_json:
-
-        servers_list_file = os.path.join(remote_servers, 'devices.json')
-        with open(servers_list_file, "r", encoding="utf-8") as json_input:
-            servers_data = json.load(json_input)
-
-        site_product_json = os.path.join(charts_folder, f"{chart_site_name}__{chart_product_name}.json")
-        site__product_stats = []
-        for item in servers_data:
-            if item["site_name"] == chart_site_name and item["product_name"] == chart_product_name:
-                device_name = item["device_name"]
-                device_file = os.path.join(remote_servers, chart_site_name, f'{device_name}.json')
-                print('getting data from server:'.ljust(30), device_name)
-        
-                with open(device_file, "r", encoding="utf-8") as json_input:
-                    server_info = json.load(json_input)
-                stats_dict = {
-                    server_info["device_info"]["device_name"]: server_info["statistics"]
-                }
-                if stats_dict not in site__product_stats:
-                    site__product_stats.append(stats_dict)
-
-        p_site_stats = json.dumps(site__product_stats, indent=4)
-        with open(site_product_json, 'w', encoding="utf-8") as f:
-            f.write(p_site_stats)
-        print('wrote chart data json:'.ljust(30), f"{chart_site_name}__{chart_product_name}.json")
-        
-        ''' generate report from the data '''
-        create_report_from_file(chart_json_file, chart_html_file)        
+    device_names = chart_builder.site_product_device_names(remote_servers, chart_site_name, chart_product_name)
+    data_version = chart_builder.site_product_data_version(remote_servers, chart_site_name, device_names)
+    cache_key = (chart_site_name, chart_product_name, hour_limit, max_points, data_version)
+
+    ''' the etag only depends on the data version, a revalidation costs no chart work at all. '''
+    chart_etag = http_cache.make_etag(*cache_key)
+    if http_cache.is_not_modified(chart_etag):
+        return http_cache.not_modified_response(chart_etag, http_cache.CHART_CACHE_CONTROL)
+
+    def prepared_or_build():
+        ''' the pre-render scheduler normally has the artifact ready, only rebuild when it is behind. '''
+        payload_prepared = chart_builder.read_prepared_chart(
+            charts_folder, chart_site_name, chart_product_name, hour_limit, max_points, data_version)
+        if payload_prepared is not None:
+            return payload_prepared
+        perf_metrics.inc('chart_rebuilds_total', labels={'source': 'request'}, help_text='chart artifacts rebuilt')
+        return chart_builder.build_chart_artifact(
+            remote_servers, charts_folder, chart_site_name, chart_product_name, device_names, hour_limit, max_points, data_version)
+
+    ''' one rebuild per key, concurrent requests for the same chart wait for it. '''
+    with perf_metrics.phase('chart_cache'):
+        chart_payload = chart_cache.get_or_build(cache_key, prepared_or_build)
+    return http_cache.encoded_response(chart_payload, chart_etag, http_cache.CHART_CACHE_CONTROL)
+
+
+@app.route('/v1/stream_chart')
+def stream_chart():
+    ''' Server-Sent Events with the points each device ingested after ?since=<epoch> (or Last-Event-ID). '''
+    chart_site_name = request.args.get('site_name')
+    chart_product_name = request.args.get('product_name')
+    if not chart_site_name or not chart_product_name or chart_product_name == "undefined":
+        err_dict = {'api_code': 404, 'message': '?site_name=<SITE_NAME>&product_name=<PRODUCT_NAME>&since=<EPOCH>'}
+        return jsonify(err_dict), 404
 
-    ''' we have report, just return parsed html content. '''
-    html_content = "<p>no data</p>"
-    with open(chart_html_file, 'r') as html_file:
-        html_content = html_file.read()
+    hour_limit = request.args.get('hours', chart_hour_limit, type=int)
+    since = request.headers.get('Last-Event-ID', request.args.get('since'))
+    try:
+        since = int(float(since)) if since else None
+    except ValueError:
+        err_dict = {'api_code': 404, 'message': 'since must be an epoch in seconds.'}
+        return jsonify(err_dict), 404
+
+    device_names = chart_builder.site_product_device_names(remote_servers, chart_site_name, chart_product_name)
+    if not device_names:
+        err_dict = {'api_code': 404, 'message': f'no devices for {chart_site_name} : {chart_product_name}'}
+        return jsonify(err_dict), 404
 
-    success_dict = {
+    ''' every slot taken: one poll instead of a stream, the browser comes back after the fallback retry. '''
+    if chart_stream.open_stream(stream_max_open):
+        events = chart_stream.iter_chart_events(remote_servers, chart_site_name, device_names, since, hour_limit)
+        on_close = chart_stream.close_stream
+    else:
+        events = chart_stream.iter_chart_events(
+            remote_servers, chart_site_name, device_names, since, hour_limit,
+            max_seconds=0, retry_ms=chart_stream.STREAM_FALLBACK_RETRY_MS)
+        on_close = None
+        perf_metrics.inc('chart_stream_fallback_polls_total', help_text='stream requests answered with one poll, every stream slot taken')
+    response = Response(events, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+    if on_close is not None:
+        response.call_on_close(on_close)
+    return response
+
+
+@app.route('/v1/aggregate', methods=['GET'])
+def aggregate():
+    ''' min/p50/p95/p99/max per time bucket across a site, a product, both, or the whole fleet (no filters). '''
+    site_name = request.args.get('site_name') or None
+    product_name = request.args.get('product_name') or None
+    metrics = [m for m in request.args.get('metrics', '').split(',') if m] or fleet_storage.METRIC_NAMES
+    hour_limit = request.args.get('hours', chart_hour_limit, type=int)
+    step = request.args.get('step', None, type=int)
+    max_buckets = request.args.get('max_buckets', fleet_aggregate.DEFAULT_MAX_BUCKETS, type=int)
+
+    unknown_metrics = [m for m in metrics if m not in fleet_storage.METRIC_COLUMNS]
+    if unknown_metrics:
+        return jsonify({'api_code': 404, 'message': f'unknown metrics: {", ".join(unknown_metrics)}'}), 404
+    if not chart_hours_range[0] <= hour_limit <= chart_hours_range[1] or not aggregate_max_buckets_range[0] <= max_buckets <= aggregate_max_buckets_range[1]:
+        err_dict = {
+            'api_code': 404,
+            'message': f'hours must be {chart_hours_range[0]}-{chart_hours_range[1]}, max_buckets {aggregate_max_buckets_range[0]}-{aggregate_max_buckets_range[1]}.'
+        }
+        return jsonify(err_dict), 404
+    if step is not None and not 60 <= step <= hour_limit * 3600:
+        return jsonify({'api_code': 404, 'message': 'step must be at least 60 seconds and at most the window.'}), 404
+
+    with perf_metrics.phase('inventory'):
+        devices = get_inventory(remote_servers).query(site_name=site_name, product_name=product_name)
+    if not devices:
+        return jsonify({'api_code': 404, 'message': 'no devices match site_name / product_name.'}), 404
+    with perf_metrics.phase('data_version'):
+        data_version = fleet_aggregate.aggregate_data_version(remote_servers, devices)
+    cache_key = ('aggregate', site_name, product_name, tuple(metrics), hour_limit, step, max_buckets, data_version)
+    aggregate_etag = http_cache.make_etag(*cache_key)
+    if http_cache.is_not_modified(aggregate_etag):
+        return http_cache.not_modified_response(aggregate_etag, http_cache.CHART_CACHE_CONTROL)
+
+    def build_aggregate():
+        with perf_metrics.phase('aggregate'):
+            result = fleet_aggregate.aggregate_devices(remote_servers, devices, metrics, hour_limit, max_buckets, step)
+        success_dict = {
+            'api_code': 200,
+            'message': "success",
+            'site_name': site_name,
+            'product_name': product_name,
+            'hours': hour_limit,
+            **result,
+        }
+        with perf_metrics.phase('encode'):
+            return http_cache.compress_variants(json.dumps(success_dict).encode('utf-8'))
+
+    aggregate_payload = aggregate_cache.get_or_build(cache_key, build_aggregate)
+    return http_cache.encoded_response(aggregate_payload, aggregate_etag, http_cache.CHART_CACHE_CONTROL)
+
+
+@app.route('/v1/series', methods=['GET'])
+def series():
+    ''' raw or step averaged series of some metrics for device_name=a,b or a site / product, as columnar json or binary. '''
+    device_names = [name for name in request.args.get('device_name', '').split(',') if name]
+    site_name = request.args.get('site_name') or None
+    product_name = request.args.get('product_name') or None
+    metrics = [m for m in request.args.get('metrics', '').split(',') if m] or fleet_storage.METRIC_NAMES
+    hour_limit = request.args.get('hours', chart_hour_limit, type=int)
+    step = request.args.get('step', None, type=int)
+    series_format = request.args.get('format', 'json')
+
+    unknown_metrics = [m for m in metrics if m not in fleet_storage.METRIC_COLUMNS]
+    if unknown_metrics:
+        return jsonify({'api_code': 404, 'message': f'unknown metrics: {", ".join(unknown_metrics)}'}), 404
+    if series_format not in fleet_series.SERIES_FORMATS:
+        return jsonify({'api_code': 404, 'message': f'format must be one of {", ".join(fleet_series.SERIES_FORMATS)}.'}), 404
+    if not device_names and not site_name and not product_name:
+        return jsonify({'api_code': 404, 'message': '?device_name=<A,B> or ?site_name=<SITE_NAME>&product_name=<PRODUCT_NAME>'}), 404
+    try:
+        end = fleet_series.parse_time(request.args['end']) if request.args.get('end') else int(time.time())
+        start = fleet_series.parse_time(request.args['start']) if request.args.get('start') else end - hour_limit * 3600
+    except ValueError:
+        return jsonify({'api_code': 404, 'message': 'start / end must be epoch seconds or "YYYY-MM-DD HH:MM:SS".'}), 404
+    if not 0 <= end - start <= chart_hours_range[1] * 3600:
+        return jsonify({'api_code': 404, 'message': f'start must be before end, at most {chart_hours_range[1]} hours apart.'}), 404
+    if step is not None and not 60 <= step <= max(60, end - start):
+        return jsonify({'api_code': 404, 'message': 'step must be at least 60 seconds and at most the window.'}), 404
+
+    with perf_metrics.phase('inventory'):
+        fleet_inventory = get_inventory(remote_servers)
+        if device_names:
+            devices = [d for name in device_names for d in fleet_inventory.query(device_name=name)]
+            devices = [d for d in devices if site_name in (None, d["site_name"]) and product_name in (None, d["product_name"])]
+        else:
+            devices = fleet_inventory.query(site_name=site_name, product_name=product_name)
+    if not devices:
+        return jsonify({'api_code': 404, 'message': 'no devices match device_name / site_name / product_name.'}), 404
+    if fleet_series.estimated_points(len(devices), start, end, step) > series_max_points:
+        return jsonify({'api_code': 404, 'message': f'more than {series_max_points} points per metric, narrow the window or set a step.'}), 404
+
+    with perf_metrics.phase('data_version'):
+        data_version = fleet_aggregate.aggregate_data_version(remote_servers, devices)
+    series_etag = http_cache.make_etag('series', tuple(d["device_name"] for d in devices), tuple(metrics), start, end, step, series_format, data_version)
+    if http_cache.is_not_modified(series_etag):
+        return http_cache.not_modified_response(series_etag, http_cache.CHART_CACHE_CONTROL)
+
+    with perf_metrics.phase('read_devices'):
+        result = fleet_series.read_series(remote_servers, devices, metrics, start, end, step)
+    with perf_metrics.phase('encode'):
+        if series_format == 'binary':
+            return http_cache.compressed_response(
+                fleet_series.series_binary(result), series_etag, http_cache.CHART_CACHE_CONTROL, mimetype='application/octet-stream')
+        success_dict = {'api_code': 200, 'message': "success", **fleet_series.series_json(result)}
+        return http_cache.compressed_response(fast_json.dumps_bytes(success_dict), series_etag, http_cache.CHART_CACHE_CONTROL)
+
+
+@app.route('/v1/alerts', methods=['GET'])
+def alerts():
+    ''' firing alerts as of the last ingest cycle, filtered by site_name, product_name, device_name, severity. '''
+    filters = {
+        key: request.args.get(key) for key in ('site_name', 'product_name', 'device_name')
+        if request.args.get(key)
+    }
+    severity = request.args.get('severity')
+    devices = []
+    for entry in fleet_alerts.read_alert_summary(remote_servers).values():
+        if any(entry.get(key) != value for key, value in filters.items()):
+            continue
+        device_alerts = [a for a in entry["alerts"] if severity is None or a["severity"] == severity]
+        if device_alerts:
+            devices.append({**entry, 'alerts': device_alerts})
+    devices.sort(key=lambda d: (d['site_name'], d['device_name']))
+
+    counts = {}
+    for entry in devices:
+        for alert in entry['alerts']:
+            counts[alert['severity']] = counts.get(alert['severity'], 0) + 1
+    return jsonify({
         'api_code': 200,
-        'message': "success",
-        'chart_path_value': chart_html_file,
-        'html': html_content
+        'message': 'success',
+        'filters': filters,
+        'counts': counts,
+        'devices': devices,
+        'rules': fleet_alerts.load_rules(),
+    })
+
+
+def current_prerender_status():
+    ''' the scheduler of this process, else the one serve.py runs in its own process. '''
+    if prerender_scheduler is not None:
+        return prerender_scheduler.status()
+    return read_status_file(prerender_status_file, prerender_status_max_age)
+
+
+@app.route('/v1/prerender_status', methods=['GET'])
+def prerender_status():
+    status = current_prerender_status()
+    if status is None:
+        return jsonify({'api_code': 200, 'message': 'pre-render scheduler is not running.', 'status': None})
+    return jsonify({'api_code': 200, 'message': 'success', 'status': status})
+
+
+def update_process_metrics():
+    ''' mirrors the stats kept outside the registry (cache counters, open streams, ...) into it. '''
+    for key, value in chart_cache.stats().items():
+        if key in ('hits', 'misses', 'coalesced', 'builds', 'evictions'):
+            perf_metrics.set_counter(f'chart_cache_{key}_total', value, help_text=f'chart cache {key}')
+        elif key != 'hit_rate':
+            perf_metrics.set_gauge(f'chart_cache_{key}', value, help_text=f'chart cache {key}')
+    perf_metrics.set_gauge('inventory_loads', get_inventory(remote_servers).loads, help_text='devices.json (re)loads', merge='sum')
+    perf_metrics.set_gauge('chart_streams_open', chart_stream.open_streams(), help_text='open live chart streams', merge='sum')
+
+
+def start_metrics_publisher():
+    ''' publishes this process' registry for the /metrics of the others (every worker, the scheduler process). '''
+    return perf_metrics.start_publisher(metrics_folder, before_write=update_process_metrics)
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    ''' Prometheus text format over every process of the host: request / phase histograms, chart cache, rebuilds, pre-render jobs and the ingest loop. '''
+    update_process_metrics()
+    status = current_prerender_status()
+    if status is not None:
+        for status_name, count in status["counts"].items():
+            perf_metrics.set_gauge('prerender_jobs', count, labels={'status': status_name}, help_text='pre-render jobs by status')
+    firing = {}
+    for entry in fleet_alerts.read_alert_summary(remote_servers).values():
+        for alert in entry["alerts"]:
+            firing[alert["severity"]] = firing.get(alert["severity"], 0) + 1
+    for severity, count in firing.items():
+        perf_metrics.set_gauge('alerts_firing', count, labels={'severity': severity}, help_text='firing alerts by severity')
+
+    snapshots = perf_metrics.read_process_files(metrics_folder)
+    snapshots.append(perf_metrics.read_snapshot_file(os.path.join(remote_servers, fleet_storage.INGEST_METRICS_FILE)))
+    ''' the hit rate of the merged counters, not the one of whichever worker answered. '''
+    merged = perf_metrics.merge_snapshots(*snapshots, perf_metrics.snapshot())
+    totals = {
+        key: sum(value for _, value in merged.get(f'chart_cache_{key}_total', {}).get("series", []))
+        for key in ('hits', 'misses', 'coalesced')
+    }
+    lookups = sum(totals.values())
+    perf_metrics.set_gauge('chart_cache_hit_rate', round(totals['hits'] / lookups, 4) if lookups else 0.0, help_text='chart cache hit_rate')
+    return Response(perf_metrics.render_prometheus(*snapshots), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/v1/inventory', methods=['GET'])
+def inventory():
+    ''' query the device inventory: site_name, product_name, environment, device_name filters, paged with offset/limit. '''
+    fleet_inventory = get_inventory(remote_servers)
+    filters = {
+        key: request.args.get(key) for key in ('site_name', 'product_name', 'environment', 'device_name')
+        if request.args.get(key)
     }
-    return jsonify(success_dict), 200
+    if not filters and request.args.get('devices') is None:
+        return jsonify({'api_code': 200, 'message': 'success', 'summary': fleet_inventory.summary()})
+
+    try:
+        offset = int(request.args.get('offset', 0))
+        limit = int(request.args.get('limit', inventory_page_limit))
+    except ValueError:
+        offset = limit = None
+    if offset is None or offset < 0 or limit < 1:
+        return jsonify({'api_code': 404, 'message': 'offset must be a whole number >= 0, limit >= 1.'}), 404
+    devices = fleet_inventory.query(**filters)
+    return jsonify({
+        'api_code': 200,
+        'message': 'success',
+        'filters': filters,
+        'count': len(devices),
+        'offset': offset,
+        'devices': devices[offset:offset + min(limit, inventory_page_limit)],
+    })
 
 
 @app.route("/v1/fetch_json/")
@@ -262,14 +600,9 @@ def fetch_performance_charts():
             site_product_data_map = json.load(json_input)
         
     ''' generate options menu from the available devices in inventory. '''
-    unique_options = []
-    for item in site_product_data_map:
-        site_name = item["site_name"]
-        product_name = item["product_name"]
-        this_option = f'{site_name.upper()} : {product_name}'
-        if this_option not in unique_options:
-            unique_options.append(this_option)
-    unique_options = sorted(unique_options)
+    unique_options = sorted({
+        f'{item["site_name"].upper()} : {item["product_name"]}' for item in site_product_data_map
+    })
 
     html_options = '<option selected value="NONE">---------- Select Chart ----------</option>\n'
     for option_value in unique_options:
@@ -294,7 +627,135 @@ def page_not_found(e):
     return jsonify(err_dict), 404
 
 
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    perf_metrics.start_request_timings()
+
+
+@app.after_request
+def add_server_timing(response):
+    ''' per-phase Server-Timing header, plus the request latency histogram per endpoint. '''
+    timings = perf_metrics.request_timings()
+    started = g.pop('request_started', None)
+    if started is not None:
+        elapsed = time.perf_counter() - started
+        timings.append(('total', elapsed))
+        perf_metrics.observe(
+            'http_request_duration_seconds', elapsed,
+            {'endpoint': request.endpoint or 'unknown', 'status': response.status_code},
+            'request latency per endpoint')
+    if timings:
+        response.headers['Server-Timing'] = perf_metrics.server_timing_header(timings)
+    return response
+
+
+def warm_chart_cache(site_name, product_name, hour_limit, max_points, data_version):
+    ''' called by the scheduler after a background render, loads the new artifact into the cache. '''
+    chart_payload = chart_builder.read_prepared_chart(charts_folder, site_name, product_name, hour_limit, max_points, data_version)
+    if chart_payload is not None:
+        chart_cache.put((site_name, product_name, hour_limit, max_points, data_version), chart_payload)
+
+
+def start_prerender_scheduler(workers=None):
+    global prerender_scheduler
+    prerender_scheduler = PrerenderScheduler(
+        remote_servers, charts_folder,
+        lambda: create_chart_site_map(site_product_data_map_json, True),
+        chart_hour_limit, chart_max_points, workers=workers, on_rendered=warm_chart_cache,
+        status_file=prerender_status_file,
+    ).start()
+    return prerender_scheduler
+
+
+def warm_state_sections():
+    ''' everything save_warm_state writes, cache entries as (key, value) pairs. '''
+    return {
+        'inventory': get_inventory(remote_servers).snapshot(),
+        'rollup_heads': fleet_rollups.heads_snapshot(),
+        'device_windows': chart_builder.device_window_cache.snapshot(),
+        'chart_cache': chart_cache.snapshot(),
+        'aggregate_cache': aggregate_cache.snapshot(),
+        'report_cache': report_cache.snapshot(),
+    }
+
+
+def save_warm_state():
+    started = time.perf_counter()
+    written = warm_state.save_snapshot(warm_state_slot[0], warm_state_sections(), warm_state.code_stamp())
+    print('warm state saved:'.ljust(30), written, 'bytes', f'{time.perf_counter() - started:.3f}s')
+    return written
+
+
+def load_warm_state():
+    """
+    Restores the snapshots of every slot, newest first, so an entry held by
+    more than one keeps its newest value.  Entries are validated on use, the
+    rendered caches are skipped when the code that rendered them changed.
+
+    Returns:
+        dict: section -> entries restored, None without a usable snapshot.
+    """
+    started = time.perf_counter()
+    snapshots = warm_state.load_snapshots(warm_state_file)
+    if not snapshots:
+        return None
+    stamp = warm_state.code_stamp()
+    restored = dict.fromkeys(['inventory', 'rollup_heads', 'device_windows', 'chart_cache', 'aggregate_cache', 'report_cache'], 0)
+    for snapshot in snapshots:
+        sections = snapshot["sections"]
+        restored['inventory'] += int(get_inventory(remote_servers).restore(sections.get('inventory', {})))
+        restored['rollup_heads'] += fleet_rollups.restore_heads(sections.get('rollup_heads', {}))
+        caches = {'device_windows': chart_builder.device_window_cache}
+        if snapshot["code_stamp"] == stamp:
+            caches.update({'chart_cache': chart_cache, 'aggregate_cache': aggregate_cache, 'report_cache': report_cache})
+        for name, cache in caches.items():
+            restored[name] += cache.restore([(warm_state.as_key(key), value) for key, value in sections.get(name, [])])
+    for name, count in restored.items():
+        perf_metrics.set_gauge('warm_state_restored_entries', count, labels={'section': name}, help_text='entries restored from the warm state snapshot')
+    print('warm state restored:'.ljust(30), len(snapshots), 'snapshots', restored, f'{time.perf_counter() - started:.3f}s')
+    return restored
+
+
+def start_warm_state():
+    """
+    Restores the last snapshots and starts saving this process's state
+    (periodically plus once at exit) into a slot of its own, so a deploy or
+    a crash restarts warm.  Only serving processes call it, importing app
+    (scheduler processes, the benchmarks) leaves the snapshots alone.
+
+    Returns:
+        threading.Thread: the saver, None when saving is off.
+    """
+    global warm_state_saver, warm_state_slot
+    if warm_state_slot is not None:
+        return warm_state_saver
+    warm_state_slot = warm_state.claim_slot(warm_state_file)
+    load_warm_state()
+    if warm_state_save_seconds <= 0:
+        return None
+    stopped = threading.Event()
+
+    def save_periodically():
+        while not stopped.wait(warm_state_save_seconds):
+            save_warm_state()
+
+    def save_at_exit():
+        stopped.set()
+        save_warm_state()
+
+    warm_state_saver = threading.Thread(target=save_periodically, name='warm-state-saver', daemon=True)
+    warm_state_saver.start()
+    atexit.register(save_at_exit)
+    return warm_state_saver
+
+
 if __name__ == "__main__":
+    ''' with the debug reloader only the serving child process runs the scheduler. '''
+    if not app.debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_prerender_scheduler()
+        start_warm_state()
+        start_metrics_publisher()
     app.run(host='0.0.0.0', port=9999)
 
     
\ No newline at end of file
@@ -0,0 +1,427 @@
+from contextlib import redirect_stdout
+import numpy as np
+import statistics
+import tracemalloc
+import platform
+import urllib.request
+import subprocess
+import argparse
+import tempfile
+import shutil
+import json
+import time
+import glob
+import sys
+import io
+import os
+
+try:
+    from playwright.sync_api import sync_playwright
+except ImportError:
+    sync_playwright = None
+
+
+''' hot path benchmarks: ingest, chart rebuild, dashboard render and the request paths.
+
+    a synthetic fleet is generated into a temp workspace (data_generator_fleet),
+    the app is imported with that workspace as its working directory and each
+    case is timed on its own.  every case reports latency percentiles,
+    throughput and the peak traced memory of one extra run.
+
+        python benchmarks/run_benchmarks.py --devices 360 --days 14
+        python benchmarks/run_benchmarks.py --repeat 10 --rounds 5 --save benchmarks/baseline.json
+        python benchmarks/run_benchmarks.py --rounds 3 --compare benchmarks/baseline.json
+
+    compare prints the change of every p50 against the baseline and exits 1
+    when a case got slower than --threshold.
+
+    one run on a busy or single cpu machine easily has a case off by 50%,
+    --rounds runs the whole benchmark that many times, each in its own
+    process (fresh workspace, fresh imports), and keeps the median of every
+    stat over the rounds.  baselines are saved that way.
+
+    with playwright installed (pip install playwright && playwright install chromium)
+    the generated dashboards are also rendered in headless chromium, timing
+    render() to the first painted frame and to every chart built and painted
+    (each card scrolled into view), peak_mb is then the page's js heap.
+'''
+
+benchmarks_folder = os.path.dirname(os.path.abspath(__file__))
+repo_folder = os.path.dirname(benchmarks_folder)
+sys.path.insert(0, repo_folder)
+
+import data_generator_fleet
+import fleet_storage
+
+DASHBOARD_SIZES = [(4, 720), (16, 720), (36, 1000), (36, 5000)]
+CHART_HOURS = [12, 168]
+CHARTJS_URL = 'https://cdnjs.cloudflare.com/ajax/libs/Chart.js/3.9.1/chart.min.js'
+BROWSER_VIEWPORT = {"width": 1280, "height": 800}
+
+DASHBOARD_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8">
+<style>{style}</style>
+<script>{chartjs}</script>
+<script>{dashboard_js}</script>
+</head><body>
+<script>window.renderStarted = performance.now();</script>
+{fragment}
+</body></html>"""
+
+FIRST_PAINT_JS = """async () => {
+    await new Promise(done => requestAnimationFrame(() => requestAnimationFrame(done)));
+    return [performance.now() - window.renderStarted, performance.memory ? performance.memory.usedJSHeapSize : 0];
+}"""
+
+ALL_CHARTS_JS = """async () => {
+    for (const canvas of document.querySelectorAll('canvas[data-metric]')) {
+        canvas.scrollIntoView();
+        while (!Chart.getChart(canvas)) {
+            await new Promise(done => requestAnimationFrame(done));
+        }
+    }
+    await new Promise(done => requestAnimationFrame(() => requestAnimationFrame(done)));
+    return [performance.now() - window.renderStarted, performance.memory ? performance.memory.usedJSHeapSize : 0];
+}"""
+
+
+def summarize(durations, peak_bytes, items=1):
+    ''' latency stats in ms for one case, items is the work done per run (devices, rows, ...). '''
+    ordered = sorted(durations)
+
+    def pct(p):
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))] * 1000
+
+    total = sum(durations)
+    return {
+        "runs": len(durations),
+        "items_per_run": items,
+        "mean_ms": round(statistics.fmean(durations) * 1000, 3),
+        "min_ms": round(ordered[0] * 1000, 3),
+        "p50_ms": round(pct(50), 3),
+        "p95_ms": round(pct(95), 3),
+        "p99_ms": round(pct(99), 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+        "items_per_s": round(len(durations) * items / total, 2) if total else None,
+        "peak_mb": round(peak_bytes / (1024 * 1024), 3),
+    }
+
+
+def measure(fn, repeat, setup=None, items=1):
+    """
+    Times fn() repeat times (setup() runs before each, untimed) after one
+    untimed warm-up run, then once more under tracemalloc for the peak memory.
+    """
+    if setup is not None:
+        setup()
+    fn()
+
+    durations = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - started)
+
+    if setup is not None:
+        setup()
+    tracemalloc.start()
+    fn()
+    peak_bytes = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return summarize(durations, peak_bytes, items)
+
+
+def write_dashboard_input(json_file, servers, points):
+    ''' chart builder shaped input: [{device: rows}], one row per minute ending now. '''
+    rng = np.random.default_rng(servers * 100000 + points)
+    end = int(time.time()) // 60 * 60
+    timestamps = (end - 60 * np.arange(points - 1, -1, -1)).tolist()
+    data = []
+    for s in range(servers):
+        columns = {"timestamp": timestamps}
+        for metric, (low, high, _, _) in data_generator_fleet.METRIC_PROFILES.items():
+            if fleet_storage.METRIC_COLUMNS[metric] == "q":
+                columns[metric] = rng.integers(low, high + 1, size=points).tolist()
+            else:
+                columns[metric] = np.round(rng.uniform(low, high, size=points), 2).tolist()
+        data.append({f'bench-device-{s:03d}': fleet_storage.columns_to_rows(columns, epoch_timestamps=True)})
+    with open(json_file, 'w', encoding="utf-8") as f:
+        json.dump(data, f, indent=4)
+
+
+def read_chartjs(chartjs):
+    ''' Chart.js source from a local file or a url, None when it cannot be had. '''
+    if os.path.exists(chartjs):
+        with open(chartjs, 'r', encoding="utf-8") as f:
+            return f.read()
+    try:
+        with urllib.request.urlopen(chartjs, timeout=30) as response:
+            return response.read().decode('utf-8')
+    except OSError as e:
+        print("chart.js not available:".ljust(30), chartjs, e)
+        return None
+
+
+def browser_render_cases(dashboard_files, repeat, chartjs):
+    """
+    Renders every dashboard fragment in headless chromium.
+
+    Args:
+        dashboard_files (list): (case name, html fragment file, points per chart).
+        repeat (int): page loads per case.
+        chartjs (str): path or url of the Chart.js build the app uses.
+
+    Returns:
+        dict: case name -> summary, empty without playwright / a browser / Chart.js.
+    """
+    if sync_playwright is None:
+        print("skipping browser render:".ljust(30), "playwright is not installed")
+        return {}
+    chartjs_source = read_chartjs(chartjs)
+    if chartjs_source is None:
+        return {}
+    with open(os.path.join(repo_folder, 'static', 'css', 'style.css'), 'r', encoding="utf-8") as f:
+        style = f.read()
+    with open(os.path.join(repo_folder, 'static', 'js', 'dashboard.js'), 'r', encoding="utf-8") as f:
+        dashboard_js = f.read()
+
+    results = {}
+    with sync_playwright() as playwright:
+        try:
+            browser = playwright.chromium.launch(args=['--enable-precise-memory-info'])
+        except Exception as e:
+            print("skipping browser render:".ljust(30), e)
+            return {}
+        page = browser.new_page(viewport=BROWSER_VIEWPORT)
+        for name, html_file, items in dashboard_files:
+            with open(html_file, 'r', encoding="utf-8") as f:
+                html = DASHBOARD_PAGE.format(style=style, chartjs=chartjs_source, dashboard_js=dashboard_js, fragment=f.read())
+            for case, script in (('first_paint', FIRST_PAINT_JS), ('all_charts', ALL_CHARTS_JS)):
+                durations = []
+                peak_bytes = 0
+                ''' one untimed warm-up load, as in measure(). '''
+                for run in range(repeat + 1):
+                    page.set_content(html)
+                    elapsed_ms, heap_bytes = page.evaluate(script)
+                    if run:
+                        durations.append(elapsed_ms / 1000)
+                        peak_bytes = max(peak_bytes, heap_bytes)
+                case_name = f'browser_render.{name}.{case}'
+                results[case_name] = summarize(durations, peak_bytes, items)
+                print(case_name.ljust(40), f'p50 {results[case_name]["p50_ms"]:>10.3f} ms', f'peak {results[case_name]["peak_mb"]:>8.3f} MB')
+        browser.close()
+    return results
+
+
+def run_benchmarks(workspace, devices, days, interval, seed, repeat, only=None, chartjs=CHARTJS_URL):
+    servers_folder = os.path.join(workspace, 'server_fleet')
+    static_json = os.path.join(workspace, 'static', 'json')
+    os.makedirs(os.path.join(workspace, 'static', 'charts'), exist_ok=True)
+    shutil.copytree(os.path.join(repo_folder, 'static', 'json'), static_json)
+
+    print("generating fleet:".ljust(30), devices, "devices,", days, "days")
+    with redirect_stdout(io.StringIO()):
+        data_generator_fleet.generate_fleet(servers_folder, devices, days, interval, seed)
+
+    ''' the app resolves server_fleet/ and static/ from its working directory. '''
+    os.chdir(workspace)
+    import app
+    import chart_builder
+    import data_generator_single
+    data_generator_single.servers_folder = servers_folder
+
+    client = app.app.test_client()
+    with open(os.path.join(servers_folder, 'devices.json'), 'r', encoding="utf-8") as f:
+        device_list = json.load(f)
+    first = device_list[0]
+    site_name, product_name = first["site_name"], first["product_name"]
+    results = {}
+
+    def wanted(name):
+        return not only or any(name.startswith(prefix) for prefix in only)
+
+    def run(name, fn, setup=None, items=1, runs=repeat):
+        if not wanted(name):
+            return
+        with redirect_stdout(io.StringIO()):
+            results[name] = measure(fn, runs, setup, items)
+        print(name.ljust(40), f'p50 {results[name]["p50_ms"]:>10.3f} ms', f'peak {results[name]["peak_mb"]:>8.3f} MB')
+
+    run('site_map.create_chart_site_map',
+        lambda: app.create_chart_site_map(app.site_product_data_map_json, True))
+
+    for hours in CHART_HOURS:
+        url = f'/v1/fetch_chart?site_name={site_name}&product_name={product_name}&hours={hours}'
+
+        def cold_setup(hours=hours):
+            app.chart_cache.invalidate()
+            chart_builder.device_window_cache.invalidate()
+            base = chart_builder.chart_file_base(site_name, product_name, hours, app.chart_max_points)
+            for path in glob.glob(os.path.join(app.charts_folder, f'{base}.*')):
+                os.remove(path)
+
+        def fetch(url=url):
+            assert client.get(url).status_code == 200
+
+        run(f'fetch_chart.cold.{hours}h', fetch, setup=cold_setup)
+        run(f'fetch_chart.prepared.{hours}h', fetch, setup=app.chart_cache.invalidate)
+        run(f'fetch_chart.warm.{hours}h', fetch, runs=repeat * 10)
+
+    for file_path in sorted(glob.glob(os.path.join(static_json, '0*KB.json'))):
+        file_name = os.path.basename(file_path)
+        url = f'/v1/fetch_json?file={file_name}'
+
+        def fetch_file(url=url):
+            assert client.get(url).status_code == 200
+
+        run(f'fetch_json.{os.path.splitext(file_name)[0]}', fetch_file, runs=repeat * 2)
+
+    dashboard_folder = os.path.join(workspace, 'dashboards')
+    os.makedirs(dashboard_folder, exist_ok=True)
+    from performance_chart_generator import generate_monitoring_dashboard
+    dashboard_files = []
+    for servers, points in DASHBOARD_SIZES:
+        name = f'dashboard.{servers}servers.{points}points'
+        render_name = f'{servers}servers.{points}points'
+        if not wanted(name) and not wanted(f'browser_render.{render_name}'):
+            continue
+        ''' the generator reads site / product from the "__" parts of the file name. '''
+        file_name_base = f'bench-site__Bench-Product__{servers}s-{points}p'
+        json_file = os.path.join(dashboard_folder, f'{file_name_base}.json')
+        html_file = os.path.join(dashboard_folder, f'{file_name_base}.html')
+        write_dashboard_input(json_file, servers, points)
+        hour_limit = points // 60 + 1
+        run(name, lambda j=json_file, h=html_file, l=hour_limit: generate_monitoring_dashboard(j, h, l),
+            items=servers * points)
+        if wanted(f'browser_render.{render_name}'):
+            if not os.path.exists(html_file):
+                generate_monitoring_dashboard(json_file, html_file, hour_limit)
+            dashboard_files.append((render_name, html_file, servers * points))
+    if dashboard_files:
+        results.update(browser_render_cases(dashboard_files, repeat, chartjs))
+
+    ''' last: ingest appends "now" samples, which would move every chart window above. '''
+    run('ingest.create_performance_stats',
+        lambda: data_generator_single.create_performance_stats(device_list), items=len(device_list))
+
+    return results
+
+
+def median_results(rounds):
+    """
+    Merges the results of several rounds: every stat is the median over the
+    rounds that ran the case, "runs" is the total and "rounds" their count.
+    """
+    merged = {}
+    for name in dict.fromkeys(name for results in rounds for name in results):
+        case_rounds = [results[name] for results in rounds if name in results]
+        stats = {}
+        for key in case_rounds[0]:
+            values = [case[key] for case in case_rounds if case[key] is not None]
+            if key == "runs":
+                stats[key] = sum(values)
+            elif key == "items_per_run":
+                stats[key] = values[0]
+            else:
+                stats[key] = round(statistics.median(values), 3) if values else None
+        stats["rounds"] = len(case_rounds)
+        merged[name] = stats
+    return merged
+
+
+def run_rounds(args):
+    ''' runs the benchmark args.rounds times, one child process each, and merges them (median_results). '''
+    child_args = [
+        '--devices', str(args.devices), '--days', str(args.days), '--interval', str(args.interval),
+        '--seed', str(args.seed), '--repeat', str(args.repeat), '--chartjs', args.chartjs,
+    ]
+    for prefix in args.only or []:
+        child_args += ['--only', prefix]
+    rounds = []
+    with tempfile.TemporaryDirectory(prefix='flask_infra_monitor-rounds-') as rounds_folder:
+        for round_index in range(args.rounds):
+            print("round:".ljust(30), f'{round_index + 1}/{args.rounds}')
+            round_file = os.path.join(rounds_folder, f'round-{round_index}.json')
+            subprocess.run([sys.executable, os.path.abspath(__file__), *child_args, '--save', round_file], check=True)
+            with open(round_file, 'r', encoding="utf-8") as f:
+                rounds.append(json.load(f)["results"])
+    return median_results(rounds)
+
+
+def compare(results, baseline, threshold, min_delta_ms=1.0):
+    ''' prints p50 deltas against a baseline, returns the names of regressed cases.
+        sub-millisecond cases only count when they also moved by min_delta_ms. '''
+    regressions = []
+    print()
+    print('case'.ljust(40), 'baseline p50'.rjust(14), 'p50'.rjust(12), 'change'.rjust(9))
+    for name, stats in results.items():
+        before = baseline.get("results", {}).get(name)
+        if before is None:
+            print(name.ljust(40), 'new'.rjust(14), f'{stats["p50_ms"]:.3f}'.rjust(12))
+            continue
+        change = (stats["p50_ms"] - before["p50_ms"]) / before["p50_ms"] if before["p50_ms"] else 0.0
+        flag = ''
+        if change > threshold and stats["p50_ms"] - before["p50_ms"] > min_delta_ms:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        print(name.ljust(40), f'{before["p50_ms"]:.3f}'.rjust(14), f'{stats["p50_ms"]:.3f}'.rjust(12), f'{change:+.1%}'.rjust(9) + flag)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark the ingest, chart and request hot paths.")
+    parser.add_argument('--devices', type=int, default=90, help="synthetic fleet size")
+    parser.add_argument('--days', type=int, default=3, help="days of history per device")
+    parser.add_argument('--interval', type=int, default=60, help="seconds between samples")
+    parser.add_argument('--seed', type=int, default=0, help="fleet RNG seed")
+    parser.add_argument('--repeat', type=int, default=5, help="timed runs per case (warm / fetch_json cases run more)")
+    parser.add_argument('--rounds', type=int, default=1, help="whole runs, each in its own process, stats are the median over them")
+    parser.add_argument('--only', action='append', help="case name prefix to run, can be repeated")
+    parser.add_argument('--save', help="write the results to this json file (e.g. a new baseline)")
+    parser.add_argument('--compare', help="baseline json file to diff against")
+    parser.add_argument('--chartjs', default=CHARTJS_URL, help="Chart.js file or url for the browser render cases")
+    parser.add_argument('--threshold', type=float, default=0.25, help="p50 slowdown counted as a regression (0.25 = 25%%)")
+    parser.add_argument('--min-delta-ms', type=float, default=1.0, help="smallest p50 change in ms counted as a regression")
+    args = parser.parse_args()
+
+    if args.rounds > 1:
+        results = run_rounds(args)
+    else:
+        workspace = tempfile.mkdtemp(prefix='flask_infra_monitor-bench-')
+        try:
+            results = run_benchmarks(workspace, args.devices, args.days, args.interval, args.seed, args.repeat, args.only, args.chartjs)
+        finally:
+            os.chdir(repo_folder)
+            shutil.rmtree(workspace, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "devices": args.devices,
+            "days": args.days,
+            "interval": args.interval,
+            "seed": args.seed,
+            "repeat": args.repeat,
+            "rounds": args.rounds,
+            "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        },
+        "results": results,
+    }
+    if args.save:
+        with open(args.save, 'w', encoding="utf-8") as f:
+            f.write(json.dumps(report, indent=4))
+        print("saved results:".ljust(30), args.save)
+
+    if args.compare:
+        with open(args.compare, 'r', encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold, args.min_delta_ms):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
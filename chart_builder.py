@@ -0,0 +1,323 @@
+import performance_chart_generator
+from chart_cache import ChartCache
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from urllib.parse import urlencode
+import multiprocessing
+import http_cache
+import perf_metrics
+import fleet_inventory
+import fleet_storage
+import fleet_rollups
+import chart_downsample
+import fast_json
+import tempfile
+import hashlib
+import shutil
+import json
+import time
+import os
+
+
+''' building a site/product chart, shared by the request path and the pre-render workers.
+
+    a finished chart is an "artifact" in the charts folder, named <site>__<product>
+    for the default window and <site>__<product>__<hours>h-<max_points>p otherwise:
+        <site>__<product>.json        chart data the html was rendered from
+        <site>__<product>.html        the rendered dashboard
+        <site>__<product>.meta.json   data version + window it was built for
+        <site>__<product>.payload.json[.gz|.br]
+                                      the /v1/fetch_chart response body, precompressed
+'''
+
+DEFAULT_HOUR_LIMIT = 12
+DEFAULT_MAX_POINTS = 1000
+
+META_SUFFIX = '.meta.json'
+PAYLOAD_SUFFIXES = {
+    'identity': '.payload.json',
+    'gzip': '.payload.json.gz',
+    'br': '.payload.json.br',
+}
+
+''' device reads per chart build: worker count and 'thread' or 'process' pool.
+    pre-render workers are already separate processes, threads are enough there. '''
+CHART_LOAD_WORKERS = int(os.environ.get('CHART_LOAD_WORKERS', min(8, os.cpu_count() or 1)))
+CHART_LOAD_EXECUTOR = os.environ.get('CHART_LOAD_EXECUTOR', 'thread')
+
+_thread_pool = None
+_process_pool = None
+
+''' per device chart windows keyed by (site, device, hours, device data version): a chart
+    rebuilt after some of its devices ingested only re-reads those devices. '''
+DEVICE_WINDOW_CACHE_BYTES = int(os.environ.get('DEVICE_WINDOW_CACHE_MB', 64)) * 1024 * 1024
+WINDOW_ROW_BYTES = 600
+
+
+def window_rows_size(rows):
+    ''' rough memory held by a window, rows are small dicts. '''
+    return len(rows) * WINDOW_ROW_BYTES
+
+
+device_window_cache = ChartCache(DEVICE_WINDOW_CACHE_BYTES, size_fn=window_rows_size)
+
+
+def site_product_device_names(servers_folder, site_name, product_name):
+    ''' served from the indexed inventory, devices.json is only re-read when it changes. '''
+    with perf_metrics.phase('inventory'):
+        return fleet_inventory.get_inventory(servers_folder).device_names(site_name, product_name)
+
+
+def site_product_data_version(servers_folder, site_name, device_names):
+    ''' combined data version of every device in a chart, changes when any of them ingests. '''
+    with perf_metrics.phase('data_version'):
+        versions = [fleet_storage.device_data_version(servers_folder, site_name, name) for name in device_names]
+    return hashlib.sha1('|'.join(device_names + versions).encode()).hexdigest()[:16]
+
+
+def _read_device_window(servers_folder, site_name, device_name, hour_limit):
+    print('getting data from server:'.ljust(30), device_name)
+    ''' only the chart window is read, from the finest tier within the read budget. '''
+    rows = fleet_rollups.read_chart_rows(servers_folder, site_name, device_name, hour_limit)
+    if not rows:
+        ''' not migrated yet: stream the legacy file and keep just the window. '''
+        legacy_file = fleet_storage.legacy_device_file_path(servers_folder, site_name, device_name)
+        if os.path.exists(legacy_file):
+            rows = fleet_storage.read_legacy_device_tail(legacy_file, hour_limit, epoch_timestamps=True)
+    return rows
+
+
+def _load_executor(executor_kind):
+    ''' pools are created once per process and shared by every chart build. '''
+    global _thread_pool, _process_pool
+    if executor_kind == 'process':
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(
+                max_workers=CHART_LOAD_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+        return _process_pool
+    if _thread_pool is None:
+        _thread_pool = ThreadPoolExecutor(max_workers=CHART_LOAD_WORKERS, thread_name_prefix='chart-load')
+    return _thread_pool
+
+
+def load_device_windows(servers_folder, site_name, device_names, hour_limit, executor_kind=None):
+    """
+    Reads the chart window of every device concurrently, devices whose
+    data version did not change since the last read come from
+    device_window_cache.
+
+    Args:
+        servers_folder (str): root of the fleet store (server_fleet/).
+        site_name (str): site of the devices.
+        device_names (list): devices to read, duplicates are read once.
+        hour_limit (int): chart window in hours.
+        executor_kind (str): 'thread' or 'process', CHART_LOAD_EXECUTOR by default.
+
+    Returns:
+        dict: device_name -> rows, in device_names order.
+    """
+    unique_names = list(dict.fromkeys(device_names))
+    window_keys = {
+        name: (site_name, name, hour_limit, fleet_storage.device_data_version(servers_folder, site_name, name))
+        for name in unique_names
+    }
+    windows = {name: device_window_cache.get(window_keys[name]) for name in unique_names}
+    missing = [name for name in unique_names if windows[name] is None]
+
+    if len(missing) <= 1 or CHART_LOAD_WORKERS <= 1:
+        read = {name: _read_device_window(servers_folder, site_name, name, hour_limit) for name in missing}
+    else:
+        pool = _load_executor(executor_kind or CHART_LOAD_EXECUTOR)
+        futures = {
+            name: pool.submit(_read_device_window, servers_folder, site_name, name, hour_limit)
+            for name in missing
+        }
+        read = {name: future.result() for name, future in futures.items()}
+
+    for name, rows in read.items():
+        windows[name] = rows
+        ''' "empty" is the version of a device that is not in the column store (legacy file), never cached. '''
+        if window_keys[name][-1] != "empty":
+            device_window_cache.put(window_keys[name], rows)
+    return windows
+
+
+def chart_file_base(site_name, product_name, hour_limit=DEFAULT_HOUR_LIMIT, max_points=DEFAULT_MAX_POINTS):
+    ''' the generator reads site / product back out of the first two "__" parts of the name. '''
+    if hour_limit == DEFAULT_HOUR_LIMIT and max_points == DEFAULT_MAX_POINTS:
+        return f'{site_name}__{product_name}'
+    return f'{site_name}__{product_name}__{hour_limit}h-{max_points}p'
+
+
+def chart_file_paths(charts_folder, site_name, product_name, hour_limit=DEFAULT_HOUR_LIMIT, max_points=DEFAULT_MAX_POINTS):
+    file_name_base = chart_file_base(site_name, product_name, hour_limit, max_points)
+    return (
+        os.path.join(charts_folder, f'{file_name_base}.json'),
+        os.path.join(charts_folder, f'{file_name_base}.html'),
+        os.path.join(charts_folder, f'{file_name_base}{META_SUFFIX}'),
+    )
+
+
+def read_artifact_meta(charts_folder, site_name, product_name, hour_limit=DEFAULT_HOUR_LIMIT, max_points=DEFAULT_MAX_POINTS):
+    meta_file = chart_file_paths(charts_folder, site_name, product_name, hour_limit, max_points)[2]
+    if not os.path.exists(meta_file):
+        return None
+    try:
+        with open(meta_file, 'r', encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def artifact_is_current(meta, hour_limit, max_points, data_version):
+    return bool(meta) and (
+        meta.get("data_version") == data_version
+        and meta.get("hour_limit") == hour_limit
+        and meta.get("max_points") == max_points
+    )
+
+
+def payload_file_paths(charts_folder, site_name, product_name, hour_limit=DEFAULT_HOUR_LIMIT, max_points=DEFAULT_MAX_POINTS):
+    file_name_base = chart_file_base(site_name, product_name, hour_limit, max_points)
+    return {
+        encoding: os.path.join(charts_folder, f'{file_name_base}{suffix}')
+        for encoding, suffix in PAYLOAD_SUFFIXES.items()
+    }
+
+
+def chart_stream_url(site_name, product_name, hour_limit, max_points):
+    ''' live updates append raw samples, so only charts drawn from raw samples get a stream. '''
+    if fleet_rollups.pick_rollup_tier(hour_limit, max_points) != fleet_rollups.RAW_TIER:
+        return None
+    return '/v1/stream_chart?' + urlencode({'site_name': site_name, 'product_name': product_name, 'hours': hour_limit})
+
+
+def chart_payload_size(payload):
+    ''' bytes held by a payload dict, used as the chart cache size function. '''
+    return sum(len(body) for body in payload.values())
+
+
+def read_prepared_chart(charts_folder, site_name, product_name, hour_limit, max_points, data_version):
+    """
+    Payload of an artifact already built for this data version and window.
+
+    Returns:
+        dict: encoding -> response body bytes, None when the artifact is
+            missing or was built for other data.
+    """
+    with perf_metrics.phase('read_prepared'):
+        meta = read_artifact_meta(charts_folder, site_name, product_name, hour_limit, max_points)
+        if not artifact_is_current(meta, hour_limit, max_points, data_version):
+            return None
+        payload = {}
+        for encoding, payload_file in payload_file_paths(charts_folder, site_name, product_name, hour_limit, max_points).items():
+            try:
+                with open(payload_file, 'rb') as f:
+                    payload[encoding] = f.read()
+            except OSError:
+                continue
+    if 'identity' not in payload:
+        return None
+    return payload
+
+
+def build_chart_artifact(servers_folder, charts_folder, chart_site_name, chart_product_name, device_names, hour_limit, max_points, data_version=None, executor_kind=None):
+    """
+    Reads the chart window of every device, downsamples the chart to
+    max_points shared timestamps with LTTB, renders the dashboard and prepares the
+    /v1/fetch_chart response body in every encoding.
+
+    All files are written into a private temp folder and renamed into place
+    (meta last), so readers never see a half written artifact.
+
+    Returns:
+        dict: encoding -> response body bytes.
+    """
+    file_name_base = chart_file_base(chart_site_name, chart_product_name, hour_limit, max_points)
+    chart_json_file, chart_html_file, chart_meta_file = chart_file_paths(
+        charts_folder, chart_site_name, chart_product_name, hour_limit, max_points)
+
+    build_folder = tempfile.mkdtemp(prefix='.building-', dir=charts_folder)
+    try:
+        build_json_file = os.path.join(build_folder, os.path.basename(chart_json_file))
+        build_html_file = os.path.join(build_folder, os.path.basename(chart_html_file))
+        build_meta_file = os.path.join(build_folder, os.path.basename(chart_meta_file))
+
+        with perf_metrics.phase('read_devices'):
+            device_windows = load_device_windows(servers_folder, chart_site_name, device_names, hour_limit, executor_kind)
+        with perf_metrics.phase('downsample'):
+            device_windows = chart_downsample.downsample_site_product(device_windows, fleet_storage.METRIC_NAMES, max_points)
+        ''' columnar: one shared timestamp array, one value array per device and metric. '''
+        with perf_metrics.phase('columnar'):
+            chart_data = performance_chart_generator.rows_to_chart_data(device_windows)
+        del device_windows
+
+        with perf_metrics.phase('write_json'):
+            with open(build_json_file, 'wb') as f:
+                f.write(fast_json.dumps_bytes(chart_data))
+        print('wrote chart data json:'.ljust(30), f"{file_name_base}.json")
+
+        ''' the dashboard is rendered straight from the in-memory data, the json file is not read back. '''
+        with perf_metrics.phase('render_html'):
+            html_content = performance_chart_generator.render_dashboard(
+                chart_data, chart_site_name, chart_product_name.replace('-', ' '), hour_limit,
+                chart_stream_url(chart_site_name, chart_product_name, hour_limit, max_points),
+                os.path.basename(chart_json_file))
+        with open(build_html_file, 'w') as html_file:
+            html_file.write(html_content)
+
+        success_dict = {
+            'api_code': 200,
+            'message': "success",
+            'chart_path_value': chart_html_file,
+            'html': html_content
+        }
+        with perf_metrics.phase('encode'):
+            payload = http_cache.compress_variants(fast_json.dumps_bytes(success_dict))
+        payload_files = payload_file_paths(charts_folder, chart_site_name, chart_product_name, hour_limit, max_points)
+        for encoding, body in payload.items():
+            with open(os.path.join(build_folder, os.path.basename(payload_files[encoding])), 'wb') as f:
+                f.write(body)
+
+        meta = {
+            "site_name": chart_site_name,
+            "product_name": chart_product_name,
+            "hour_limit": hour_limit,
+            "max_points": max_points,
+            "data_version": data_version,
+            "built_at": time.time(),
+        }
+        with open(build_meta_file, 'w', encoding="utf-8") as f:
+            f.write(json.dumps(meta, indent=4))
+
+        os.replace(build_json_file, chart_json_file)
+        os.replace(build_html_file, chart_html_file)
+        for encoding in payload:
+            os.replace(os.path.join(build_folder, os.path.basename(payload_files[encoding])), payload_files[encoding])
+        os.replace(build_meta_file, chart_meta_file)
+    finally:
+        shutil.rmtree(build_folder, ignore_errors=True)
+    return payload
+
+
+def prerender_chart(servers_folder, charts_folder, site_name, product_name, hour_limit, max_points):
+    """
+    Pre-render job body, runs in a worker process.
+
+    Returns:
+        dict: data_version, rebuilt (False when the artifact was already
+            current) and duration_s measured inside the worker.
+    """
+    started = time.perf_counter()
+    device_names = site_product_device_names(servers_folder, site_name, product_name)
+    data_version = site_product_data_version(servers_folder, site_name, device_names)
+    meta = read_artifact_meta(charts_folder, site_name, product_name, hour_limit, max_points)
+    rebuilt = False
+    if not artifact_is_current(meta, hour_limit, max_points, data_version):
+        build_chart_artifact(
+            servers_folder, charts_folder, site_name, product_name, device_names, hour_limit, max_points, data_version, 'thread')
+        rebuilt = True
+    return {
+        "data_version": data_version,
+        "rebuilt": rebuilt,
+        "duration_s": round(time.perf_counter() - started, 4),
+    }
@@ -0,0 +1,151 @@
+from concurrent.futures import Future
+from collections import OrderedDict
+import threading
+
+
+class ChartCache:
+    """
+    In-process LRU cache for rendered charts with single-flight builds.
+
+    Keys are tuples whose last item is the data version, e.g.
+    (site_name, product_name, hour_limit, data_version).  A new data version
+    makes the old entries for the same chart unreachable, so they are dropped
+    as soon as the new one is stored; nothing expires on a timer.
+
+    Args:
+        max_bytes (int): memory budget, least recently used entries are
+            evicted once the stored values add up to more than this.
+        size_fn (callable): value -> approximate size in bytes.
+    """
+
+    def __init__(self, max_bytes, size_fn=len):
+        self.max_bytes = max_bytes
+        self.size_fn = size_fn
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.builds = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._store(key, value)
+
+    def get_or_build(self, key, build_fn):
+        """
+        Returns the cached value for key, building it at most once.
+
+        When several threads miss on the same key at the same time only the
+        first one runs build_fn, the others wait for its result (or its
+        exception).
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            flight = self._in_flight.get(key)
+            if flight is not None:
+                self.coalesced += 1
+                is_leader = False
+            else:
+                flight = Future()
+                self._in_flight[key] = flight
+                self.misses += 1
+                is_leader = True
+
+        if not is_leader:
+            return flight.result()
+
+        try:
+            value = build_fn()
+        except BaseException as e:
+            with self._lock:
+                del self._in_flight[key]
+            flight.set_exception(e)
+            raise
+
+        with self._lock:
+            self.builds += 1
+            self._store(key, value)
+            del self._in_flight[key]
+        flight.set_result(value)
+        return value
+
+    def invalidate(self, key_prefix=()):
+        ''' drop every entry whose key starts with key_prefix (all of them by default). '''
+        with self._lock:
+            for key in [k for k in self._entries if k[:len(key_prefix)] == key_prefix]:
+                self._remove(key)
+
+    def snapshot(self):
+        ''' (key, value) pairs, least recently used first, for warm_state. '''
+        with self._lock:
+            return list(self._entries.items())
+
+    def restore(self, entries):
+        """
+        Adds entries from a snapshot, stale data versions are simply never
+        asked for again.  An entry is skipped when the cache already holds any
+        version of its key, so snapshots restored newest first keep the newest.
+
+        Returns:
+            int: entries restored.
+        """
+        restored = 0
+        with self._lock:
+            held = {k[:-1] for k in self._entries}
+            for key, value in entries:
+                if key[:-1] not in held:
+                    self._store(key, value)
+                    restored += 1
+            return restored
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                'entries': len(self._entries),
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'builds': self.builds,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+    def _store(self, key, value):
+        ''' caller holds the lock. '''
+        for stale_key in [k for k in self._entries if k[:-1] == key[:-1] and k != key]:
+            self._remove(stale_key)
+        if key in self._entries:
+            self._remove(key)
+        size = self.size_fn(value)
+        if size > self.max_bytes:
+            return
+        self._entries[key] = value
+        self._sizes[key] = size
+        self.total_bytes += size
+        while self.total_bytes > self.max_bytes:
+            oldest_key = next(iter(self._entries))
+            self._remove(oldest_key)
+            self.evictions += 1
+
+    def _remove(self, key):
+        del self._entries[key]
+        self.total_bytes -= self._sizes.pop(key)
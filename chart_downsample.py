@@ -0,0 +1,127 @@
+import numpy as np
+
+
+''' Largest-Triangle-Three-Buckets downsampling for chart series.
+
+    a chart's series share one timestamp array (rows_to_chart_data), so the
+    rows kept have to be the same for every device: every (device, metric)
+    series of a site/product is put on the union timeline of the devices,
+    stacked into one 2D array and LTTB picks one point per bucket for all of
+    them at once, the one where any series has its largest triangle.  the
+    loop runs once per output bucket and each step is a numpy operation over
+    every series at once.
+'''
+
+MIN_POINTS = 3
+
+
+def shared_lttb_indices(x, y, threshold):
+    """
+    Indices LTTB keeps for all rows of y together.
+
+    Every row is scaled to its own range first, so a spike in a small metric
+    competes with a large one; a bucket keeps the point with the largest
+    triangle over all rows.
+
+    Args:
+        x (np.ndarray): shape (points,), ascending, shared by every row.
+        y (np.ndarray): shape (series, points).
+        threshold (int): points to keep (>= 3).
+
+    Returns:
+        np.ndarray: ascending int indices, threshold of them, or every index
+            when the rows are already short enough.
+    """
+    n_points = len(x)
+    if threshold >= n_points or threshold < MIN_POINTS:
+        return np.arange(n_points)
+
+    low = y.min(axis=1, keepdims=True)
+    span = y.max(axis=1, keepdims=True) - low
+    y = (y - low) / np.where(span > 0, span, 1.0)
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n_points - 1
+    every = (n_points - 2) / (threshold - 2)
+    a = 0
+
+    for i in range(threshold - 2):
+        ''' average of the next bucket is the third triangle corner. '''
+        next_lo = int((i + 1) * every) + 1
+        next_hi = min(int((i + 2) * every) + 1, n_points)
+        avg_x = x[next_lo:next_hi].mean()
+        avg_y = y[:, next_lo:next_hi].mean(axis=1)
+
+        lo = int(i * every) + 1
+        hi = int((i + 1) * every) + 1
+        ax = x[a]
+        ay = y[:, a][:, None]
+        area = np.abs(
+            (ax - avg_x) * (y[:, lo:hi] - ay)
+            - (ax - x[lo:hi]) * (avg_y[:, None] - ay)
+        )
+        a = lo + int(area.max(axis=0).argmax())
+        selected[i + 1] = a
+    return selected
+
+
+def downsample_site_product(device_windows, metrics, max_points):
+    """
+    Reduces a site/product to at most max_points shared timestamps.
+
+    Devices that report at the same times (the usual case) keep the rows at
+    the picked timestamps as they are.  A device with its own timeline keeps,
+    at every picked timestamp, its latest row since the previous pick (moved
+    onto the picked timestamp), and nothing where it has no row in between,
+    so gaps stay gaps.
+
+    Args:
+        device_windows (dict): device_name -> rows with an int epoch "timestamp", ascending.
+        metrics (list): metric keys to preserve spikes for.
+        max_points (int): most timestamps in the chart.
+
+    Returns:
+        dict: device_name -> downsampled rows, same order as device_windows.
+    """
+    device_timestamps = {
+        device_name: np.fromiter((row["timestamp"] for row in rows), dtype=np.int64, count=len(rows))
+        for device_name, rows in device_windows.items()
+    }
+    timeline = np.unique(np.concatenate(list(device_timestamps.values()) or [np.empty(0, dtype=np.int64)]))
+    if len(timeline) <= max(max_points, MIN_POINTS):
+        return device_windows
+
+    ''' every series on the union timeline, a device's latest value before a time it has no row at. '''
+    positions = {}
+    y_rows = []
+    for device_name, rows in device_windows.items():
+        if not rows:
+            continue
+        timestamps = device_timestamps[device_name]
+        position = np.maximum(np.searchsorted(timestamps, timeline, side='right') - 1, 0)
+        positions[device_name] = position
+        for metric in metrics:
+            values = np.fromiter((row.get(metric, 0) for row in rows), dtype=np.float64, count=len(rows))
+            y_rows.append(values[position])
+    keep = shared_lttb_indices(timeline.astype(np.float64), np.vstack(y_rows), max_points)
+    kept_timestamps = timeline[keep].tolist()
+
+    result = {}
+    for device_name, rows in device_windows.items():
+        if not rows:
+            result[device_name] = rows
+            continue
+        timestamps = device_timestamps[device_name]
+        if len(timestamps) == len(timeline) and np.array_equal(timestamps, timeline):
+            result[device_name] = [rows[i] for i in keep.tolist()]
+            continue
+        ''' a row counts for a pick when it is newer than the previous pick. '''
+        picked = positions[device_name][keep]
+        previous = np.concatenate(([np.iinfo(np.int64).min], timeline[keep][:-1]))
+        has_row = (timestamps[picked] <= timeline[keep]) & (timestamps[picked] > previous)
+        result[device_name] = [
+            dict(rows[i], timestamp=epoch)
+            for i, epoch, valid in zip(picked.tolist(), kept_timestamps, has_row.tolist()) if valid
+        ]
+    return result
@@ -0,0 +1,172 @@
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import chart_builder
+import fleet_storage
+import perf_metrics
+import threading
+import json
+import time
+import os
+
+
+def read_status_file(status_file, max_age_seconds):
+    ''' status() as a scheduler in another process last wrote it, None when it is missing or older than max_age_seconds. '''
+    try:
+        with open(status_file, 'r', encoding="utf-8") as f:
+            status = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    if time.time() - status.get("written_at", 0) > max_age_seconds:
+        return None
+    return status
+
+
+class PrerenderScheduler:
+    """
+    Re-renders every site/product dashboard in the background after each
+    ingest cycle, so the request path only has to read a prepared artifact.
+
+    A daemon thread watches the ingest cycle marker written by
+    data_generator_single (fleet_storage.mark_ingest_cycle).  When a new cycle
+    shows up every pair returned by pairs_fn is submitted to a bounded
+    process pool, unless a job for that pair is still queued or running.
+
+    Args:
+        servers_folder (str): root of the fleet store (server_fleet/).
+        charts_folder (str): where artifacts are written (static/charts/).
+        pairs_fn (callable): returns [{"site_name": .., "product_name": ..}, ...],
+            normally create_chart_site_map.
+        hour_limit (int): chart window to pre-render.
+        max_points (int): LTTB point budget per series of the pre-rendered charts.
+        workers (int): size of the process pool, every core by default.
+        poll_seconds (int): how often the ingest marker is checked.
+        on_rendered (callable): called in the parent as
+            on_rendered(site_name, product_name, hour_limit, max_points, data_version)
+            after a job rebuilt an artifact, e.g. to warm an in-memory cache.
+        status_file (str): status() is written there every poll, for web
+            workers in other processes (read_status_file).
+    """
+
+    def __init__(self, servers_folder, charts_folder, pairs_fn, hour_limit, max_points, workers=None, poll_seconds=5, on_rendered=None, status_file=None):
+        self.servers_folder = servers_folder
+        self.charts_folder = charts_folder
+        self.pairs_fn = pairs_fn
+        self.hour_limit = hour_limit
+        self.max_points = max_points
+        self.workers = workers or os.cpu_count() or 1
+        self.poll_seconds = poll_seconds
+        self.on_rendered = on_rendered
+        self.status_file = status_file
+        self.jobs = {}
+        self.last_cycle = None
+        self._lock = threading.Lock()
+        self._pool = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        if self._thread is not None:
+            return self
+        ''' spawn, not fork: the parent is a threaded web server. '''
+        self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+        self._thread = threading.Thread(target=self._watch_ingest, name='prerender-scheduler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+
+    def _watch_ingest(self):
+        while not self._stop.is_set():
+            cycle = fleet_storage.read_ingest_cycle(self.servers_folder)
+            cycle_id = cycle["finished_at"] if cycle else None
+            if self.last_cycle is None or cycle_id != self.last_cycle:
+                self.last_cycle = cycle_id
+                self.schedule_all()
+            if self.status_file is not None:
+                self.write_status()
+            self._stop.wait(self.poll_seconds)
+
+    def write_status(self):
+        status = dict(self.status(), written_at=time.time())
+        tmp_file = f'{self.status_file}.tmp'
+        with open(tmp_file, 'w', encoding="utf-8") as f:
+            f.write(json.dumps(status))
+        os.replace(tmp_file, self.status_file)
+
+    def schedule_all(self):
+        ''' queue a render for every site/product pair, returns how many were queued. '''
+        queued = 0
+        for pair in self.pairs_fn():
+            if self.schedule(pair["site_name"], pair["product_name"]):
+                queued += 1
+        return queued
+
+    def schedule(self, site_name, product_name):
+        job_key = f'{site_name}__{product_name}'
+        with self._lock:
+            job = self.jobs.get(job_key)
+            if job and job["status"] in ('queued', 'running'):
+                return False
+            job = {
+                "site_name": site_name,
+                "product_name": product_name,
+                "status": 'queued',
+                "queued_at": time.time(),
+                "finished_at": None,
+                "duration_s": None,
+                "data_version": job["data_version"] if job else None,
+                "rebuilt": None,
+                "error": None,
+            }
+            self.jobs[job_key] = job
+        future = self._pool.submit(
+            chart_builder.prerender_chart,
+            self.servers_folder, self.charts_folder, site_name, product_name, self.hour_limit, self.max_points)
+        job["future"] = future
+        future.add_done_callback(lambda f: self._job_done(job_key, f))
+        return True
+
+    def _job_done(self, job_key, future):
+        with self._lock:
+            job = self.jobs[job_key]
+            job["finished_at"] = time.time()
+            job.pop("future", None)
+            try:
+                result = future.result()
+            except Exception as e:
+                job["status"] = 'failed'
+                job["error"] = repr(e)
+                perf_metrics.inc('prerender_failures_total', help_text='pre-render jobs that raised')
+                return
+            job["status"] = 'done'
+            job.update(result)
+        perf_metrics.observe('prerender_job_duration_seconds', result["duration_s"], help_text='pre-render job time inside the worker')
+        if result["rebuilt"]:
+            perf_metrics.inc('chart_rebuilds_total', labels={'source': 'prerender'}, help_text='chart artifacts rebuilt')
+        if result["rebuilt"] and self.on_rendered is not None:
+            self.on_rendered(job["site_name"], job["product_name"], self.hour_limit, self.max_points, result["data_version"])
+
+    def status(self):
+        ''' per-job status for the status endpoint, futures left out. '''
+        with self._lock:
+            jobs = []
+            for job in self.jobs.values():
+                job_copy = {k: v for k, v in job.items() if k != "future"}
+                future = job.get("future")
+                if job_copy["status"] == 'queued' and future is not None and future.running():
+                    job_copy["status"] = 'running'
+                jobs.append(job_copy)
+        counts = {}
+        for job in jobs:
+            counts[job["status"]] = counts.get(job["status"], 0) + 1
+        return {
+            "workers": self.workers,
+            "last_ingest_cycle": self.last_cycle,
+            "counts": counts,
+            "jobs": sorted(jobs, key=lambda j: (j["site_name"], j["product_name"])),
+        }
@@ -0,0 +1,129 @@
+import fleet_storage
+import threading
+import json
+import time
+
+
+''' live chart updates over Server-Sent Events.
+
+    a dashboard opens /v1/stream_chart?site_name=..&product_name=..&hours=..&since=<epoch>
+    once it is drawn.  the stream checks the data version of every device of the
+    chart (one listing + one stat each) and only reads the columns of the devices
+    that ingested, from the last point sent onwards:
+
+        event: points
+        id: <oldest "last point" over the devices>
+        data: {"devices": {"<device>": {"timestamp": [...], "<metric>": [...], ...}}}
+
+    the dashboard appends the points to its datasets and drops what has aged
+    out of the window.  a stream ends after STREAM_MAX_SECONDS so it does not
+    hold a server thread forever, the browser reconnects on its own and sends
+    the event id back as Last-Event-ID, which is where the next stream resumes.
+    points the browser already has are skipped on its side.
+
+    an open stream holds one server thread (the poll loop sleeps in it), so a
+    worker only keeps max_open of them (open_stream / close_stream).  past
+    that a request gets one poll: the points since Last-Event-ID, then the
+    response ends with a retry of STREAM_FALLBACK_RETRY_MS, so the browser
+    polls (EventSource reconnects by itself) until a slot is free again.
+'''
+
+STREAM_POLL_SECONDS = 5
+STREAM_KEEPALIVE_SECONDS = 15
+STREAM_MAX_SECONDS = 300
+STREAM_RETRY_MS = 2000
+STREAM_FALLBACK_RETRY_MS = 30000
+
+_open_lock = threading.Lock()
+_open_streams = 0
+
+
+def open_streams():
+    with _open_lock:
+        return _open_streams
+
+
+def open_stream(max_open):
+    ''' takes a stream slot of this process, False when max_open streams are open already. '''
+    global _open_streams
+    with _open_lock:
+        if _open_streams >= max_open:
+            return False
+        _open_streams += 1
+        return True
+
+
+def close_stream():
+    ''' gives back a slot of open_stream, when the response is closed (whether or not it was ever read). '''
+    global _open_streams
+    with _open_lock:
+        _open_streams -= 1
+
+
+def format_event(data, event=None, event_id=None):
+    ''' one SSE message, data is json on a single line. '''
+    lines = []
+    if event is not None:
+        lines.append(f'event: {event}')
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'data: {json.dumps(data, separators=(",", ":"))}')
+    return '\n'.join(lines) + '\n\n'
+
+
+def _start_epochs(servers_folder, site_name, device_names, since, hour_limit):
+    ''' per device, the last epoch the browser has: since, but never older than the chart window. '''
+    start_epochs = {}
+    for name in device_names:
+        latest_epoch = fleet_storage.latest_device_epoch(servers_folder, site_name, name)
+        if latest_epoch is None:
+            start_epochs[name] = since or 0
+        elif since is None:
+            start_epochs[name] = latest_epoch
+        else:
+            start_epochs[name] = max(since, latest_epoch - int(hour_limit * 3600))
+    return start_epochs
+
+
+def iter_chart_events(servers_folder, site_name, device_names, since, hour_limit, max_seconds=STREAM_MAX_SECONDS, retry_ms=STREAM_RETRY_MS):
+    """
+    SSE body of one chart stream.
+
+    Args:
+        servers_folder (str): root of the fleet store (server_fleet/).
+        site_name (str): site of the devices.
+        device_names (list): devices of the chart, in legend order.
+        since (int): newest epoch the browser already has, None for "from now on".
+        hour_limit (int): chart window, caps how far back a resume reads.
+        max_seconds (int): how long the stream stays open, 0 for a single poll.
+        retry_ms (int): reconnect delay the browser is told to use.
+
+    Yields:
+        str: SSE messages.
+    """
+    yield f'retry: {retry_ms}\n\n'
+    last_epochs = _start_epochs(servers_folder, site_name, device_names, since, hour_limit)
+    versions = {}
+    started = last_write = time.monotonic()
+    while True:
+        points = {}
+        for name in device_names:
+            version = fleet_storage.device_data_version(servers_folder, site_name, name)
+            if versions.get(name) == version:
+                continue
+            versions[name] = version
+            columns = fleet_storage.read_device_columns(servers_folder, site_name, name, start=last_epochs[name] + 1)
+            if columns[fleet_storage.TIMESTAMP_COLUMN]:
+                points[name] = columns
+                last_epochs[name] = columns[fleet_storage.TIMESTAMP_COLUMN][-1]
+
+        if points:
+            yield format_event({"devices": points}, event='points', event_id=min(last_epochs.values()))
+            last_write = time.monotonic()
+        elif time.monotonic() - last_write >= STREAM_KEEPALIVE_SECONDS:
+            yield ': keepalive\n\n'
+            last_write = time.monotonic()
+
+        if time.monotonic() - started >= max_seconds:
+            return
+        time.sleep(STREAM_POLL_SECONDS)
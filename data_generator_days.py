@@ -1,4 +1,6 @@
 from datetime import datetime, timedelta
+import fleet_storage
+import fleet_rollups
 import random
 import json
 import os
@@ -79,11 +81,8 @@ def create_fake_servers():
                     }
                     if dti not in device_list:
                         device_list.append(dti)
-                        dv_file = os.path.join(site_folder, f'{full_device}.json')
-                        if not os.path.exists(dv_file):
-                            p_dti = json.dumps(dti, indent=4)
-                            with open(dv_file, 'w', encoding="utf-8") as f:
-                                f.write(p_dti)
+                        if fleet_storage.read_device_info(servers_folder, site, full_device) is None:
+                            fleet_storage.write_device_info(servers_folder, dti)
 
     p_device_list = json.dumps(device_list, indent=4)
     with open(devices_json, 'w', encoding="utf-8") as f:
@@ -186,31 +185,14 @@ def update_performance_stats(devices_list):
 
         site_name = device["site_name"]
         device_name = device["device_name"]
-        site_folder = os.path.join(servers_folder, site_name)
-        os.makedirs(site_folder, exist_ok=True)
         print(site_name, device_name, count_of_stats)
-        
-        device_file_path = os.path.join(site_folder, f'{device_name}.json')
-        stats_data = []
-        if os.path.exists(device_file_path):
-            with open(device_file_path, 'r', encoding="utf-8") as file:
-                data = json.load(file)
-                try:
-                    stats_data = data["statistics"]
-                except KeyError:
-                    pass
-        stats_data.extend(stats)
-        new_json_data =  {
-            "device_info": device,
-            "statistics": stats_data
-        }
+
+        ''' columns are appended in place, existing history is never re-read. '''
+        fleet_rollups.ingest_device_rows(servers_folder, device, stats)
         device_updates_count += 1
         print(device_updates_count, device)
-        p_new_json_data = json.dumps(new_json_data, indent=4)
-        with open(device_file_path, 'w', encoding="utf-8") as f:
-            f.write(p_new_json_data)
-            
-    return device_updates_count    
+
+    return device_updates_count
  
 devices = create_fake_servers()
 update_performance_stats(devices)
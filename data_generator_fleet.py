@@ -0,0 +1,254 @@
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from array import array
+import numpy as np
+import fleet_storage
+import fleet_rollups
+import argparse
+import shutil
+import json
+import time
+import math
+import os
+
+
+''' vectorized fleet generator for scale testing.
+
+    same sites, products, value ranges, 8:00 - 13:00 peak multipliers and
+    clamps as data_generator_days, but every device is generated as numpy
+    columns from its own seeded RNG and written straight into the column
+    store and rollup tiers, one device per pool task.
+
+        python data_generator_fleet.py --devices 10000 --days 91 --interval 60 --seed 7
+
+    the target fleet folder is rebuilt: devices.json is replaced and every
+    generated device's history is written from scratch.
+'''
+
+script_folder = os.path.dirname(os.path.abspath(__file__))
+default_servers_folder = os.path.join(script_folder, 'server_fleet')
+
+site_options = [
+    "na-us-north-east-01",
+    "na-us-north-east-02",
+    "na-us-north-west-01",
+    "na-us-north-west-02",
+    "em-uk-north-east-01",
+    "em-uk-north-east-02",
+    "ap-sg-north-west-01",
+    "ap-sg-north-west-02",
+    "ap-jp-north-west-01",
+    "ap-jp-north-west-02"
+]
+server_product_vendors = {
+    "Dell PowerScale":  "ps",
+    "Dell PowerEdge": "pe",
+    "NetApp SolidFire": "sf",
+    "NetApp ONTAP": "ot",
+    "NetApp StorageGRID": "sg",
+    "VAST Data": "vd",
+    "Pure FlashBlade": "pf",
+    "Qumulo": "qu",
+    "MinIO": "mi"
+}
+envs = ["pr"]
+
+PEAK_HOURS = (8, 13)
+
+''' metric -> (base low, base high, peak multiplier, clamp), see data_generator_days. '''
+METRIC_PROFILES = {
+    "cpu_usage_percent": (10.0, 70.0, 1.4, 99.0),
+    "memory_usage_gb": (2.0, 12.0, 1.3, 16.0),
+    "disk_io_mbps": (50.0, 350.0, 1.5, 500.0),
+    "network_latency_ms": (1.0, 60.0, 1.6, 100.0),
+    "process_count": (50, 150, 1.4, 200),
+}
+
+
+def create_fleet_devices(device_count):
+    """
+    Spreads device_count devices evenly over every site / product.
+
+    Returns:
+        list: device dicts in the devices.json shape.
+    """
+    per_product = math.ceil(device_count / (len(site_options) * len(server_product_vendors) * len(envs)))
+    number_width = max(3, len(str(per_product)))
+
+    device_list = []
+    for y in range(1, per_product + 1):
+        for site in site_options:
+            split_site = site.split('-')
+            site_id = f'{split_site[0]}{split_site[1]}{split_site[2][0]}{split_site[3][0]}{split_site[4]}'
+            for vendor_product, device_prefix in server_product_vendors.items():
+                for env in envs:
+                    if len(device_list) == device_count:
+                        break
+                    device_list.append({
+                        "site_name": site,
+                        "product_name": vendor_product,
+                        "environment": env,
+                        "device_name": f'{site_id}{device_prefix}{env}{str(y).zfill(number_width)}'
+                    })
+    return sorted(device_list, key=lambda d: (d["site_name"], d["product_name"], d["device_name"]))
+
+
+def local_hours(timestamps):
+    ''' local hour of day of every epoch second, localtime() is called once per distinct hour. '''
+    epoch_hours, inverse = np.unique(timestamps // 3600, return_inverse=True)
+    hour_of_day = np.array([time.localtime(int(h) * 3600).tm_hour for h in epoch_hours], dtype=np.int64)
+    return hour_of_day[inverse]
+
+
+def generate_device_columns(rng, start_epoch, samples, interval):
+    """
+    One device's history as numpy columns.
+
+    Args:
+        rng (np.random.Generator): the device's own generator.
+        start_epoch (int): first sample, epoch seconds.
+        samples (int): number of rows.
+        interval (int): seconds between rows.
+
+    Returns:
+        dict: column name -> np.ndarray, fleet_storage.ALL_COLUMNS names.
+    """
+    timestamps = start_epoch + np.arange(samples, dtype=np.int64) * interval
+    hours = local_hours(timestamps)
+    is_peak_hours = (hours >= PEAK_HOURS[0]) & (hours < PEAK_HOURS[1])
+
+    columns = {fleet_storage.TIMESTAMP_COLUMN: timestamps}
+    for metric, (low, high, peak_multiplier, clamp) in METRIC_PROFILES.items():
+        multiplier = np.where(is_peak_hours, peak_multiplier, 1.0)
+        if fleet_storage.METRIC_COLUMNS[metric] == "q":
+            base = rng.integers(low, high + 1, size=samples)
+            columns[metric] = np.minimum(clamp, (base * multiplier).astype(np.int64))
+        else:
+            base = rng.uniform(low, high, size=samples)
+            columns[metric] = np.round(np.minimum(clamp, base * multiplier), 2)
+    return columns
+
+
+def write_device_rollups(servers_folder, site_name, device_name, columns):
+    """
+    fleet_rollups.update_rollups for a device without rollups yet, with
+    every tier reduced in numpy.  The last bucket of each tier stays open
+    in heads.json, exactly as the incremental path leaves it.
+    """
+    folder = fleet_rollups.rollup_folder(servers_folder, site_name, device_name)
+    os.makedirs(folder, exist_ok=True)
+    timestamps = columns[fleet_storage.TIMESTAMP_COLUMN]
+    heads = {}
+
+    for tier, step in fleet_rollups.ROLLUP_TIERS.items():
+        buckets = timestamps - timestamps % step
+        starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+        counts = np.diff(np.r_[starts, len(buckets)])
+        reduced = {fleet_rollups.BUCKET_COLUMN: buckets[starts], fleet_rollups.COUNT_COLUMN: counts}
+        sums = {}
+        for metric in fleet_storage.METRIC_NAMES:
+            values = columns[metric]
+            reduced[fleet_rollups.rollup_column_name(metric, "min")] = np.minimum.reduceat(values, starts)
+            reduced[fleet_rollups.rollup_column_name(metric, "max")] = np.maximum.reduceat(values, starts)
+            sums[metric] = np.add.reduceat(values.astype(np.float64), starts)
+            reduced[fleet_rollups.rollup_column_name(metric, "avg")] = np.round(sums[metric] / counts, 4)
+
+        if len(starts) > 1:
+            tier_folder = os.path.join(folder, tier)
+            os.makedirs(tier_folder, exist_ok=True)
+            for name, typecode in fleet_rollups.rollup_columns().items():
+                dtype = np.int64 if typecode == "q" else np.float64
+                with open(fleet_storage.column_file_path(tier_folder, name), 'wb') as f:
+                    reduced[name][:-1].astype(dtype).tofile(f)
+
+        heads[tier] = {
+            "bucket": int(buckets[starts[-1]]),
+            "count": int(counts[-1]),
+            "min": {m: reduced[fleet_rollups.rollup_column_name(m, "min")][-1].item() for m in fleet_storage.METRIC_NAMES},
+            "max": {m: reduced[fleet_rollups.rollup_column_name(m, "max")][-1].item() for m in fleet_storage.METRIC_NAMES},
+            "sum": {m: sums[m][-1].item() for m in fleet_storage.METRIC_NAMES},
+        }
+    fleet_rollups._save_heads(folder, heads)
+
+
+def generate_device(servers_folder, device, device_index, seed, start_epoch, samples, interval):
+    ''' pool task: generate one device and replace its history, returns rows written. '''
+    rng = np.random.default_rng([seed, device_index])
+    columns = generate_device_columns(rng, start_epoch, samples, interval)
+
+    device_folder = fleet_storage.write_device_info(servers_folder, device)
+    for name in fleet_storage.list_device_segments(device_folder):
+        shutil.rmtree(os.path.join(device_folder, name))
+    shutil.rmtree(os.path.join(device_folder, fleet_rollups.ROLLUP_FOLDER), ignore_errors=True)
+
+    ''' the store writes array() slices, one buffer copy per column. '''
+    store_columns = {}
+    for name, typecode in fleet_storage.ALL_COLUMNS.items():
+        values = array(typecode)
+        values.frombytes(columns[name].astype(np.int64 if typecode == "q" else np.float64).tobytes())
+        store_columns[name] = values
+    fleet_storage.append_device_columns(servers_folder, device, store_columns)
+    write_device_rollups(servers_folder, device["site_name"], device["device_name"], columns)
+    fleet_storage.compress_cold_segments(servers_folder, device["site_name"], device["device_name"])
+    return samples
+
+
+def generate_fleet(servers_folder, device_count, days, interval, seed, workers=None):
+    """
+    Generates a whole fleet into servers_folder.
+
+    Args:
+        servers_folder (str): fleet store root, devices.json is replaced.
+        device_count (int): devices to create.
+        days (int): history per device, ending at the start of today.
+        interval (int): seconds between samples.
+        seed (int): same seed + arguments gives the same fleet.
+        workers (int): pool size, every core by default.
+
+    Returns:
+        int: rows written across the fleet.
+    """
+    os.makedirs(servers_folder, exist_ok=True)
+    device_list = create_fleet_devices(device_count)
+    with open(os.path.join(servers_folder, 'devices.json'), 'w', encoding="utf-8") as f:
+        f.write(json.dumps(device_list, indent=4))
+
+    end_time = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    samples = int(timedelta(days=days).total_seconds() // interval)
+    start_epoch = int(end_time.timestamp()) - samples * interval
+    print("devices:".ljust(30), len(device_list))
+    print("samples per device:".ljust(30), samples)
+    print("workers:".ljust(30), workers or os.cpu_count())
+
+    started = time.perf_counter()
+    rows_written = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(generate_device, servers_folder, device, index, seed, start_epoch, samples, interval)
+            for index, device in enumerate(device_list)
+        ]
+        for done, future in enumerate(futures, start=1):
+            rows_written += future.result()
+            if done % 100 == 0 or done == len(futures):
+                print('devices written:'.ljust(30), done, f'{time.perf_counter() - started:.1f}s')
+
+    fleet_storage.mark_ingest_cycle(servers_folder, len(device_list))
+    return rows_written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="generate a synthetic fleet straight into the column store.")
+    parser.add_argument('--devices', type=int, default=360, help="number of devices (spread over every site / product)")
+    parser.add_argument('--days', type=int, default=91, help="days of history per device")
+    parser.add_argument('--interval', type=int, default=60, help="seconds between samples")
+    parser.add_argument('--seed', type=int, default=0, help="RNG seed, the same seed gives the same fleet")
+    parser.add_argument('--workers', type=int, default=None, help="process pool size, every core by default")
+    parser.add_argument('--servers-folder', default=default_servers_folder, help="fleet store root")
+    args = parser.parse_args()
+
+    rows_written = generate_fleet(args.servers_folder, args.devices, args.days, args.interval, args.seed, args.workers)
+    print("rows written:".ljust(30), rows_written)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,9 @@
 from datetime import datetime, timedelta
+import fleet_storage
+import fleet_rollups
+import fleet_alerts
+import perf_metrics
+import time
 import random
 import json
 import os
@@ -79,11 +84,8 @@ def create_fake_servers():
                     }
                     if dti not in device_list:
                         device_list.append(dti)
-                        dv_file = os.path.join(site_folder, f'{full_device}.json')
-                        if not os.path.exists(dv_file):
-                            p_dti = json.dumps(dti, indent=4)
-                            with open(dv_file, 'w', encoding="utf-8") as f:
-                                f.write(p_dti)
+                        if fleet_storage.read_device_info(servers_folder, site, full_device) is None:
+                            fleet_storage.write_device_info(servers_folder, dti)
 
     p_device_list = json.dumps(device_list, indent=4)
     with open(devices_json, 'w', encoding="utf-8") as f:
@@ -136,72 +138,51 @@ def generate_fake_performance_data_single_server():
     return performance_data
 
 
-def filter_last_xx_days_compact(data_list):
-    # Calculate cutoff date (xx days ago from now)
-    cutoff_date = datetime.now() - timedelta(days=14)
-
-    filtered_data = []   
-    for entry in data_list:
-        try:
-            # Parse the timestamp string
-            entry_timestamp = datetime.strptime(entry["timestamp"], "%Y-%m-%d %H:%M:%S")
-            # Keep entry if it's within the last xx days
-            if entry_timestamp >= cutoff_date:
-                filtered_data.append(entry)
-        except (KeyError, ValueError) as e:
-            # Skip entries with missing or invalid timestamps
-            print(f"Skipping entry due to error: {e}")
-            continue
-    
-    return filtered_data
+def filter_last_xx_days_cutoff(days=14):
+    # Calculate cutoff date (xx days ago from now) as epoch seconds
+    cutoff_date = datetime.now() - timedelta(days=days)
+    return int(cutoff_date.timestamp())
 
 
 def create_performance_stats(devices_list):
 
     device_updates_count = 0
+    cutoff_epoch = filter_last_xx_days_cutoff()
     for device in devices_list:
         stat_single = generate_fake_performance_data_single_server()
         site_name = device["site_name"]
         device_name = device["device_name"]
-        site_folder = os.path.join(servers_folder, site_name)
-        os.makedirs(site_folder, exist_ok=True)
-        device_file_path = os.path.join(site_folder, f'{device_name}.json')
-        stats_data = []
-        if os.path.exists(device_file_path):
-            with open(device_file_path, 'r', encoding="utf-8") as file:
-                try:
-                    data = json.load(file)
-                    stats_data = data["statistics"]
-                except KeyError:
-                    pass
-                   
-        pre_filter = len(stats_data)
-                   
-        """ remove XX day entries. """
-        stats_data = filter_last_xx_days_compact(stats_data)   
-        
-        pst_filter = len(stats_data)
-        
-        stats_data.extend(stat_single)
-        new_json_data =  {
-            "device_info": device,
-            "statistics": stats_data
-        }
+
+        """ remove XX day entries, whole day segments at a time. """
+        with perf_metrics.phase('drop_expired', 'ingest_phase_duration_seconds'):
+            dropped_segments = fleet_storage.drop_expired_segments(servers_folder, site_name, device_name, cutoff_epoch)
+
+        """ closed days older than COLD_SEGMENT_DAYS go into one compressed segment, once. """
+        with perf_metrics.phase('compress_cold', 'ingest_phase_duration_seconds'):
+            fleet_storage.compress_cold_segments(servers_folder, site_name, device_name)
+
+        """ constant-time append to today's segment. """
+        with perf_metrics.phase('ingest_device', 'ingest_phase_duration_seconds'):
+            fleet_rollups.ingest_device_rows(servers_folder, device, stat_single)
         device_updates_count += 1
         p_duc = str(device_updates_count).zfill(3)
-        print(p_duc, device, pre_filter, pst_filter)
-
-        p_new_json_data = json.dumps(new_json_data, indent=4)
-        with open(device_file_path, 'w', encoding="utf-8") as f:
-            f.write(p_new_json_data)
+        print(p_duc, device, dropped_segments)
 
-            
     return device_updates_count
 
 
 def main():
+    cycle_started = time.perf_counter()
     devices = create_fake_servers()
-    create_performance_stats(devices)
+    devices_updated = create_performance_stats(devices)
+    fleet_storage.mark_ingest_cycle(servers_folder, devices_updated)
+    devices_alerting = fleet_alerts.flush_alert_summary(servers_folder)
+    print('devices alerting:'.ljust(30), devices_alerting)
+
+    """ this runs as its own process, the app's /metrics reads the merged totals from disk. """
+    perf_metrics.observe('ingest_cycle_duration_seconds', time.perf_counter() - cycle_started, help_text='full ingest pass over the fleet')
+    perf_metrics.inc('ingest_devices_total', devices_updated, help_text='device updates written by the ingest loop')
+    perf_metrics.merge_snapshot_file(os.path.join(servers_folder, fleet_storage.INGEST_METRICS_FILE))
     print('script completed')
 
 
@@ -0,0 +1,31 @@
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+''' compact json for the chart hot paths, through orjson when it is installed. '''
+
+
+def dumps_bytes(obj):
+    """
+    Compact json (no indent, no spaces after separators).
+
+    Returns:
+        bytes: utf-8 encoded document.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+
+def dumps(obj):
+    return dumps_bytes(obj).decode('utf-8')
+
+
+def loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
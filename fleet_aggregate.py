@@ -0,0 +1,129 @@
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import fleet_storage
+import fleet_rollups
+import warnings
+import hashlib
+import math
+
+
+''' percentile bands across the devices of a site, a product or the whole fleet.
+
+    every device is read from the finest rollup tier that fits the bucket
+    budget, averaged into a shared time grid (devices x buckets) and the
+    grid is reduced column-wise in numpy, so the browser gets one banded
+    series per metric instead of one line per device.
+'''
+
+AGGREGATE_STATS = ["min", "p50", "p95", "p99", "max"]
+DEFAULT_MAX_BUCKETS = 500
+AGGREGATE_LOAD_WORKERS = 8
+
+_load_pool = None
+
+
+def aggregate_step(hour_limit, max_buckets=DEFAULT_MAX_BUCKETS, step=None):
+    """
+    Tier to read and bucket width for a window.
+
+    Returns:
+        tuple: (tier, step seconds), step is a multiple of the tier's step
+            and yields at most max_buckets buckets unless step was given.
+    """
+    tier = fleet_rollups.pick_rollup_tier(hour_limit, max_buckets)
+    tier_step = fleet_rollups.TIER_STEPS[tier]
+    if step is None:
+        step = math.ceil(hour_limit * 3600 / max_buckets)
+    step = max(tier_step, math.ceil(step / tier_step) * tier_step)
+    return tier, step
+
+
+def _read_device_series(servers_folder, site_name, device_name, tier, metrics, hour_limit):
+    ''' (timestamps, values[metric]) of one device's window, bucket averages for rollup tiers. '''
+    if tier == fleet_rollups.RAW_TIER:
+        columns = fleet_storage.read_device_columns(servers_folder, site_name, device_name, metrics=metrics, hours=hour_limit)
+        values = [columns[metric] for metric in metrics]
+    else:
+        columns = fleet_rollups.read_rollup_columns(
+            servers_folder, site_name, device_name, tier, metrics=metrics, stats=["avg"], hours=hour_limit)
+        values = [columns[fleet_rollups.rollup_column_name(metric, "avg")] for metric in metrics]
+    timestamps = np.asarray(columns[fleet_storage.TIMESTAMP_COLUMN], dtype=np.int64)
+    return timestamps, np.asarray(values, dtype=np.float64).reshape(len(metrics), len(timestamps))
+
+
+def _pool():
+    global _load_pool
+    if _load_pool is None:
+        _load_pool = ThreadPoolExecutor(max_workers=AGGREGATE_LOAD_WORKERS, thread_name_prefix='aggregate-load')
+    return _load_pool
+
+
+def aggregate_data_version(servers_folder, devices):
+    ''' changes when any device of the group ingests. '''
+    versions = [
+        f'{d["device_name"]}:{fleet_storage.device_data_version(servers_folder, d["site_name"], d["device_name"])}'
+        for d in devices
+    ]
+    return hashlib.sha1('|'.join(versions).encode()).hexdigest()[:16]
+
+
+def aggregate_devices(servers_folder, devices, metrics, hour_limit, max_buckets=DEFAULT_MAX_BUCKETS, step=None):
+    """
+    Per bucket min / p50 / p95 / p99 / max across devices.
+
+    Args:
+        servers_folder (str): root of the fleet store (server_fleet/).
+        devices (list): inventory records (site_name, device_name).
+        metrics (list): metric names to aggregate.
+        hour_limit (int): window in hours, ending at the newest sample of the group.
+        max_buckets (int): bucket budget when step is not given.
+        step (int): bucket width in seconds.
+
+    Returns:
+        dict: columnar result, "timestamps" (bucket starts, epoch seconds),
+            "devices" (reporting devices per bucket) and per metric one list
+            per stat, None where no device reported.
+    """
+    tier, step = aggregate_step(hour_limit, max_buckets, step)
+    futures = [
+        _pool().submit(_read_device_series, servers_folder, d["site_name"], d["device_name"], tier, metrics, hour_limit)
+        for d in devices
+    ]
+    series = [future.result() for future in futures]
+    series = [(ts, values) for ts, values in series if len(ts)]
+
+    result = {"tier": tier, "step": step, "device_count": len(devices), "timestamps": [], "devices": [], "metrics": {}}
+    if not series:
+        return result
+
+    end = max(int(ts[-1]) for ts, _ in series)
+    end_bucket = end - end % step
+    start_bucket = end_bucket - (math.ceil(hour_limit * 3600 / step) - 1) * step
+    n_buckets = (end_bucket - start_bucket) // step + 1
+
+    ''' every sample lands in (device, bucket), samples of the same cell are averaged. '''
+    device_index = np.concatenate([np.full(len(ts), d, dtype=np.int64) for d, (ts, _) in enumerate(series)])
+    bucket_index = (np.concatenate([ts for ts, _ in series]) - start_bucket) // step
+    values = np.concatenate([v for _, v in series], axis=1)
+    in_window = (bucket_index >= 0) & (bucket_index < n_buckets)
+    cell = device_index[in_window] * n_buckets + bucket_index[in_window]
+    values = values[:, in_window]
+
+    n_cells = len(series) * n_buckets
+    counts = np.bincount(cell, minlength=n_cells).reshape(len(series), n_buckets)
+    reporting = (counts > 0).sum(axis=0)
+
+    result["timestamps"] = (start_bucket + np.arange(n_buckets, dtype=np.int64) * step).tolist()
+    result["devices"] = reporting.tolist()
+    with warnings.catch_warnings(), np.errstate(invalid='ignore', divide='ignore'):
+        ''' all-NaN buckets (no device reported) are expected and become None. '''
+        warnings.simplefilter('ignore', RuntimeWarning)
+        for m, metric in enumerate(metrics):
+            grid = np.bincount(cell, weights=values[m], minlength=n_cells).reshape(len(series), n_buckets) / counts
+            p50, p95, p99 = np.nanpercentile(grid, [50, 95, 99], axis=0)
+            bands = {"min": np.nanmin(grid, axis=0), "p50": p50, "p95": p95, "p99": p99, "max": np.nanmax(grid, axis=0)}
+            result["metrics"][metric] = {
+                stat: [None if math.isnan(v) else v for v in np.round(bands[stat], 3).tolist()]
+                for stat in AGGREGATE_STATS
+            }
+    return result
@@ -0,0 +1,281 @@
+import fleet_storage
+import threading
+import math
+import json
+import os
+
+
+''' streaming alert rules, evaluated as samples are ingested.
+
+    each device has a small state, kept in memory by the ingesting process:
+
+        stats   "<metric>:<span>" -> exponentially weighted mean / variance / samples
+        rules   rule name -> over_since, firing, since, value
+
+    every sample updates the stats and rules in constant time and memory, no
+    history is ever re-read and nothing is written per sample.  once per
+    ingest cycle flush_alert_summary writes the states of every device into
+    server_fleet/.alert_state.json (one write, read back once by the next
+    process) and the firing alerts of the devices it touched into
+    server_fleet/.alerts.json, which is what /v1/alerts and the chart pages
+    read.  a device missing from .alert_state.json starts from its older
+    per-device server_fleet/<site_name>/<device_name>/alert_state.json, if any.
+
+    rules live in alert_rules.json:
+        name         unique rule name
+        metric       one of fleet_storage.METRIC_NAMES
+        kind         "threshold" (raw sample), "ewma" (smoothed value) or "zscore"
+                     (sample against the exponentially weighted mean / stddev before it)
+        op, value    ">", ">=", "<", "<=" against value (zscore compares |z|)
+        for_seconds  how long the condition has to hold before the alert fires
+        span         ewma / zscore window in samples, alpha = 2 / (span + 1)
+        min_samples  zscore warm-up before it can fire
+        severity     free text, e.g. "warning" / "critical"
+'''
+
+script_folder = os.path.dirname(os.path.abspath(__file__))
+ALERT_RULES_FILE = os.path.join(script_folder, 'alert_rules.json')
+ALERT_STATE_FILE = '.alert_state.json'
+DEVICE_STATE_FILE = 'alert_state.json'
+ALERT_SUMMARY_FILE = '.alerts.json'
+
+RULE_KINDS = ("threshold", "ewma", "zscore")
+OPERATORS = {
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+}
+DEFAULT_SPAN = 30
+
+_rules_cache = {"stamp": None, "rules": []}
+_pending_lock = threading.Lock()
+_pending_firing = {}
+''' servers_folder -> {"<site>/<device>": state} of this process, and the folders with unsaved changes. '''
+_device_states = {}
+_dirty_folders = set()
+
+
+def load_rules(rules_file=ALERT_RULES_FILE):
+    ''' rules from alert_rules.json, re-read only when the file changes. '''
+    try:
+        file_stat = os.stat(rules_file)
+    except FileNotFoundError:
+        return []
+    stamp = (rules_file, file_stat.st_mtime_ns, file_stat.st_size)
+    if stamp != _rules_cache["stamp"]:
+        with open(rules_file, 'r', encoding="utf-8") as f:
+            rules = json.load(f)
+        for rule in rules:
+            if rule.get("kind", "threshold") not in RULE_KINDS or rule.get("op", ">") not in OPERATORS:
+                raise ValueError(f'invalid alert rule: {rule}')
+        _rules_cache["rules"] = rules
+        _rules_cache["stamp"] = stamp
+    return _rules_cache["rules"]
+
+
+def _read_json(json_file, default):
+    try:
+        with open(json_file, 'r', encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return default
+
+
+def _fleet_states(servers_folder):
+    ''' every device's state, .alert_state.json is read once per process, call with _pending_lock held. '''
+    states = _device_states.get(servers_folder)
+    if states is None:
+        states = _read_json(os.path.join(servers_folder, ALERT_STATE_FILE), {})
+        _device_states[servers_folder] = states
+    return states
+
+
+def load_device_state(servers_folder, site_name, device_name):
+    ''' the live state of one device, changes to it are saved by the next save_alert_state. '''
+    key = f'{site_name}/{device_name}'
+    with _pending_lock:
+        states = _fleet_states(servers_folder)
+        state = states.get(key)
+        if state is None:
+            device_state_file = os.path.join(servers_folder, site_name, device_name, DEVICE_STATE_FILE)
+            state = _read_json(device_state_file, {"stats": {}, "rules": {}})
+            states[key] = state
+        _dirty_folders.add(servers_folder)
+    return state
+
+
+def save_alert_state(servers_folder):
+    """
+    Writes the state of every device into server_fleet/.alert_state.json,
+    one write for all of them, nothing when no device was evaluated since.
+
+    Returns:
+        int: devices saved.
+    """
+    with _pending_lock:
+        if servers_folder not in _dirty_folders:
+            return 0
+        _dirty_folders.discard(servers_folder)
+        state_json = json.dumps(_device_states[servers_folder])
+        device_count = len(_device_states[servers_folder])
+    state_file = os.path.join(servers_folder, ALERT_STATE_FILE)
+    tmp_file = f'{state_file}.tmp'
+    with open(tmp_file, 'w', encoding="utf-8") as f:
+        f.write(state_json)
+    os.replace(tmp_file, state_file)
+    return device_count
+
+
+def _update_stats(stats, value, span):
+    """
+    Folds one sample into an exponentially weighted mean / variance.
+
+    Returns:
+        tuple: (mean, variance, samples) as they were before the sample,
+            which is what a z-score has to be measured against.
+    """
+    before = (stats["mean"], stats["var"], stats["n"])
+    if stats["n"] == 0:
+        stats["mean"] = value
+    else:
+        alpha = 2.0 / (span + 1)
+        delta = value - stats["mean"]
+        stats["mean"] += alpha * delta
+        stats["var"] = (1 - alpha) * (stats["var"] + alpha * delta * delta)
+    stats["n"] += 1
+    return before
+
+
+def evaluate_sample(rules, state, timestamp, sample):
+    ''' one sample through every rule, O(rules) time, state is updated in place. '''
+    stats_before = {}
+    for rule in rules:
+        metric = rule["metric"]
+        if metric not in sample:
+            continue
+        span = rule.get("span", DEFAULT_SPAN)
+        stats_key = f'{metric}:{span}'
+        if stats_key not in stats_before:
+            stats = state["stats"].setdefault(stats_key, {"mean": 0.0, "var": 0.0, "n": 0})
+            stats_before[stats_key] = _update_stats(stats, float(sample[metric]), span)
+
+    for rule in rules:
+        metric = rule["metric"]
+        if metric not in sample:
+            continue
+        kind = rule.get("kind", "threshold")
+        stats_key = f'{metric}:{rule.get("span", DEFAULT_SPAN)}'
+        if kind == "threshold":
+            observed = float(sample[metric])
+        elif kind == "ewma":
+            observed = state["stats"][stats_key]["mean"]
+        else:
+            mean, var, n = stats_before[stats_key]
+            if n < rule.get("min_samples", DEFAULT_SPAN) or var <= 0:
+                observed = None
+            else:
+                observed = abs(float(sample[metric]) - mean) / math.sqrt(var)
+
+        rule_state = state["rules"].setdefault(rule["name"], {"over_since": None, "firing": False, "since": None, "value": None})
+        breach = observed is not None and OPERATORS[rule.get("op", ">")](observed, rule["value"])
+        if breach:
+            if rule_state["over_since"] is None:
+                rule_state["over_since"] = timestamp
+            is_firing = timestamp - rule_state["over_since"] >= rule.get("for_seconds", 0)
+            if is_firing and not rule_state["firing"]:
+                rule_state["since"] = timestamp
+            rule_state["firing"] = is_firing
+        else:
+            rule_state.update({"over_since": None, "firing": False, "since": None})
+        rule_state["value"] = None if observed is None else round(observed, 4)
+        rule_state["last_timestamp"] = timestamp
+
+
+def firing_alerts(rules, state):
+    by_name = {rule["name"]: rule for rule in rules}
+    alerts = []
+    for name, rule_state in state["rules"].items():
+        rule = by_name.get(name)
+        if rule is None or not rule_state["firing"]:
+            continue
+        alerts.append({
+            "rule": name,
+            "metric": rule["metric"],
+            "kind": rule.get("kind", "threshold"),
+            "severity": rule.get("severity", "warning"),
+            "op": rule.get("op", ">"),
+            "threshold": rule["value"],
+            "value": rule_state["value"],
+            "since": rule_state["since"],
+            "last_timestamp": rule_state.get("last_timestamp"),
+        })
+    return alerts
+
+
+def evaluate_device_columns(servers_folder, device, columns, rules=None):
+    """
+    Runs freshly ingested samples through the alert rules.
+
+    Args:
+        servers_folder (str): root of the fleet store (server_fleet/).
+        device (dict): inventory record of the device.
+        columns (dict): output of fleet_storage.rows_to_columns.
+        rules (list): load_rules() by default.
+
+    Returns:
+        list: alerts firing for the device after the last sample.
+    """
+    rules = load_rules() if rules is None else rules
+    if not rules:
+        return []
+    site_name, device_name = device["site_name"], device["device_name"]
+    state = load_device_state(servers_folder, site_name, device_name)
+    metric_names = [name for name in columns if name != fleet_storage.TIMESTAMP_COLUMN]
+    timestamps = columns[fleet_storage.TIMESTAMP_COLUMN]
+    for i, timestamp in enumerate(timestamps):
+        evaluate_sample(rules, state, timestamp, {name: columns[name][i] for name in metric_names})
+
+    alerts = firing_alerts(rules, state)
+    with _pending_lock:
+        _pending_firing[(site_name, device_name)] = {
+            "site_name": site_name,
+            "product_name": device.get("product_name"),
+            "device_name": device_name,
+            "alerts": alerts,
+        }
+    return alerts
+
+
+def read_alert_summary(servers_folder):
+    ''' device key "<site>/<device>" -> firing alerts, as of the last flush. '''
+    return _read_json(os.path.join(servers_folder, ALERT_SUMMARY_FILE), {})
+
+
+def flush_alert_summary(servers_folder):
+    """
+    Saves the alert state (save_alert_state) and merges the firing alerts of
+    every device evaluated since the last flush into server_fleet/.alerts.json.
+    Called once per ingest cycle.
+
+    Returns:
+        int: devices with at least one firing alert.
+    """
+    save_alert_state(servers_folder)
+    with _pending_lock:
+        pending = dict(_pending_firing)
+        _pending_firing.clear()
+    summary = read_alert_summary(servers_folder)
+    for (site_name, device_name), entry in pending.items():
+        key = f'{site_name}/{device_name}'
+        if entry["alerts"]:
+            summary[key] = entry
+        else:
+            summary.pop(key, None)
+
+    summary_file = os.path.join(servers_folder, ALERT_SUMMARY_FILE)
+    tmp_file = f'{summary_file}.tmp'
+    with open(tmp_file, 'w', encoding="utf-8") as f:
+        f.write(json.dumps(summary, indent=4))
+    os.replace(tmp_file, summary_file)
+    return len(summary)
@@ -0,0 +1,239 @@
+from fleet_inventory import get_inventory
+import data_generator_single
+import fleet_storage
+import fleet_rollups
+import fleet_alerts
+import perf_metrics
+import fast_json
+import argparse
+import asyncio
+import aiohttp
+import time
+import os
+
+
+''' concurrent collector: polls every device endpoint of the fleet and ingests what it returns.
+
+    python fleet_collector.py --endpoint-template "http://{device_name}.example.net:9100/stats"
+    python fleet_collector.py --once --endpoint-template "http://127.0.0.1:9100/devices/{site_name}/{device_name}"
+
+    a device endpoint answers GET <url>?since=<epoch> with the device json shape
+    ({"device_info": {...}, "statistics": [{"timestamp": ..., metric: ...}, ...]}),
+    fleet_simulator.py serves exactly that for a local fleet.
+
+    one pass:
+        pollers (--concurrency of them) share one aiohttp session, connections are
+            kept alive and capped per host (--per-host), every request has a timeout.
+        results go through a bounded queue, when storage falls behind the pollers
+            wait on it instead of piling responses up in memory (backpressure).
+        one writer drains the queue and ingests a batch of devices per executor
+            call (retention, cold compression, append, rollups, alerts), so the event loop never
+            blocks on file io and a device is never written by two threads.
+        a device's since only moves once its rows are stored.  a batch that fails
+            to write ends the pass with its error (pollers waiting on the queue are
+            cancelled) and the next pass reads those devices' newest epoch from storage.
+'''
+
+DEFAULT_ENDPOINT_TEMPLATE = 'http://127.0.0.1:9100/devices/{site_name}/{device_name}'
+DEFAULT_CONCURRENCY = 256
+DEFAULT_PER_HOST = 8
+DEFAULT_TIMEOUT = 10
+DEFAULT_BATCH_SIZE = 200
+RETENTION_DAYS = 14
+
+
+def device_endpoint(device, endpoint_template):
+    ''' an "endpoint" in the inventory record wins over the template. '''
+    return device.get("endpoint") or endpoint_template.format(**device)
+
+
+def write_batch(servers_folder, batch, cutoff_epoch):
+    """
+    Ingests the samples of a batch of devices, runs in an executor thread.
+
+    Args:
+        servers_folder (str): root of the fleet store (server_fleet/).
+        batch (list): (device, rows) pairs, rows already newer than the stored data.
+        cutoff_epoch (int): retention cutoff, older day segments are dropped.
+
+    Returns:
+        int: samples written.
+    """
+    samples = 0
+    for device, rows in batch:
+        with perf_metrics.phase('drop_expired', 'ingest_phase_duration_seconds'):
+            fleet_storage.drop_expired_segments(servers_folder, device["site_name"], device["device_name"], cutoff_epoch)
+        with perf_metrics.phase('compress_cold', 'ingest_phase_duration_seconds'):
+            fleet_storage.compress_cold_segments(servers_folder, device["site_name"], device["device_name"])
+        with perf_metrics.phase('ingest_device', 'ingest_phase_duration_seconds'):
+            samples += fleet_rollups.ingest_device_rows(servers_folder, device, rows)
+    return samples
+
+
+async def poll_device(session, device, url, since):
+    """
+    One device endpoint, the rows newer than since in ascending time order.
+    """
+    params = {} if since is None else {'since': since}
+    async with session.get(url, params=params) as response:
+        payload = await response.json(loads=fast_json.loads, content_type=None)
+    rows = []
+    for row in payload.get("statistics", []):
+        timestamp = row[fleet_storage.TIMESTAMP_COLUMN]
+        epoch = fleet_storage.timestamp_to_epoch(timestamp) if isinstance(timestamp, str) else int(timestamp)
+        if since is None or epoch > since:
+            rows.append({**row, fleet_storage.TIMESTAMP_COLUMN: epoch})
+    rows.sort(key=lambda row: row[fleet_storage.TIMESTAMP_COLUMN])
+    return rows
+
+
+async def _poller(session, servers_folder, work, results, endpoint_template, since_epochs, summary):
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            device = work.get_nowait()
+        except asyncio.QueueEmpty:
+            return
+        device_name = device["device_name"]
+        if device_name not in since_epochs:
+            since_epochs[device_name] = await loop.run_in_executor(
+                None, fleet_storage.latest_device_epoch, servers_folder, device["site_name"], device_name)
+        try:
+            rows = await poll_device(session, device, device_endpoint(device, endpoint_template), since_epochs[device_name])
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError, KeyError) as e:
+            summary["errors"] += 1
+            perf_metrics.inc('collector_errors_total', labels={'reason': type(e).__name__}, help_text='device polls that failed')
+            continue
+        summary["polled"] += 1
+        if rows:
+            ''' blocks while the writer is behind, the writer moves since_epochs once the rows are stored. '''
+            await results.put((device, rows))
+
+
+async def _writer(servers_folder, results, batch_size, cutoff_epoch, since_epochs, summary):
+    loop = asyncio.get_running_loop()
+    batch = []
+    while True:
+        item = await results.get()
+        if item is not None:
+            batch.append(item)
+        ''' a full batch, or whatever is there once the queue runs dry. '''
+        if batch and (item is None or len(batch) >= batch_size or results.empty()):
+            try:
+                summary["samples"] += await loop.run_in_executor(None, write_batch, servers_folder, batch, cutoff_epoch)
+            except BaseException:
+                ''' part of the batch may be stored, the next pass reads where each device really is. '''
+                for device, _ in batch:
+                    since_epochs.pop(device["device_name"], None)
+                raise
+            for device, rows in batch:
+                since_epochs[device["device_name"]] = rows[-1][fleet_storage.TIMESTAMP_COLUMN]
+            summary["updated"] += len(batch)
+            summary["batches"] += 1
+            batch = []
+        if item is None:
+            return
+
+
+async def collect_fleet(servers_folder, devices, endpoint_template=DEFAULT_ENDPOINT_TEMPLATE, concurrency=DEFAULT_CONCURRENCY,
+                        per_host=DEFAULT_PER_HOST, timeout=DEFAULT_TIMEOUT, batch_size=DEFAULT_BATCH_SIZE, since_epochs=None):
+    """
+    One collection pass over devices.
+
+    Args:
+        servers_folder (str): root of the fleet store (server_fleet/).
+        devices (list): inventory records to poll.
+        endpoint_template (str): device url, formatted with the inventory record.
+        concurrency (int): requests in flight across the fleet.
+        per_host (int): connections kept per host.
+        timeout (int): seconds a device gets to answer.
+        batch_size (int): devices ingested per executor call.
+        since_epochs (dict): device_name -> newest stored epoch, kept across
+            passes by the caller, read from storage for missing devices.
+
+    Returns:
+        dict: polled, updated, samples, errors, batches and duration_s.
+    """
+    started = time.perf_counter()
+    summary = {"polled": 0, "updated": 0, "samples": 0, "errors": 0, "batches": 0}
+    since_epochs = {} if since_epochs is None else since_epochs
+    cutoff_epoch = data_generator_single.filter_last_xx_days_cutoff(RETENTION_DAYS)
+
+    work = asyncio.Queue()
+    for device in devices:
+        work.put_nowait(device)
+    results = asyncio.Queue(maxsize=batch_size * 2)
+
+    connector = aiohttp.TCPConnector(limit=concurrency, limit_per_host=per_host, ttl_dns_cache=300)
+    client_timeout = aiohttp.ClientTimeout(total=timeout, sock_connect=min(timeout, 5))
+    async with aiohttp.ClientSession(connector=connector, timeout=client_timeout, raise_for_status=True) as session:
+        writer = asyncio.create_task(_writer(servers_folder, results, batch_size, cutoff_epoch, since_epochs, summary))
+        pollers = [
+            asyncio.create_task(_poller(session, servers_folder, work, results, endpoint_template, since_epochs, summary))
+            for _ in range(min(concurrency, len(devices)))
+        ]
+        pollers_done = asyncio.gather(*pollers)
+        try:
+            await asyncio.wait({writer, pollers_done}, return_when=asyncio.FIRST_COMPLETED)
+            if writer.done():
+                ''' the writer only stops before the end marker when a batch failed, nothing drains the queue any more. '''
+                writer.result()
+            pollers_done.result()
+            await results.put(None)
+            await writer
+        finally:
+            ''' on a failure the pollers may be waiting on the full queue, they are cancelled rather than left hanging. '''
+            pollers_done.cancel()
+            writer.cancel()
+            await asyncio.gather(pollers_done, writer, return_exceptions=True)
+
+    summary["duration_s"] = round(time.perf_counter() - started, 3)
+    return summary
+
+
+def finish_cycle(servers_folder, summary):
+    ''' same bookkeeping as the data_generator_single ingest loop: cycle marker, alert summary, metrics. '''
+    fleet_storage.mark_ingest_cycle(servers_folder, summary["updated"])
+    devices_alerting = fleet_alerts.flush_alert_summary(servers_folder)
+    perf_metrics.observe('ingest_cycle_duration_seconds', summary["duration_s"], help_text='full ingest pass over the fleet')
+    perf_metrics.inc('ingest_devices_total', summary["updated"], help_text='device updates written by the ingest loop')
+    perf_metrics.inc('collector_samples_total', summary["samples"], help_text='samples written by the collector')
+    perf_metrics.merge_snapshot_file(os.path.join(servers_folder, fleet_storage.INGEST_METRICS_FILE))
+    return devices_alerting
+
+
+async def run_collector(servers_folder, args):
+    since_epochs = {}
+    while True:
+        cycle_started = time.time()
+        devices = get_inventory(servers_folder).query(site_name=args.site, product_name=args.product)
+        summary = await collect_fleet(
+            servers_folder, devices, args.endpoint_template, args.concurrency, args.per_host, args.timeout, args.batch_size, since_epochs)
+        devices_alerting = finish_cycle(servers_folder, summary)
+        print('collected:'.ljust(30), summary, 'alerting:', devices_alerting)
+        if args.once:
+            return summary
+        ''' next pass on the next interval boundary, a slow pass skips ahead rather than piling up. '''
+        next_cycle = (cycle_started // args.interval + 1) * args.interval
+        await asyncio.sleep(max(0.0, next_cycle - time.time()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="poll every device endpoint concurrently and ingest the samples.")
+    parser.add_argument('--servers-folder', default=data_generator_single.servers_folder, help="fleet store folder")
+    parser.add_argument('--endpoint-template', default=os.environ.get('COLLECTOR_ENDPOINT_TEMPLATE', DEFAULT_ENDPOINT_TEMPLATE),
+                        help="device url, formatted with the inventory record ({site_name}, {device_name}, ...)")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help="requests in flight")
+    parser.add_argument('--per-host', type=int, default=DEFAULT_PER_HOST, help="connections per host")
+    parser.add_argument('--timeout', type=int, default=DEFAULT_TIMEOUT, help="seconds per device request")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="devices ingested per storage write")
+    parser.add_argument('--interval', type=int, default=60, help="seconds between passes")
+    parser.add_argument('--site', default=None, help="only poll this site")
+    parser.add_argument('--product', default=None, help="only poll this product")
+    parser.add_argument('--once', action='store_true', help="one pass, then exit")
+    args = parser.parse_args()
+    asyncio.run(run_collector(args.servers_folder, args))
+
+
+if __name__ == "__main__":
+    main()
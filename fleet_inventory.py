@@ -0,0 +1,164 @@
+import threading
+import hashlib
+import json
+import os
+
+
+class FleetInventory:
+    """
+    In-memory, indexed view of server_fleet/devices.json.
+
+    The file is only re-read when its mtime or size changes, and only
+    re-indexed when its content hash changes as well, so lookups cost a
+    stat() instead of a json.load plus a linear scan.
+
+    Indexes:
+        devices        device_name -> record
+        site_products  site_name -> product_name -> [device_name, ...]
+        product_sites  product_name -> [site_name, ...]
+        environments   environment -> [device_name, ...]
+    """
+
+    def __init__(self, devices_file):
+        self.devices_file = devices_file
+        self._lock = threading.Lock()
+        self._file_stamp = None
+        self.content_hash = None
+        self.loads = 0
+        self.devices = {}
+        self.site_products = {}
+        self.product_sites = {}
+        self.environments = {}
+
+    def refresh(self):
+        ''' reload + re-index when the file changed, returns True when the indexes were rebuilt. '''
+        try:
+            file_stat = os.stat(self.devices_file)
+        except FileNotFoundError:
+            file_stat = None
+        file_stamp = (file_stat.st_mtime_ns, file_stat.st_size) if file_stat else None
+        if file_stamp == self._file_stamp:
+            return False
+
+        with self._lock:
+            if file_stamp == self._file_stamp:
+                return False
+            raw = b'[]'
+            if file_stat is not None:
+                with open(self.devices_file, 'rb') as f:
+                    raw = f.read()
+            content_hash = hashlib.sha1(raw).hexdigest()
+            self._file_stamp = file_stamp
+            if content_hash == self.content_hash:
+                return False
+            self._build_indexes(json.loads(raw))
+            self.content_hash = content_hash
+            self.loads += 1
+            return True
+
+    def _build_indexes(self, device_list):
+        devices = {}
+        site_products = {}
+        product_sites = {}
+        environments = {}
+        for item in device_list:
+            device_name = item["device_name"]
+            if device_name in devices:
+                continue
+            devices[device_name] = item
+            site_products.setdefault(item["site_name"], {}).setdefault(item["product_name"], []).append(device_name)
+            product_sites.setdefault(item["product_name"], {})[item["site_name"]] = True
+            environments.setdefault(item.get("environment"), []).append(device_name)
+
+        ''' swap in complete indexes, readers never see a half built one. '''
+        self.devices = devices
+        self.site_products = {site: dict(sorted(products.items())) for site, products in sorted(site_products.items())}
+        self.product_sites = {product: sorted(sites) for product, sites in sorted(product_sites.items())}
+        self.environments = environments
+
+    def site_product_pairs(self):
+        self.refresh()
+        return [
+            {"site_name": site_name, "product_name": product_name}
+            for site_name, products in self.site_products.items()
+            for product_name in products
+        ]
+
+    def device_names(self, site_name, product_name):
+        self.refresh()
+        return list(self.site_products.get(site_name, {}).get(product_name, []))
+
+    def query(self, site_name=None, product_name=None, environment=None, device_name=None):
+        ''' device records matching every filter that is given, using the narrowest index first. '''
+        self.refresh()
+        if device_name is not None:
+            candidates = [device_name] if device_name in self.devices else []
+        elif site_name is not None:
+            products = self.site_products.get(site_name, {})
+            if product_name is not None:
+                candidates = products.get(product_name, [])
+            else:
+                candidates = [name for names in products.values() for name in names]
+        elif product_name is not None:
+            candidates = [
+                name for site in self.product_sites.get(product_name, [])
+                for name in self.site_products[site][product_name]
+            ]
+        elif environment is not None:
+            candidates = self.environments.get(environment, [])
+        else:
+            candidates = list(self.devices)
+
+        results = []
+        for name in candidates:
+            item = self.devices[name]
+            if site_name is not None and item["site_name"] != site_name:
+                continue
+            if product_name is not None and item["product_name"] != product_name:
+                continue
+            if environment is not None and item.get("environment") != environment:
+                continue
+            results.append(item)
+        return results
+
+    def snapshot(self):
+        ''' state for warm_state, the device records with the devices.json stamp they were read at. '''
+        return {
+            "file_stamp": list(self._file_stamp) if self._file_stamp else None,
+            "content_hash": self.content_hash,
+            "devices": list(self.devices.values()),
+        }
+
+    def restore(self, state):
+        ''' adopt a snapshot, the next refresh() re-reads devices.json if it changed since. '''
+        with self._lock:
+            if self.content_hash is not None or not state.get("file_stamp"):
+                return False
+            self._build_indexes(state["devices"])
+            self._file_stamp = tuple(state["file_stamp"])
+            self.content_hash = state["content_hash"]
+            return True
+
+    def summary(self):
+        self.refresh()
+        return {
+            "devices": len(self.devices),
+            "sites": {site: {product: len(names) for product, names in products.items()} for site, products in self.site_products.items()},
+            "products": self.product_sites,
+            "environments": {env: len(names) for env, names in self.environments.items()},
+            "content_hash": self.content_hash,
+        }
+
+
+_inventories = {}
+_inventories_lock = threading.Lock()
+
+
+def get_inventory(servers_folder):
+    ''' one shared inventory per fleet folder and process. '''
+    with _inventories_lock:
+        inventory = _inventories.get(servers_folder)
+        if inventory is None:
+            inventory = FleetInventory(os.path.join(servers_folder, 'devices.json'))
+            _inventories[servers_folder] = inventory
+    return inventory
@@ -0,0 +1,329 @@
+from array import array
+import fleet_storage
+import fleet_alerts
+import bisect
+import shutil
+import json
+import os
+
+
+''' rollup tiers kept next to the raw day segments of each device:
+
+    server_fleet/<site_name>/<device_name>/rollups/
+        heads.json                   the still-open bucket of every tier
+        <tier>/
+            bucket.col               int64 bucket start (epoch seconds)
+            count.col                int64 samples in the bucket
+            <metric>__min.col        float64
+            <metric>__max.col        float64
+            <metric>__avg.col        float64
+
+    the 1m tier is the raw store itself.  coarser buckets are epoch aligned
+    (the 1d tier is a UTC day) and are only appended once they are closed,
+    so ingest touches heads.json per sample and the tier columns once per
+    bucket.
+'''
+
+RAW_TIER = "1m"
+ROLLUP_TIERS = {
+    "5m": 300,
+    "1h": 3600,
+    "1d": 86400,
+}
+TIER_STEPS = {RAW_TIER: 60, **ROLLUP_TIERS}
+ROLLUP_STATS = ["min", "max", "avg"]
+
+ROLLUP_FOLDER = "rollups"
+HEADS_FILE = "heads.json"
+BUCKET_COLUMN = "bucket"
+COUNT_COLUMN = "count"
+
+''' most points read per chart series before a coarser tier is used, the
+    chart builder then cuts the series down further with LTTB. '''
+CHART_MAX_POINTS = 5000
+
+''' heads_file -> (stamp, heads) of the heads read by this process, see cached_heads. '''
+_heads_cache = {}
+
+
+def rollup_column_name(metric, stat):
+    return f'{metric}__{stat}'
+
+
+def rollup_columns():
+    ''' column name -> array typecode for one tier folder. '''
+    columns = {BUCKET_COLUMN: "q", COUNT_COLUMN: "q"}
+    for metric in fleet_storage.METRIC_NAMES:
+        for stat in ROLLUP_STATS:
+            columns[rollup_column_name(metric, stat)] = "d"
+    return columns
+
+
+def rollup_folder(servers_folder, site_name, device_name):
+    return os.path.join(fleet_storage.device_store_path(servers_folder, site_name, device_name), ROLLUP_FOLDER)
+
+
+def pick_rollup_tier(hour_limit, max_points=CHART_MAX_POINTS):
+    """
+    Picks the tier a chart window should be drawn from.
+
+    Args:
+        hour_limit (int): chart window in hours.
+        max_points (int): point budget per series.
+
+    Returns:
+        str: the finest tier whose point count fits the budget, or the
+            coarsest tier when none does.
+    """
+    window_seconds = hour_limit * 3600
+    for tier, step in TIER_STEPS.items():
+        if window_seconds / step <= max_points:
+            return tier
+    return list(TIER_STEPS.keys())[-1]
+
+
+def _load_heads(folder):
+    heads_file = os.path.join(folder, HEADS_FILE)
+    if not os.path.exists(heads_file):
+        return {}
+    with open(heads_file, 'r', encoding="utf-8") as f:
+        return json.load(f)
+
+
+def cached_heads(folder):
+    ''' heads for readers, re-read only when heads.json was replaced, callers must not modify them. '''
+    heads_file = os.path.join(folder, HEADS_FILE)
+    try:
+        file_stat = os.stat(heads_file)
+    except FileNotFoundError:
+        return {}
+    file_stamp = [file_stat.st_ino, file_stat.st_mtime_ns, file_stat.st_size]
+    cached = _heads_cache.get(heads_file)
+    if cached is not None and cached[0] == file_stamp:
+        return cached[1]
+    heads = _load_heads(folder)
+    _heads_cache[heads_file] = (file_stamp, heads)
+    return heads
+
+
+def heads_snapshot():
+    ''' heads_file -> [stamp, heads] for warm_state. '''
+    return {heads_file: list(cached) for heads_file, cached in list(_heads_cache.items())}
+
+
+def restore_heads(state):
+    ''' entries whose heads.json changed since are re-read on first use (cached_heads compares the stamp). '''
+    for heads_file, (file_stamp, heads) in state.items():
+        _heads_cache.setdefault(heads_file, (file_stamp, heads))
+    return len(state)
+
+
+def _save_heads(folder, heads):
+    heads_file = os.path.join(folder, HEADS_FILE)
+    tmp_file = f'{heads_file}.tmp'
+    with open(tmp_file, 'w', encoding="utf-8") as f:
+        f.write(json.dumps(heads))
+    os.replace(tmp_file, heads_file)
+
+
+def _new_head(bucket):
+    return {"bucket": bucket, "count": 0, "min": {}, "max": {}, "sum": {}}
+
+
+def _close_head(head, closed):
+    ''' move a finished head into the pending column lists of its tier. '''
+    count = head["count"]
+    closed[BUCKET_COLUMN].append(head["bucket"])
+    closed[COUNT_COLUMN].append(count)
+    for metric in fleet_storage.METRIC_NAMES:
+        closed[rollup_column_name(metric, "min")].append(head["min"][metric])
+        closed[rollup_column_name(metric, "max")].append(head["max"][metric])
+        closed[rollup_column_name(metric, "avg")].append(round(head["sum"][metric] / count, 4))
+
+
+def update_rollups(servers_folder, site_name, device_name, columns):
+    """
+    Folds freshly appended samples into every rollup tier.
+
+    Args:
+        servers_folder (str): root of the fleet store (server_fleet/).
+        site_name (str): site of the device.
+        device_name (str): device the samples belong to.
+        columns (dict): output of fleet_storage.rows_to_columns.
+
+    Returns:
+        int: buckets closed and written across all tiers.
+    """
+    folder = rollup_folder(servers_folder, site_name, device_name)
+    os.makedirs(folder, exist_ok=True)
+    heads = _load_heads(folder)
+    ts_values = columns[fleet_storage.TIMESTAMP_COLUMN]
+    closed_total = 0
+
+    for tier, step in ROLLUP_TIERS.items():
+        head = heads.get(tier)
+        closed = {name: array(typecode) for name, typecode in rollup_columns().items()}
+        for i, ts in enumerate(ts_values):
+            bucket = ts - ts % step
+            if head is None:
+                head = _new_head(bucket)
+            elif bucket > head["bucket"]:
+                _close_head(head, closed)
+                head = _new_head(bucket)
+            elif bucket < head["bucket"]:
+                ''' late sample for a bucket that is already written, ignore it. '''
+                continue
+            head["count"] += 1
+            for metric in fleet_storage.METRIC_NAMES:
+                value = columns[metric][i]
+                if head["count"] == 1:
+                    head["min"][metric] = value
+                    head["max"][metric] = value
+                    head["sum"][metric] = value
+                else:
+                    head["min"][metric] = min(head["min"][metric], value)
+                    head["max"][metric] = max(head["max"][metric], value)
+                    head["sum"][metric] += value
+        heads[tier] = head
+
+        if closed[BUCKET_COLUMN]:
+            tier_folder = os.path.join(folder, tier)
+            os.makedirs(tier_folder, exist_ok=True)
+            for name, values in closed.items():
+                with open(fleet_storage.column_file_path(tier_folder, name), 'ab') as f:
+                    values.tofile(f)
+            closed_total += len(closed[BUCKET_COLUMN])
+
+    _save_heads(folder, heads)
+    return closed_total
+
+
+def ingest_device_rows(servers_folder, device, rows):
+    ''' append raw samples, keep the rollup tiers current and run the alert rules, all in one step. '''
+    if not rows:
+        return 0
+    columns = fleet_storage.rows_to_columns(rows)
+    fleet_storage.append_device_columns(servers_folder, device, columns)
+    update_rollups(servers_folder, device["site_name"], device["device_name"], columns)
+    fleet_alerts.evaluate_device_columns(servers_folder, device, columns)
+    return len(rows)
+
+
+def rebuild_device_rollups(servers_folder, site_name, device_name):
+    ''' drop and recompute every tier from the raw segments (after imports or repairs). '''
+    folder = rollup_folder(servers_folder, site_name, device_name)
+    if os.path.isdir(folder):
+        shutil.rmtree(folder)
+    device_folder = fleet_storage.device_store_path(servers_folder, site_name, device_name)
+    for name in fleet_storage.list_device_segments(device_folder):
+        first_epoch, last_epoch = fleet_storage.segment_bounds(name)
+        columns = fleet_storage.read_device_columns(
+            servers_folder, site_name, device_name, start=first_epoch, end=last_epoch)
+        update_rollups(servers_folder, site_name, device_name, columns)
+
+
+def tier_row_count(tier_folder):
+    counts = []
+    for name, typecode in rollup_columns().items():
+        path = fleet_storage.column_file_path(tier_folder, name)
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        counts.append(size // array(typecode).itemsize)
+    return min(counts)
+
+
+def read_rollup_columns(servers_folder, site_name, device_name, tier, metrics=None, stats=None, start=None, end=None, hours=None):
+    """
+    Reads a window of one rollup tier, including the still-open head bucket.
+
+    Args:
+        tier (str): one of ROLLUP_TIERS.
+        metrics (list): metrics to return, all of them when None.
+        stats (list): any of "min", "max", "avg", all of them when None.
+        start / end (int): epoch seconds, matched against bucket starts.
+        hours (int): when start is None, keep the last XX hours counted
+            back from the newest bucket.
+
+    Returns:
+        dict: "timestamp" (bucket starts), "count" and "<metric>__<stat>" -> list.
+    """
+    folder = rollup_folder(servers_folder, site_name, device_name)
+    tier_folder = os.path.join(folder, tier)
+    wanted_metrics = fleet_storage.METRIC_NAMES if metrics is None else metrics
+    wanted_stats = ROLLUP_STATS if stats is None else stats
+    wanted = [rollup_column_name(m, s) for m in wanted_metrics for s in wanted_stats]
+
+    result = {fleet_storage.TIMESTAMP_COLUMN: [], COUNT_COLUMN: []}
+    result.update({name: [] for name in wanted})
+
+    head = cached_heads(folder).get(tier)
+    row_count = tier_row_count(tier_folder)
+
+    if start is None and hours is not None:
+        if head is not None:
+            latest_bucket = head["bucket"]
+        elif row_count:
+            with fleet_storage.MappedColumn(fleet_storage.column_file_path(tier_folder, BUCKET_COLUMN), "q") as col:
+                latest_bucket = col.view[row_count - 1]
+        else:
+            return result
+        start = latest_bucket - int(hours * 3600)
+
+    if row_count:
+        with fleet_storage.MappedColumn(fleet_storage.column_file_path(tier_folder, BUCKET_COLUMN), "q") as col:
+            bucket_view = col.view[:row_count]
+            lo = 0 if start is None else bisect.bisect_left(bucket_view, start)
+            hi = row_count if end is None else bisect.bisect_right(bucket_view, end)
+            result[fleet_storage.TIMESTAMP_COLUMN] = bucket_view[lo:hi].tolist()
+            bucket_view.release()
+        if lo < hi:
+            for name in [COUNT_COLUMN] + wanted:
+                typecode = rollup_columns()[name]
+                with fleet_storage.MappedColumn(fleet_storage.column_file_path(tier_folder, name), typecode) as col:
+                    result[name] = col.view[lo:hi].tolist()
+
+    if head is not None and head["count"]:
+        in_window = (start is None or head["bucket"] >= start) and (end is None or head["bucket"] <= end)
+        if in_window:
+            result[fleet_storage.TIMESTAMP_COLUMN].append(head["bucket"])
+            result[COUNT_COLUMN].append(head["count"])
+            for metric in wanted_metrics:
+                for stat in wanted_stats:
+                    if stat == "avg":
+                        value = round(head["sum"][metric] / head["count"], 4)
+                    else:
+                        value = head[stat][metric]
+                    result[rollup_column_name(metric, stat)].append(value)
+    return result
+
+
+def read_chart_rows(servers_folder, site_name, device_name, hour_limit, max_points=CHART_MAX_POINTS):
+    """
+    Rows for one chart series from the tier pick_rollup_tier chooses.
+    Rolled up rows carry the bucket average under the plain metric name so
+    they have the same shape as raw samples.  Timestamps stay int epochs,
+    sorted ascending, which is what the chart generator indexes on.
+    """
+    tier = pick_rollup_tier(hour_limit, max_points)
+    if tier == RAW_TIER:
+        return fleet_storage.read_device_rows(
+            servers_folder, site_name, device_name, hours=hour_limit, epoch_timestamps=True)
+
+    columns = read_rollup_columns(servers_folder, site_name, device_name, tier, stats=["avg"], hours=hour_limit)
+    avg_columns = {fleet_storage.TIMESTAMP_COLUMN: columns[fleet_storage.TIMESTAMP_COLUMN]}
+    for metric in fleet_storage.METRIC_NAMES:
+        avg_columns[metric] = columns[rollup_column_name(metric, "avg")]
+    return fleet_storage.columns_to_rows(avg_columns, epoch_timestamps=True)
+
+
+def rebuild_fleet_rollups(servers_folder):
+    devices_json = os.path.join(servers_folder, 'devices.json')
+    with open(devices_json, 'r', encoding="utf-8") as file:
+        device_list = json.load(file)
+    for device in device_list:
+        rebuild_device_rollups(servers_folder, device["site_name"], device["device_name"])
+        print('rebuilt rollups:'.ljust(30), device["site_name"], device["device_name"])
+
+
+if __name__ == "__main__":
+    script_folder = os.path.dirname(os.path.abspath(__file__))
+    rebuild_fleet_rollups(os.path.join(script_folder, 'server_fleet'))
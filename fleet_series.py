@@ -0,0 +1,149 @@
+import numpy as np
+import fleet_storage
+import fleet_rollups
+import struct
+import json
+import math
+
+
+''' raw series for tools: a time range of some metrics of some devices, nothing else.
+
+    only the requested columns of the segments (or rollup buckets) that
+    overlap [start, end] are read.  without a step the stored samples come
+    back as they are, with a step every device is averaged into step wide,
+    epoch aligned buckets read from the coarsest rollup tier that divides it.
+
+    binary form (application/octet-stream), all little-endian:
+        SERIES_MAGIC, uint32 header length, json header, then per device in
+        header order: int64 timestamps[count], float64 values[count] per metric
+        (header "metrics" order).
+
+    buckets without samples are left out rather than filled, every device
+    has its own timestamps.
+'''
+
+SERIES_MAGIC = b'FIMSER1\n'
+SERIES_FORMATS = ["json", "binary"]
+
+_HEADER_LENGTH = struct.Struct('<I')
+
+
+def parse_time(value):
+    ''' epoch seconds or "%Y-%m-%d %H:%M:%S" (local time) -> int epoch seconds, ValueError otherwise. '''
+    try:
+        return int(float(value))
+    except ValueError:
+        return fleet_storage.timestamp_to_epoch(value)
+
+
+def series_tier(step):
+    """
+    Tier to read for a step.
+
+    Returns:
+        tuple: (tier, step seconds), step rounded up to a whole minute, the
+            tier is the coarsest one whose buckets divide it.
+    """
+    if step is None:
+        return fleet_rollups.RAW_TIER, None
+    step = max(60, math.ceil(step / 60) * 60)
+    tier = max(
+        (tier for tier, tier_step in fleet_rollups.TIER_STEPS.items() if step % tier_step == 0),
+        key=lambda tier: fleet_rollups.TIER_STEPS[tier],
+    )
+    return tier, step
+
+
+def estimated_points(device_count, start, end, step):
+    ''' upper bound of the values a request returns per metric, to refuse what is too big before reading. '''
+    return device_count * ((end - start) // (step or fleet_rollups.TIER_STEPS[fleet_rollups.RAW_TIER]) + 1)
+
+
+def _bucket_average(timestamps, values, weights, step):
+    ''' (bucket starts, per metric weighted averages) of samples cut into step wide buckets. '''
+    buckets = timestamps - timestamps % step
+    bucket_starts, cell = np.unique(buckets, return_inverse=True)
+    totals = np.bincount(cell, weights=weights)
+    averages = [np.bincount(cell, weights=row * weights) / totals for row in values]
+    return bucket_starts, averages
+
+
+def read_device_series(servers_folder, site_name, device_name, metrics, start, end, step=None):
+    """
+    One device's window.
+
+    Args:
+        servers_folder (str): root of the fleet store (server_fleet/).
+        metrics (list): metric names, only these columns are read.
+        start / end (int): epoch seconds, both included.
+        step (int): bucket width in seconds, None for the stored samples.
+
+    Returns:
+        tuple: (timestamps int64 array, {metric: float64 array}).
+    """
+    tier, step = series_tier(step)
+    if tier == fleet_rollups.RAW_TIER:
+        columns = fleet_storage.read_device_columns(servers_folder, site_name, device_name, metrics=metrics, start=start, end=end)
+        values = [columns[metric] for metric in metrics]
+        weights = None
+    else:
+        ''' a bucket that starts before start still holds samples of the window. '''
+        tier_step = fleet_rollups.TIER_STEPS[tier]
+        columns = fleet_rollups.read_rollup_columns(
+            servers_folder, site_name, device_name, tier, metrics=metrics, stats=["avg"], start=start - start % tier_step, end=end)
+        values = [columns[fleet_rollups.rollup_column_name(metric, "avg")] for metric in metrics]
+        weights = columns[fleet_rollups.COUNT_COLUMN]
+
+    timestamps = np.asarray(columns[fleet_storage.TIMESTAMP_COLUMN], dtype=np.int64)
+    values = np.asarray(values, dtype=np.float64).reshape(len(metrics), len(timestamps))
+    if step is not None:
+        ''' rollup buckets weigh by the samples they hold, raw samples by one. '''
+        weights = np.ones(len(timestamps)) if weights is None else np.asarray(weights, dtype=np.float64)
+        timestamps, values = _bucket_average(timestamps, values, weights, step)
+    return timestamps, dict(zip(metrics, values))
+
+
+def read_series(servers_folder, devices, metrics, start, end, step=None):
+    """
+    The window of every device, in the devices' order.
+
+    Returns:
+        dict: "tier", "step", "start", "end", "metrics" and "devices", a list
+            of (inventory record, timestamps, {metric: values}).
+    """
+    tier, step = series_tier(step)
+    series = [
+        (device, *read_device_series(servers_folder, device["site_name"], device["device_name"], metrics, start, end, step))
+        for device in devices
+    ]
+    return {"tier": tier, "step": step, "start": start, "end": end, "metrics": metrics, "devices": series}
+
+
+def series_json(result):
+    ''' columnar json: per device one timestamp list and one value list per metric. '''
+    devices = []
+    for device, timestamps, values in result["devices"]:
+        devices.append({
+            "site_name": device["site_name"],
+            "device_name": device["device_name"],
+            "timestamps": timestamps.tolist(),
+            "values": {metric: np.round(column, 3).tolist() for metric, column in values.items()},
+        })
+    return {**result, "devices": devices}
+
+
+def series_binary(result):
+    ''' the layout in the module docstring, numpy.frombuffer reads every array without a copy. '''
+    header = {
+        **{key: result[key] for key in ("tier", "step", "start", "end", "metrics")},
+        "devices": [
+            {"site_name": device["site_name"], "device_name": device["device_name"], "count": len(timestamps)}
+            for device, timestamps, _ in result["devices"]
+        ],
+    }
+    header_bytes = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    parts = [SERIES_MAGIC, _HEADER_LENGTH.pack(len(header_bytes)), header_bytes]
+    for _, timestamps, values in result["devices"]:
+        parts.append(timestamps.astype('<i8').tobytes())
+        parts.extend(values[metric].astype('<f8').tobytes() for metric in result["metrics"])
+    return b''.join(parts)
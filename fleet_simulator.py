@@ -0,0 +1,89 @@
+from fleet_inventory import get_inventory
+from aiohttp import web
+import data_generator_single
+import fleet_storage
+import fast_json
+import argparse
+import asyncio
+import random
+import time
+
+
+''' local stand-in for the fleet's device endpoints, to run fleet_collector.py against.
+
+    python fleet_simulator.py --port 9100 --latency-ms 50 --error-rate 0.01
+    python fleet_collector.py --once --endpoint-template "http://127.0.0.1:9100/devices/{site_name}/{device_name}"
+
+    GET /devices/<site_name>/<device_name>?since=<epoch> answers with the device
+    json shape, {"device_info": ..., "statistics": [...]}, holding one sample per
+    interval after since (at most --backlog-minutes of them).  samples are seeded
+    by device and time, so asking twice gives the same values.
+'''
+
+
+def simulated_sample(device_name, epoch):
+    ''' same ranges and peak hours as data_generator_single. '''
+    rng = random.Random(f'{device_name}:{epoch}')
+    is_peak_hours = 7 <= time.localtime(epoch).tm_hour < 13
+    return {
+        "timestamp": fleet_storage.epoch_to_timestamp(epoch),
+        "cpu_usage_percent": round(min(99.0, rng.uniform(10.0, 70.0) * (1.4 if is_peak_hours else 1.0)), 2),
+        "memory_usage_gb": round(min(16.0, rng.uniform(2.0, 12.0) * (1.3 if is_peak_hours else 1.0)), 2),
+        "disk_io_mbps": round(min(500.0, rng.uniform(50.0, 350.0) * (1.5 if is_peak_hours else 1.0)), 2),
+        "network_latency_ms": round(min(100.0, rng.uniform(1.0, 60.0) * (1.6 if is_peak_hours else 1.0)), 2),
+        "process_count": min(200, int(rng.randint(50, 150) * (1.4 if is_peak_hours else 1.0))),
+    }
+
+
+def create_simulator_app(servers_folder, latency_ms=0, error_rate=0.0, interval=60, backlog_minutes=60):
+    """
+    Args:
+        servers_folder (str): fleet folder whose devices.json lists the simulated devices.
+        latency_ms (int): average response delay, uniform between 0 and twice this.
+        error_rate (float): share of requests answered with a 503.
+        interval (int): seconds between samples.
+        backlog_minutes (int): most history one response carries.
+    """
+    inventory = get_inventory(servers_folder)
+
+    async def device_stats(request):
+        site_name = request.match_info['site_name']
+        device_name = request.match_info['device_name']
+        inventory.refresh()
+        device = inventory.devices.get(device_name)
+        if device is None or device["site_name"] != site_name:
+            raise web.HTTPNotFound()
+        if latency_ms:
+            await asyncio.sleep(random.uniform(0, 2 * latency_ms) / 1000)
+        if error_rate and random.random() < error_rate:
+            raise web.HTTPServiceUnavailable()
+
+        now = int(time.time()) // interval * interval
+        oldest = now - backlog_minutes * 60
+        since = request.query.get('since')
+        first = max(oldest, int(since) + 1) if since else now
+        first = -(-first // interval) * interval
+        statistics = [simulated_sample(device_name, epoch) for epoch in range(first, now + 1, interval)]
+        return web.json_response({"device_info": device, "statistics": statistics}, dumps=fast_json.dumps)
+
+    app = web.Application()
+    app.router.add_get('/devices/{site_name}/{device_name}', device_stats)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="serve simulated device endpoints for the fleet in devices.json.")
+    parser.add_argument('--servers-folder', default=data_generator_single.servers_folder, help="fleet folder with devices.json")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9100)
+    parser.add_argument('--latency-ms', type=int, default=0, help="average response delay")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="share of requests that fail with 503")
+    parser.add_argument('--interval', type=int, default=60, help="seconds between samples")
+    parser.add_argument('--backlog-minutes', type=int, default=60, help="most history per response")
+    args = parser.parse_args()
+    app = create_simulator_app(args.servers_folder, args.latency_ms, args.error_rate, args.interval, args.backlog_minutes)
+    web.run_app(app, host=args.host, port=args.port, print=lambda *_: print(f'simulating fleet on http://{args.host}:{args.port}'))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,674 @@
+from datetime import datetime, timedelta
+from collections import deque
+from array import array
+import segment_codec
+import bisect
+import shutil
+import json
+import mmap
+import os
+
+
+''' on-disk layout for one device:
+
+    server_fleet/<site_name>/<device_name>/
+        device_info.json
+        <YYYYMMDD>/                  one append-only segment per (local) day
+            timestamp.col            int64 epoch seconds, sorted ascending
+            cpu_usage_percent.col    float64
+            memory_usage_gb.col      float64
+            disk_io_mbps.col         float64
+            network_latency_ms.col   float64
+            process_count.col        int64
+        <YYYYMMDD>/                  a cold segment (see compress_cold_segments)
+            segment.gor              every column in one segment_codec file
+
+    every column file is a flat array of fixed-width values, row N of a
+    segment is item N of every column.  new samples are appended to the
+    segment of their day, retention deletes whole segment folders, and reads
+    memory-map only the segments that overlap the requested window.
+
+    once a day is COLD_SEGMENT_DAYS old its columns are re-encoded into one
+    compressed segment.gor (delta-of-delta timestamps, fixed-point / xor
+    floats, varints), reads decode it transparently.
+'''
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+TIMESTAMP_COLUMN = "timestamp"
+TIMESTAMP_TYPECODE = "q"
+
+METRIC_COLUMNS = {
+    "cpu_usage_percent": "d",
+    "memory_usage_gb": "d",
+    "disk_io_mbps": "d",
+    "network_latency_ms": "d",
+    "process_count": "q",
+}
+METRIC_NAMES = list(METRIC_COLUMNS.keys())
+
+ALL_COLUMNS = {TIMESTAMP_COLUMN: TIMESTAMP_TYPECODE, **METRIC_COLUMNS}
+
+DEVICE_INFO_FILE = "device_info.json"
+COLUMN_SUFFIX = ".col"
+COMPRESSED_SEGMENT_FILE = "segment.gor"
+COLD_SEGMENT_DAYS = 2
+SEGMENT_FORMAT = "%Y%m%d"
+
+''' device folder -> first warm segment name of the last compress_cold_segments pass over it. '''
+_cold_checked = {}
+
+
+def timestamp_to_epoch(timestamp_str):
+    ''' "%Y-%m-%d %H:%M:%S" (local time) -> int epoch seconds '''
+    return int(datetime.strptime(timestamp_str, TIMESTAMP_FORMAT).timestamp())
+
+
+def epoch_to_timestamp(epoch_seconds):
+    ''' int epoch seconds -> "%Y-%m-%d %H:%M:%S" (local time) '''
+    return datetime.fromtimestamp(epoch_seconds).strftime(TIMESTAMP_FORMAT)
+
+
+def device_store_path(servers_folder, site_name, device_name):
+    return os.path.join(servers_folder, site_name, device_name)
+
+
+def column_file_path(device_folder, column_name):
+    return os.path.join(device_folder, f'{column_name}{COLUMN_SUFFIX}')
+
+
+def write_device_info(servers_folder, device):
+    ''' write the inventory record for a device, creating its store folder. '''
+    device_folder = device_store_path(servers_folder, device["site_name"], device["device_name"])
+    os.makedirs(device_folder, exist_ok=True)
+    info_file = os.path.join(device_folder, DEVICE_INFO_FILE)
+    with open(info_file, 'w', encoding="utf-8") as f:
+        f.write(json.dumps(device, indent=4))
+    return device_folder
+
+
+def read_device_info(servers_folder, site_name, device_name):
+    info_file = os.path.join(device_store_path(servers_folder, site_name, device_name), DEVICE_INFO_FILE)
+    if not os.path.exists(info_file):
+        return None
+    with open(info_file, 'r', encoding="utf-8") as f:
+        return json.load(f)
+
+
+def rows_to_columns(rows):
+    """
+    Converts a list of sample dicts into typed column arrays.
+
+    Args:
+        rows (list): dicts shaped like the generators' output, the
+            "timestamp" value may be a "%Y-%m-%d %H:%M:%S" string or an int epoch.
+
+    Returns:
+        dict: column name -> array.array
+    """
+    columns = {name: array(typecode) for name, typecode in ALL_COLUMNS.items()}
+    ts_column = columns[TIMESTAMP_COLUMN]
+    for row in rows:
+        ts_value = row[TIMESTAMP_COLUMN]
+        if isinstance(ts_value, str):
+            ts_value = timestamp_to_epoch(ts_value)
+        ts_column.append(int(ts_value))
+        for name, typecode in METRIC_COLUMNS.items():
+            value = row.get(name, 0)
+            columns[name].append(int(value) if typecode == "q" else float(value))
+    return columns
+
+
+def columns_to_rows(columns, epoch_timestamps=False):
+    ''' inverse of rows_to_columns, timestamps come back as strings unless epoch_timestamps. '''
+    names = [name for name in ALL_COLUMNS if name in columns]
+    ts_values = columns.get(TIMESTAMP_COLUMN, [])
+    rows = []
+    for i in range(len(ts_values)):
+        row = {}
+        for name in names:
+            value = columns[name][i]
+            row[name] = epoch_to_timestamp(value) if name == TIMESTAMP_COLUMN and not epoch_timestamps else value
+        rows.append(row)
+    return rows
+
+
+def segment_name(epoch_seconds):
+    ''' segment (local day) a sample belongs to, e.g. "20251018" '''
+    return datetime.fromtimestamp(epoch_seconds).strftime(SEGMENT_FORMAT)
+
+
+def segment_bounds(name):
+    ''' first and last epoch second covered by a segment. '''
+    day_start = datetime.strptime(name, SEGMENT_FORMAT)
+    next_day = day_start + timedelta(days=1)
+    return int(day_start.timestamp()), int(next_day.timestamp()) - 1
+
+
+def list_device_segments(device_folder):
+    ''' segment folder names of a device, oldest first. '''
+    if not os.path.isdir(device_folder):
+        return []
+    return sorted(
+        name for name in os.listdir(device_folder)
+        if len(name) == 8 and name.isdigit() and os.path.isdir(os.path.join(device_folder, name))
+    )
+
+
+def _write_columns(segment_folder, columns, mode, lo=0, hi=None):
+    os.makedirs(segment_folder, exist_ok=True)
+    if mode == 'ab' and os.path.exists(os.path.join(segment_folder, COMPRESSED_SEGMENT_FILE)):
+        ''' a late sample for a cold day: back to plain columns, it is compressed again later. '''
+        decompress_segment(segment_folder)
+        _cold_checked.pop(os.path.dirname(segment_folder), None)
+    for name, typecode in ALL_COLUMNS.items():
+        values = columns[name][lo:hi]
+        if not isinstance(values, array):
+            values = array(typecode, values)
+        with open(column_file_path(segment_folder, name), mode) as f:
+            values.tofile(f)
+
+
+def _write_segmented(device_folder, columns, mode):
+    ''' split columns on day boundaries and write each run to its segment. '''
+    ts_values = columns[TIMESTAMP_COLUMN]
+    lo = 0
+    while lo < len(ts_values):
+        name = segment_name(ts_values[lo])
+        day_end = segment_bounds(name)[1]
+        hi = bisect.bisect_right(ts_values, day_end, lo)
+        _write_columns(os.path.join(device_folder, name), columns, mode, lo, hi)
+        lo = hi
+
+
+def append_device_rows(servers_folder, device, rows):
+    """
+    Appends samples to the end of a device's day segments.  Only the
+    segment files of the new samples' day are opened, so the cost does not
+    depend on how much history the device already has.
+
+    Args:
+        servers_folder (str): root of the fleet store (server_fleet/).
+        device (dict): inventory record with site_name and device_name.
+        rows (list): sample dicts, must be newer than what is already stored.
+
+    Returns:
+        int: number of rows appended.
+    """
+    if not rows:
+        return 0
+    return append_device_columns(servers_folder, device, rows_to_columns(rows))
+
+
+def append_device_columns(servers_folder, device, columns):
+    ''' append_device_rows for data that is already in rows_to_columns form. '''
+    device_folder = device_store_path(servers_folder, device["site_name"], device["device_name"])
+    if not os.path.exists(os.path.join(device_folder, DEVICE_INFO_FILE)):
+        write_device_info(servers_folder, device)
+    _write_segmented(device_folder, columns, 'ab')
+    return len(columns[TIMESTAMP_COLUMN])
+
+
+def write_device_rows(servers_folder, device, rows):
+    ''' replace the whole history of a device with rows. '''
+    device_folder = write_device_info(servers_folder, device)
+    for name in list_device_segments(device_folder):
+        shutil.rmtree(os.path.join(device_folder, name))
+    _write_segmented(device_folder, rows_to_columns(rows), 'wb')
+    return len(rows)
+
+
+class MappedColumn:
+    ''' read-only memory map of one column file, usable as a sequence. '''
+
+    def __init__(self, path, typecode):
+        self._file = None
+        self._map = None
+        self._raw = None
+        self.view = memoryview(b'').cast(typecode)
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            self._file = open(path, 'rb')
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._raw = memoryview(self._map)
+            usable = len(self._raw) - (len(self._raw) % array(typecode).itemsize)
+            self.view = self._raw[:usable].cast(typecode)
+
+    def close(self):
+        self.view.release()
+        if self._raw is not None:
+            self._raw.release()
+            self._map.close()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def compressed_segment_header(segment_folder):
+    ''' header of a cold segment's segment.gor (count, first, last, blocks), None for a plain segment. '''
+    try:
+        with open(os.path.join(segment_folder, COMPRESSED_SEGMENT_FILE), 'rb') as f:
+            prefix = f.read(len(segment_codec.MAGIC) + 4)
+            header_length = int.from_bytes(prefix[len(segment_codec.MAGIC):], 'little')
+            return segment_codec.read_header(prefix + f.read(header_length))[0]
+    except FileNotFoundError:
+        return None
+
+
+def segment_row_count(segment_folder):
+    ''' rows that are complete in every column (guards against a torn append). '''
+    header = compressed_segment_header(segment_folder)
+    if header is not None:
+        return header["count"]
+    counts = []
+    for name, typecode in ALL_COLUMNS.items():
+        path = column_file_path(segment_folder, name)
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        counts.append(size // array(typecode).itemsize)
+    return min(counts)
+
+
+def device_row_count(servers_folder, site_name, device_name):
+    device_folder = device_store_path(servers_folder, site_name, device_name)
+    return sum(segment_row_count(os.path.join(device_folder, name)) for name in list_device_segments(device_folder))
+
+
+def latest_device_epoch(servers_folder, site_name, device_name):
+    ''' newest stored timestamp of a device, None when it has no samples. '''
+    device_folder = device_store_path(servers_folder, site_name, device_name)
+    for name in reversed(list_device_segments(device_folder)):
+        segment_folder = os.path.join(device_folder, name)
+        header = compressed_segment_header(segment_folder)
+        if header is not None:
+            if header["count"]:
+                return header["last"]
+            continue
+        row_count = segment_row_count(segment_folder)
+        if row_count:
+            with MappedColumn(column_file_path(segment_folder, TIMESTAMP_COLUMN), TIMESTAMP_TYPECODE) as ts_col:
+                return ts_col.view[row_count - 1]
+    return None
+
+
+def device_data_version(servers_folder, site_name, device_name):
+    """
+    Cheap token that changes whenever a device's stored data changes: an
+    append grows the newest segment, retention removes the oldest one.
+    Costs one directory listing and one stat.
+    """
+    device_folder = device_store_path(servers_folder, site_name, device_name)
+    segments = list_device_segments(device_folder)
+    if not segments:
+        return "empty"
+    ts_file = column_file_path(os.path.join(device_folder, segments[-1]), TIMESTAMP_COLUMN)
+    if not os.path.exists(ts_file):
+        ts_file = os.path.join(device_folder, segments[-1], COMPRESSED_SEGMENT_FILE)
+    ts_size = os.path.getsize(ts_file) if os.path.exists(ts_file) else 0
+    return f'{segments[0]}-{segments[-1]}-{ts_size}'
+
+
+def _read_compressed_segment(segment_folder, wanted, start, end, result):
+    ''' only the blocks overlapping the window are decoded. '''
+    with open(os.path.join(segment_folder, COMPRESSED_SEGMENT_FILE), 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            columns = segment_codec.decode_segment(data, wanted, TIMESTAMP_COLUMN, start, end)
+    for name, values in columns.items():
+        result[name].extend(values.tolist())
+
+
+def _read_segment(segment_folder, wanted, start, end, result):
+    if os.path.exists(os.path.join(segment_folder, COMPRESSED_SEGMENT_FILE)):
+        _read_compressed_segment(segment_folder, wanted, start, end, result)
+        return
+    row_count = segment_row_count(segment_folder)
+    if row_count == 0:
+        return
+    with MappedColumn(column_file_path(segment_folder, TIMESTAMP_COLUMN), TIMESTAMP_TYPECODE) as ts_col:
+        ts_view = ts_col.view[:row_count]
+        lo = 0 if start is None else bisect.bisect_left(ts_view, start)
+        hi = row_count if end is None else bisect.bisect_right(ts_view, end)
+        result[TIMESTAMP_COLUMN].extend(ts_view[lo:hi].tolist())
+        ts_view.release()
+    if lo >= hi:
+        return
+    for name in wanted:
+        with MappedColumn(column_file_path(segment_folder, name), METRIC_COLUMNS[name]) as col:
+            result[name].extend(col.view[lo:hi].tolist())
+
+
+def read_device_columns(servers_folder, site_name, device_name, metrics=None, start=None, end=None, hours=None):
+    """
+    Reads a time window of a device's columns through memory maps.
+
+    Args:
+        servers_folder (str): root of the fleet store (server_fleet/).
+        site_name (str): site folder of the device.
+        device_name (str): device folder.
+        metrics (list): metric columns to return, all of them when None.
+        start (int): first epoch second to include.
+        end (int): last epoch second to include.
+        hours (int): when start is None, keep only the last XX hours
+            counted back from the newest sample.
+
+    Returns:
+        dict: "timestamp" plus each metric -> list of values.
+    """
+    device_folder = device_store_path(servers_folder, site_name, device_name)
+    wanted = METRIC_NAMES if metrics is None else [m for m in metrics if m in METRIC_COLUMNS]
+    result = {TIMESTAMP_COLUMN: []}
+    result.update({name: [] for name in wanted})
+
+    if start is None and hours is not None:
+        latest_epoch = latest_device_epoch(servers_folder, site_name, device_name)
+        if latest_epoch is None:
+            return result
+        start = latest_epoch - int(hours * 3600)
+
+    for name in list_device_segments(device_folder):
+        first_epoch, last_epoch = segment_bounds(name)
+        if (start is not None and last_epoch < start) or (end is not None and first_epoch > end):
+            continue
+        _read_segment(os.path.join(device_folder, name), wanted, start, end, result)
+    return result
+
+
+def read_device_rows(servers_folder, site_name, device_name, start=None, end=None, hours=None, epoch_timestamps=False):
+    ''' same window as read_device_columns, shaped like the old "statistics" list. '''
+    columns = read_device_columns(servers_folder, site_name, device_name, start=start, end=end, hours=hours)
+    return columns_to_rows(columns, epoch_timestamps)
+
+
+def drop_expired_segments(servers_folder, site_name, device_name, cutoff_epoch):
+    """
+    Retention: deletes every segment that ends before cutoff_epoch.  Whole
+    days are dropped, rows are never re-filtered or rewritten.
+
+    Returns:
+        list: names of the removed segments.
+    """
+    device_folder = device_store_path(servers_folder, site_name, device_name)
+    removed = []
+    for name in list_device_segments(device_folder):
+        if segment_bounds(name)[1] >= cutoff_epoch:
+            break
+        shutil.rmtree(os.path.join(device_folder, name))
+        removed.append(name)
+    return removed
+
+
+INGEST_CYCLE_FILE = '.ingest_cycle.json'
+INGEST_METRICS_FILE = '.ingest_metrics.json'
+
+
+def compress_segment(segment_folder):
+    """
+    Re-encodes a plain segment into segment.gor and removes its column files.
+    The file is decoded and compared before anything is removed.
+
+    Returns:
+        tuple: (bytes before, bytes after), (0, 0) when there was nothing to do.
+    """
+    if compressed_segment_header(segment_folder) is not None:
+        return 0, 0
+    row_count = segment_row_count(segment_folder)
+    columns = {}
+    bytes_before = 0
+    for name, typecode in ALL_COLUMNS.items():
+        path = column_file_path(segment_folder, name)
+        bytes_before += os.path.getsize(path) if os.path.exists(path) else 0
+        with MappedColumn(path, typecode) as col:
+            columns[name] = col.view[:row_count].tolist()
+    if not row_count:
+        return 0, 0
+
+    encoded = segment_codec.encode_segment(columns, ALL_COLUMNS, TIMESTAMP_COLUMN)
+    decoded = segment_codec.decode_segment(encoded, METRIC_NAMES, TIMESTAMP_COLUMN)
+    if any(decoded[name].tolist() != columns[name] for name in ALL_COLUMNS):
+        raise ValueError(f'segment did not survive compression: {segment_folder}')
+
+    compressed_file = os.path.join(segment_folder, COMPRESSED_SEGMENT_FILE)
+    with open(f'{compressed_file}.tmp', 'wb') as f:
+        f.write(encoded)
+    os.replace(f'{compressed_file}.tmp', compressed_file)
+    for name in ALL_COLUMNS:
+        path = column_file_path(segment_folder, name)
+        if os.path.exists(path):
+            os.remove(path)
+    return bytes_before, len(encoded)
+
+
+def decompress_segment(segment_folder):
+    ''' back to plain column files, before an append to a cold day. '''
+    compressed_file = os.path.join(segment_folder, COMPRESSED_SEGMENT_FILE)
+    result = {name: [] for name in ALL_COLUMNS}
+    _read_compressed_segment(segment_folder, METRIC_NAMES, None, None, result)
+    _write_columns(segment_folder, result, 'wb')
+    os.remove(compressed_file)
+
+
+def compress_cold_segments(servers_folder, site_name, device_name, cold_days=COLD_SEGMENT_DAYS, now_epoch=None):
+    """
+    Compresses every segment of a device whose day ended more than
+    cold_days ago.  Runs next to retention in the ingest loop: the segments
+    are only looked at when the cold boundary moved to another day since the
+    last pass (or a late sample reopened a cold day), a segment that is
+    already compressed then costs one stat.
+
+    Returns:
+        tuple: (segments compressed, bytes before, bytes after).
+    """
+    device_folder = device_store_path(servers_folder, site_name, device_name)
+    cold_before = (now_epoch if now_epoch is not None else datetime.now().timestamp()) - cold_days * 86400
+    ''' a day ends before cold_before exactly when its name sorts before the day of cold_before. '''
+    first_warm = segment_name(cold_before)
+    compressed = bytes_before = bytes_after = 0
+    if _cold_checked.get(device_folder) == first_warm:
+        return compressed, bytes_before, bytes_after
+    for name in list_device_segments(device_folder):
+        if name >= first_warm:
+            break
+        segment_folder = os.path.join(device_folder, name)
+        if os.path.exists(os.path.join(segment_folder, COMPRESSED_SEGMENT_FILE)):
+            continue
+        before, after = compress_segment(segment_folder)
+        if before:
+            compressed += 1
+            bytes_before += before
+            bytes_after += after
+    _cold_checked[device_folder] = first_warm
+    return compressed, bytes_before, bytes_after
+
+
+def compress_fleet(servers_folder, cold_days=COLD_SEGMENT_DAYS):
+    ''' one-off pass over every device, e.g. after an upgrade or a generated fleet. '''
+    devices_json = os.path.join(servers_folder, 'devices.json')
+    with open(devices_json, 'r', encoding="utf-8") as file:
+        device_list = json.load(file)
+    totals = [0, 0, 0]
+    for device in device_list:
+        result = compress_cold_segments(servers_folder, device["site_name"], device["device_name"], cold_days)
+        totals = [total + value for total, value in zip(totals, result)]
+    print('segments compressed:'.ljust(30), totals[0])
+    print('bytes before / after:'.ljust(30), totals[1], '/', totals[2])
+    return totals
+
+
+def mark_ingest_cycle(servers_folder, devices_updated):
+    ''' written by the ingest loop after every full pass over the fleet. '''
+    cycle_file = os.path.join(servers_folder, INGEST_CYCLE_FILE)
+    tmp_file = f'{cycle_file}.tmp'
+    with open(tmp_file, 'w', encoding="utf-8") as f:
+        f.write(json.dumps({"finished_at": datetime.now().timestamp(), "devices_updated": devices_updated}))
+    os.replace(tmp_file, cycle_file)
+
+
+def read_ingest_cycle(servers_folder):
+    ''' the last finished ingest cycle, None when ingest has never run. '''
+    cycle_file = os.path.join(servers_folder, INGEST_CYCLE_FILE)
+    try:
+        with open(cycle_file, 'r', encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+LEGACY_READ_CHUNK = 1 << 16
+LEGACY_IMPORT_BATCH = 10000
+
+
+def legacy_device_file_path(servers_folder, site_name, device_name):
+    ''' pre-columnar history file of a device that has not been migrated yet. '''
+    return os.path.join(servers_folder, site_name, f'{device_name}.json')
+
+
+def _legacy_value_stream(json_input, key):
+    """
+    Advances a legacy file to the value of its top level key.
+
+    Returns:
+        tuple: (buffer, pos) with buffer[pos] the first character of the
+            value, (None, None) when the key is not in the file.
+    """
+    marker = f'"{key}"'
+    buffer = ''
+    while True:
+        key_at = buffer.find(marker)
+        if key_at >= 0:
+            colon_at = buffer.find(':', key_at + len(marker))
+            if colon_at >= 0:
+                pos = colon_at + 1
+                while pos < len(buffer) and buffer[pos].isspace():
+                    pos += 1
+                if pos < len(buffer):
+                    return buffer, pos
+            buffer = buffer[key_at:]
+        else:
+            buffer = buffer[-len(marker):]
+        chunk = json_input.read(LEGACY_READ_CHUNK)
+        if not chunk:
+            return None, None
+        buffer += chunk
+
+
+def read_legacy_device_info(legacy_file_path):
+    ''' the "device_info" record of a legacy file, without reading its statistics. '''
+    decoder = json.JSONDecoder()
+    with open(legacy_file_path, 'r', encoding="utf-8") as json_input:
+        buffer, pos = _legacy_value_stream(json_input, "device_info")
+        while buffer is not None:
+            try:
+                return decoder.raw_decode(buffer, pos)[0]
+            except json.JSONDecodeError:
+                chunk = json_input.read(LEGACY_READ_CHUNK)
+                if not chunk:
+                    raise
+                buffer += chunk
+    return None
+
+
+def iter_legacy_statistics(legacy_file_path):
+    """
+    Yields the "statistics" rows of a legacy <device>.json one at a time.
+    The file is read in LEGACY_READ_CHUNK pieces and each row is decoded on
+    its own, so memory does not grow with the length of the history.
+    """
+    decoder = json.JSONDecoder()
+    with open(legacy_file_path, 'r', encoding="utf-8") as json_input:
+        buffer, pos = _legacy_value_stream(json_input, "statistics")
+        if buffer is None or buffer[pos] != '[':
+            return
+        pos += 1
+        while True:
+            while pos < len(buffer) and (buffer[pos].isspace() or buffer[pos] == ','):
+                pos += 1
+            if pos < len(buffer) and buffer[pos] == ']':
+                return
+            try:
+                if pos >= len(buffer):
+                    raise json.JSONDecodeError("need more data", buffer, pos)
+                row, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                chunk = json_input.read(LEGACY_READ_CHUNK)
+                if not chunk:
+                    return
+                buffer = buffer[pos:] + chunk
+                pos = 0
+                continue
+            yield row
+
+
+def read_legacy_device_tail(legacy_file_path, hours, epoch_timestamps=False):
+    """
+    The last XX hours of a legacy file, counted back from its newest row.
+    Rows stream through a deque that drops everything older than the
+    window, so only the window is ever held in memory.
+
+    Returns:
+        list: rows shaped like read_device_rows.
+    """
+    span = int(hours * 3600)
+    window = deque()
+    for row in iter_legacy_statistics(legacy_file_path):
+        ts_value = row[TIMESTAMP_COLUMN]
+        epoch = timestamp_to_epoch(ts_value) if isinstance(ts_value, str) else int(ts_value)
+        window.append((epoch, row))
+        while window[0][0] < epoch - span:
+            window.popleft()
+
+    rows = []
+    for epoch, row in window:
+        row = dict(row)
+        row[TIMESTAMP_COLUMN] = epoch if epoch_timestamps else epoch_to_timestamp(epoch)
+        rows.append(row)
+    return rows
+
+
+def import_legacy_device_json(servers_folder, legacy_file_path):
+    """
+    Moves a pre-columnar <device>.json file ({"device_info": ..., "statistics": [...]})
+    into the column store, LEGACY_IMPORT_BATCH rows at a time.  Returns the
+    number of rows imported.
+    """
+    device = read_legacy_device_info(legacy_file_path)
+    if device is None:
+        ''' the bare inventory record create_fake_servers used to write. '''
+        with open(legacy_file_path, 'r', encoding="utf-8") as json_input:
+            write_device_info(servers_folder, json.load(json_input))
+        return 0
+
+    write_device_rows(servers_folder, device, [])
+    imported = 0
+    batch = []
+    for row in iter_legacy_statistics(legacy_file_path):
+        batch.append(row)
+        if len(batch) == LEGACY_IMPORT_BATCH:
+            imported += append_device_rows(servers_folder, device, batch)
+            batch = []
+    if batch:
+        imported += append_device_rows(servers_folder, device, batch)
+    return imported
+
+
+def migrate_legacy_fleet(servers_folder):
+    ''' import every legacy server_fleet/<site>/<device>.json into the column store. '''
+    imported = 0
+    for site_name in sorted(os.listdir(servers_folder)):
+        site_folder = os.path.join(servers_folder, site_name)
+        if not os.path.isdir(site_folder):
+            continue
+        for file_name in sorted(os.listdir(site_folder)):
+            if not file_name.endswith('.json'):
+                continue
+            legacy_file = os.path.join(site_folder, file_name)
+            rows = import_legacy_device_json(servers_folder, legacy_file)
+            print('imported device:'.ljust(30), site_name, file_name, rows)
+            os.remove(legacy_file)
+            imported += 1
+    return imported
+
+
+if __name__ == "__main__":
+    script_folder = os.path.dirname(os.path.abspath(__file__))
+    migrate_legacy_fleet(os.path.join(script_folder, 'server_fleet'))
@@ -0,0 +1,114 @@
+from flask import request, Response
+import hashlib
+import gzip
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+''' HTTP validators, cache policies and content negotiation for the /v1 endpoints. '''
+
+CHART_CACHE_CONTROL = 'no-cache'
+JSON_FILE_CACHE_CONTROL = 'public, max-age=300'
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 9
+
+''' buffers that are not bytes (shared cache mmaps) go out in chunks of this size. '''
+BUFFER_CHUNK_BYTES = 256 * 1024
+
+
+def make_etag(*parts):
+    ''' strong validator from anything that identifies the representation (data versions, mtimes, ...). '''
+    joined = '|'.join(str(part) for part in parts)
+    return hashlib.sha1(joined.encode('utf-8')).hexdigest()
+
+
+def compress_variants(body):
+    """
+    Every encoding a response can be served in.
+
+    Args:
+        body (bytes): the identity representation.
+
+    Returns:
+        dict: encoding ('identity', 'gzip' and 'br' when brotli is installed) -> bytes
+    """
+    variants = {
+        'identity': body,
+        'gzip': gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0),
+    }
+    if brotli is not None:
+        variants['br'] = brotli.compress(body, quality=BROTLI_QUALITY)
+    return variants
+
+
+def negotiate_encoding(available):
+    ''' best encoding in available the client accepts: br, then gzip, then identity. '''
+    accepted = request.accept_encodings
+    for encoding in ('br', 'gzip'):
+        if encoding in available and accepted[encoding] > 0:
+            return encoding
+    return 'identity'
+
+
+def is_not_modified(etag):
+    return request.if_none_match.contains(etag)
+
+
+def not_modified_response(etag, cache_control):
+    response = Response(status=304)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+
+def iter_buffer(body):
+    ''' WSGI servers only take bytes: copy one chunk at a time, the whole body is never duplicated. '''
+    view = memoryview(body)
+    for offset in range(0, len(view), BUFFER_CHUNK_BYTES):
+        yield bytes(view[offset:offset + BUFFER_CHUNK_BYTES])
+
+
+def encoded_response(variants, etag, cache_control, mimetype='application/json', status=200):
+    """
+    Builds the response for the negotiated encoding of a prepared body.
+
+    Args:
+        variants (dict): output of compress_variants (or the same shape read from
+            disk), bodies may be bytes or any buffer (e.g. an mmap).
+        etag (str): strong validator, see make_etag.
+        cache_control (str): Cache-Control policy of the endpoint.
+    """
+    if is_not_modified(etag):
+        return not_modified_response(etag, cache_control)
+    encoding = negotiate_encoding(variants)
+    body = variants[encoding]
+    if isinstance(body, (bytes, bytearray)):
+        response = Response(body, status=status, mimetype=mimetype)
+    else:
+        response = Response(iter_buffer(body), status=status, mimetype=mimetype)
+        response.content_length = len(body)
+    if encoding != 'identity':
+        response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+
+def compressed_response(body, etag, cache_control, mimetype='application/json', status=200):
+    ''' encoded_response for a body that has no precompressed variants, only the chosen encoding is produced. '''
+    if is_not_modified(etag):
+        return not_modified_response(etag, cache_control)
+    encoding = negotiate_encoding(('br', 'gzip') if brotli is not None else ('gzip',))
+    if encoding == 'br':
+        variants = {'br': brotli.compress(body, quality=5)}
+    elif encoding == 'gzip':
+        variants = {'gzip': gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)}
+    else:
+        variants = {'identity': body}
+    return encoded_response(variants, etag, cache_control, mimetype, status)
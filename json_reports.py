@@ -0,0 +1,122 @@
+from json2html import json2html
+import functools
+import fast_json
+import os
+
+
+''' report files (static/json) for /v1/fetch_json.
+
+    a file is parsed once per version (mtime + size) and converted to html
+    either as a whole, one page of rows at a time, or as a stream of row
+    chunks the browser can paint while the rest is still converting.
+
+    the "rows" of a report are the items of a list document, or of the longest
+    list in an object document (e.g. "statistics" in a legacy device file),
+    the other keys of an object document are kept on every page.
+'''
+
+DEFAULT_PAGE_ROWS = 500
+STREAM_CHUNK_ROWS = 250
+PARSED_REPORTS_KEPT = 4
+
+
+def report_version(path):
+    ''' (mtime_ns, size), raises FileNotFoundError for a missing report. '''
+    file_stat = os.stat(path)
+    return file_stat.st_mtime_ns, file_stat.st_size
+
+
+@functools.lru_cache(maxsize=PARSED_REPORTS_KEPT)
+def _load_report(path, mtime_ns, size):
+    with open(path, 'rb') as f:
+        return fast_json.loads(f.read())
+
+
+def load_report(path):
+    ''' parsed document, shared between requests: callers must not modify it. '''
+    return _load_report(path, *report_version(path))
+
+
+def report_rows(data):
+    """
+    The rows a report pages over.
+
+    Returns:
+        tuple: (rows, rows_key), rows_key is None for a list document and
+            rows is None when the document has nothing to page over.
+    """
+    if isinstance(data, list):
+        return data, None
+    if isinstance(data, dict):
+        list_keys = [key for key, value in data.items() if isinstance(value, list)]
+        if list_keys:
+            rows_key = max(list_keys, key=lambda key: len(data[key]))
+            return data[rows_key], rows_key
+    return None, None
+
+
+def page_document(data, offset, limit):
+    """
+    One page of a report, shaped like the report itself.
+
+    Returns:
+        tuple: (page, total_rows), total_rows is None when the document has no rows.
+    """
+    rows, rows_key = report_rows(data)
+    if rows is None:
+        return data, None
+    page_rows = rows[offset:offset + limit]
+    if rows_key is None:
+        return page_rows, len(rows)
+    return {**data, rows_key: page_rows}, len(rows)
+
+
+def convert_to_table(data):
+    return json2html.convert(json=data)
+
+
+def _split_clubbed_table(html):
+    ''' (table start through <tbody>, the rows) of a json2html list-of-objects table, None for other shapes. '''
+    body_start = html.find('<tbody>')
+    if not html.startswith('<table') or body_start < 0 or not html.endswith('</tbody></table>'):
+        return None
+    body_start += len('<tbody>')
+    return html[:body_start], html[body_start:-len('</tbody></table>')]
+
+
+def iter_table_html(data, chunk_rows=STREAM_CHUNK_ROWS):
+    """
+    Html of a report, converted and yielded a chunk of rows at a time.
+
+    Consecutive chunks with the same columns continue one table, so the
+    streamed page looks like a single conversion of the rows.
+
+    Yields:
+        str: html fragments, concatenated they form the whole document.
+    """
+    rows, rows_key = report_rows(data)
+    if rows is None:
+        yield convert_to_table(data)
+        return
+    if rows_key is not None:
+        other_keys = {key: value for key, value in data.items() if key != rows_key}
+        if other_keys:
+            yield convert_to_table(other_keys)
+
+    open_table = None
+    for start in range(0, len(rows), chunk_rows):
+        html = convert_to_table(rows[start:start + chunk_rows])
+        parts = _split_clubbed_table(html)
+        if parts is not None and parts[0] == open_table:
+            yield parts[1]
+            continue
+        if open_table is not None:
+            yield '</tbody></table>'
+            open_table = None
+        if parts is not None:
+            open_table = parts[0]
+            yield parts[0] + parts[1]
+        else:
+            yield html
+    if open_table is not None:
+        yield '</tbody></table>'
@@ -0,0 +1,329 @@
+from contextlib import contextmanager
+import threading
+import atexit
+import bisect
+import fcntl
+import json
+import time
+import os
+
+
+''' per-phase timers and a small Prometheus registry (stdlib only).
+
+    with perf_metrics.phase('read_devices'):
+        ...
+
+    every phase is observed into the flask_infra_phase_duration_seconds
+    histogram and, when the current thread is serving a request (see
+    start_request_timings), also kept for that request's Server-Timing
+    header.  render_prometheus() writes the whole registry in the
+    Prometheus text format for /metrics.
+
+    every serving process (each gunicorn worker, the pre-render scheduler
+    process) publishes its registry into <metrics folder>/<pid>.metrics.json
+    (start_publisher) and /metrics merges them (read_process_files): counters
+    and histograms are summed, gauges keep the last value unless they were
+    set with merge='sum'.  the counters of a process that exited are folded
+    into retired.metrics.json, so the totals never go down.
+'''
+
+METRIC_PREFIX = 'flask_infra_'
+DEFAULT_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0]
+PHASE_HISTOGRAM = 'phase_duration_seconds'
+PROCESS_FILE_SUFFIX = '.metrics.json'
+RETIRED_FILE = 'retired.metrics.json'
+PUBLISH_SECONDS = 15
+
+_lock = threading.Lock()
+_metrics = {}
+_request_state = threading.local()
+_publisher = None
+
+
+def _label_key(labels):
+    return tuple(sorted((labels or {}).items()))
+
+
+def _metric(name, kind, help_text):
+    metric = _metrics.get(name)
+    if metric is None:
+        metric = {"kind": kind, "help": help_text, "series": {}}
+        _metrics[name] = metric
+    return metric
+
+
+def inc(name, amount=1, labels=None, help_text=''):
+    ''' counter, only ever goes up. '''
+    with _lock:
+        series = _metric(name, 'counter', help_text)["series"]
+        key = _label_key(labels)
+        series[key] = series.get(key, 0) + amount
+
+
+def set_counter(name, value, labels=None, help_text=''):
+    ''' mirror a counter kept elsewhere (e.g. ChartCache.stats()) into the registry. '''
+    with _lock:
+        _metric(name, 'counter', help_text)["series"][_label_key(labels)] = value
+
+
+def set_gauge(name, value, labels=None, help_text='', merge='last'):
+    ''' merge='sum' adds up the values of every process (e.g. open streams), 'last' keeps one (e.g. a shared cache's size). '''
+    with _lock:
+        metric = _metric(name, 'gauge', help_text)
+        metric["merge"] = merge
+        metric["series"][_label_key(labels)] = value
+
+
+def observe(name, value, labels=None, help_text='', buckets=DEFAULT_BUCKETS):
+    ''' histogram observation, bucket counts are stored non-cumulative and summed on render. '''
+    with _lock:
+        metric = _metric(name, 'histogram', help_text)
+        metric.setdefault("buckets", buckets)
+        key = _label_key(labels)
+        series = metric["series"].get(key)
+        if series is None:
+            series = {"counts": [0] * (len(metric["buckets"]) + 1), "sum": 0.0, "count": 0}
+            metric["series"][key] = series
+        series["counts"][bisect.bisect_left(metric["buckets"], value)] += 1
+        series["sum"] += value
+        series["count"] += 1
+
+
+def start_request_timings():
+    ''' called when a request starts on this thread, phases are collected until request_timings(). '''
+    _request_state.timings = []
+
+
+def request_timings():
+    ''' (phase, seconds) of the current request in the order they finished, and stop collecting. '''
+    timings = getattr(_request_state, 'timings', None) or []
+    _request_state.timings = None
+    return timings
+
+
+@contextmanager
+def phase(name, histogram=PHASE_HISTOGRAM):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        observe(histogram, elapsed, {"phase": name}, 'time spent per phase')
+        timings = getattr(_request_state, 'timings', None)
+        if timings is not None:
+            timings.append((name, elapsed))
+
+
+def server_timing_header(timings):
+    ''' Server-Timing value, repeated phases (e.g. per device) are summed into one entry. '''
+    totals = {}
+    for name, elapsed in timings:
+        totals[name] = totals.get(name, 0.0) + elapsed
+    return ', '.join(f'{name};dur={elapsed * 1000:.2f}' for name, elapsed in totals.items())
+
+
+def snapshot():
+    ''' copy of the registry, json serializable. '''
+    with _lock:
+        result = {}
+        for name, metric in _metrics.items():
+            copied = {k: v for k, v in metric.items() if k != "series"}
+            copied["series"] = [
+                [list(map(list, key)), json.loads(json.dumps(value))] for key, value in metric["series"].items()
+            ]
+            result[name] = copied
+        return result
+
+
+def _merge_into(saved, data):
+    ''' adds one snapshot() onto saved in place, values are copied so data is never modified. '''
+    for name, metric in data.items():
+        target = saved.setdefault(name, {k: v for k, v in metric.items() if k != "series"} | {"series": []})
+        existing = {json.dumps(key): value for key, value in target["series"]}
+        for key, value in metric["series"]:
+            current = existing.get(json.dumps(key))
+            if current is None:
+                existing[json.dumps(key)] = json.loads(json.dumps(value))
+            elif metric["kind"] == 'gauge':
+                existing[json.dumps(key)] = current + value if metric.get("merge") == 'sum' else value
+            elif metric["kind"] == 'counter':
+                existing[json.dumps(key)] = current + value
+            else:
+                current["counts"] = [a + b for a, b in zip(current["counts"], value["counts"])]
+                current["sum"] += value["sum"]
+                current["count"] += value["count"]
+        target["series"] = [[json.loads(key), value] for key, value in existing.items()]
+    return saved
+
+
+def merge_snapshots(*snapshots):
+    ''' one snapshot() shaped dict out of several, for 'last' gauges the later snapshot wins. '''
+    merged = {}
+    for data in snapshots:
+        _merge_into(merged, data)
+    return merged
+
+
+def _write_snapshot_file(snapshot_file, data):
+    tmp_file = f'{snapshot_file}.{os.getpid()}.tmp'
+    with open(tmp_file, 'w', encoding="utf-8") as f:
+        f.write(json.dumps(data))
+    os.replace(tmp_file, snapshot_file)
+
+
+def merge_snapshot_file(snapshot_file, data=None):
+    """
+    Adds this process' registry (or data, a snapshot()) onto the one saved
+    in snapshot_file.  Used by the ingest loop, which runs as its own
+    process, so /metrics can report its cumulative timings.  Without data
+    the registry is cleared once merged, so calling it again never counts
+    an observation twice.
+    """
+    if data is None:
+        data = snapshot()
+        with _lock:
+            _metrics.clear()
+    _write_snapshot_file(snapshot_file, _merge_into(read_snapshot_file(snapshot_file), data))
+
+
+def read_snapshot_file(snapshot_file):
+    try:
+        with open(snapshot_file, 'r', encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def write_process_file(metrics_folder):
+    ''' this process' whole registry into <metrics_folder>/<pid>.metrics.json, replaced on every call. '''
+    os.makedirs(metrics_folder, exist_ok=True)
+    _write_snapshot_file(os.path.join(metrics_folder, f'{os.getpid()}{PROCESS_FILE_SUFFIX}'), snapshot())
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _retire(metrics_folder, process_file):
+    ''' folds an exited process' counters and histograms into RETIRED_FILE, the rename lets only one reader do it. '''
+    claimed_file = f'{process_file}.{os.getpid()}.retiring'
+    try:
+        os.rename(process_file, claimed_file)
+    except FileNotFoundError:
+        return
+    data = {name: metric for name, metric in read_snapshot_file(claimed_file).items() if metric["kind"] != 'gauge'}
+    retired_file = os.path.join(metrics_folder, RETIRED_FILE)
+    with open(f'{retired_file}.lock', 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        merge_snapshot_file(retired_file, data)
+    os.remove(claimed_file)
+
+
+def read_process_files(metrics_folder):
+    """
+    Registries published by the other processes, plus the retired totals.
+    Files of processes that exited are retired on the way.
+
+    Returns:
+        list: snapshot() shaped dicts, this process' own file left out.
+    """
+    try:
+        names = sorted(os.listdir(metrics_folder))
+    except FileNotFoundError:
+        return []
+    snapshots = []
+    for name in names:
+        if not name.endswith(PROCESS_FILE_SUFFIX):
+            continue
+        process_file = os.path.join(metrics_folder, name)
+        if name == RETIRED_FILE:
+            snapshots.append(read_snapshot_file(process_file))
+            continue
+        try:
+            pid = int(name[:-len(PROCESS_FILE_SUFFIX)])
+        except ValueError:
+            continue
+        if pid == os.getpid():
+            continue
+        if _process_alive(pid):
+            snapshots.append(read_snapshot_file(process_file))
+        else:
+            _retire(metrics_folder, process_file)
+    return snapshots
+
+
+def start_publisher(metrics_folder, before_write=None, interval_seconds=PUBLISH_SECONDS):
+    """
+    Writes this process' registry (write_process_file) now, every
+    interval_seconds and once at exit, so /metrics of the other processes
+    includes it.
+
+    Args:
+        metrics_folder (str): folder shared by the processes of the host.
+        before_write (callable): called before every write, to mirror
+            stats kept elsewhere (cache counters, ...) into the registry.
+        interval_seconds (int): seconds between writes.
+
+    Returns:
+        threading.Thread: the publisher, one per process.
+    """
+    global _publisher
+    if _publisher is not None:
+        return _publisher
+    stopped = threading.Event()
+
+    def publish():
+        if before_write is not None:
+            before_write()
+        write_process_file(metrics_folder)
+
+    def publish_periodically():
+        while not stopped.wait(interval_seconds):
+            publish()
+
+    def publish_at_exit():
+        stopped.set()
+        publish()
+
+    publish()
+    _publisher = threading.Thread(target=publish_periodically, name='metrics-publisher', daemon=True)
+    _publisher.start()
+    atexit.register(publish_at_exit)
+    return _publisher
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{str(v)}"' for k, v in pairs) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_prometheus(*extra_snapshots):
+    ''' text exposition of this registry merged with any snapshot() shaped dicts (other processes, the ingest file). '''
+    lines = []
+    for name, metric in sorted(merge_snapshots(*extra_snapshots, snapshot()).items()):
+        full_name = f'{METRIC_PREFIX}{name}'
+        lines.append(f'# HELP {full_name} {metric.get("help") or name}')
+        lines.append(f'# TYPE {full_name} {metric["kind"]}')
+        for key, value in metric["series"]:
+            pairs = [tuple(pair) for pair in key]
+            if metric["kind"] != 'histogram':
+                lines.append(f'{full_name}{_format_labels(pairs)} {_format_value(value)}')
+                continue
+            cumulative = 0
+            for bound, count in zip(metric["buckets"] + ['+Inf'], value["counts"]):
+                cumulative += count
+                lines.append(f'{full_name}_bucket{_format_labels(pairs + [("le", bound)])} {cumulative}')
+            lines.append(f'{full_name}_sum{_format_labels(pairs)} {_format_value(value["sum"])}')
+            lines.append(f'{full_name}_count{_format_labels(pairs)} {value["count"]}')
+    return '\n'.join(lines) + '\n'
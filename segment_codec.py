@@ -0,0 +1,214 @@
+import numpy as np
+import struct
+import json
+
+
+''' compressed format for cold (closed) day segments.
+
+    Gorilla-style column encodings, on byte-aligned varints instead of bit
+    packing so that encoding and decoding stay vectorized in numpy:
+
+        dod      timestamps: first value, first delta, then delta-of-delta,
+                 a regular sampling interval costs one byte per sample
+        delta    int64 metrics (process_count): first value, then deltas
+        fixed2   float64 metrics that are exact 2-decimal values (what the
+                 generators and collectors produce): value * 100 as int, delta encoded
+        xor      any other float64: each value's bits xor the previous value's
+                 bits, repeats and near-repeats cost a byte or two
+
+    every signed stream is zigzag mapped before it is varint encoded.
+
+    file layout (segment.gor):
+        MAGIC, uint32 header length, json header, column blocks
+
+    the header lists every block of BLOCK_SAMPLES rows with its first / last
+    timestamp and the byte range of each column, blocks are self-contained,
+    so a window read only decodes the blocks it overlaps.
+'''
+
+MAGIC = b'FIMSEG1\n'
+BLOCK_SAMPLES = 512
+FIXED_SCALE = 100
+
+_HEADER_LENGTH = struct.Struct('<I')
+
+
+def _zigzag(values):
+    values = values.astype(np.int64)
+    return ((values << np.int64(1)) ^ (values >> np.int64(63))).view(np.uint64)
+
+
+def _unzigzag(values):
+    return (values >> np.uint64(1)).view(np.int64) ^ -(values & np.uint64(1)).view(np.int64)
+
+
+def _varint_encode(values):
+    ''' uint64 array -> LEB128 bytes, 7 bits per byte, high bit set on every byte but the last. '''
+    values = values.astype(np.uint64)
+    if len(values) == 0:
+        return b''
+    lengths = np.ones(len(values), dtype=np.int64)
+    rest = values >> np.uint64(7)
+    while rest.any():
+        lengths += rest > 0
+        rest >>= np.uint64(7)
+    offsets = np.cumsum(lengths) - lengths
+    out = np.empty(int(lengths.sum()), dtype=np.uint8)
+    for k in range(int(lengths.max())):
+        has_byte = lengths > k
+        chunk = ((values[has_byte] >> np.uint64(7 * k)) & np.uint64(0x7f)).astype(np.uint8)
+        more = (lengths[has_byte] > k + 1).astype(np.uint8) << np.uint8(7)
+        out[offsets[has_byte] + k] = chunk | more
+    return out.tobytes()
+
+
+def _varint_decode(data, count):
+    buf = np.frombuffer(data, dtype=np.uint8)
+    ends = np.flatnonzero(buf < 0x80)[:count]
+    starts = np.empty_like(ends)
+    if len(ends):
+        starts[0] = 0
+        starts[1:] = ends[:-1] + 1
+    lengths = ends - starts + 1
+    values = np.zeros(len(ends), dtype=np.uint64)
+    for k in range(int(lengths.max()) if len(lengths) else 0):
+        has_byte = lengths > k
+        values[has_byte] |= (buf[starts[has_byte] + k] & 0x7f).astype(np.uint64) << np.uint64(7 * k)
+    return values
+
+
+def column_codec(values, typecode):
+    ''' codec a column is stored with, see the module docstring. '''
+    if typecode == "q":
+        return "delta"
+    scaled = np.round(values * FIXED_SCALE)
+    if np.all(np.abs(scaled) < 2 ** 53) and np.array_equal(scaled / FIXED_SCALE, values):
+        return "fixed2"
+    return "xor"
+
+
+def encode_column(values, codec):
+    """
+    Args:
+        values (np.ndarray): int64 or float64 column.
+        codec (str): "dod", "delta", "fixed2" or "xor".
+
+    Returns:
+        bytes: the encoded column.
+    """
+    if codec == "xor":
+        bits = values.astype(np.float64).view(np.uint64)
+        previous = np.concatenate([np.zeros(1, dtype=np.uint64), bits[:-1]])
+        return _varint_encode(bits ^ previous)
+    if codec == "fixed2":
+        values = np.round(values * FIXED_SCALE).astype(np.int64)
+    values = values.astype(np.int64)
+    stream = np.diff(values, prepend=np.int64(0))
+    if codec == "dod" and len(stream) > 2:
+        stream[2:] = np.diff(stream[1:])
+    return _varint_encode(_zigzag(stream))
+
+
+def decode_column(data, codec, count):
+    if codec == "xor":
+        return np.bitwise_xor.accumulate(_varint_decode(data, count)).view(np.float64)
+    stream = _unzigzag(_varint_decode(data, count))
+    if codec == "dod" and len(stream) > 2:
+        stream[1:] = np.cumsum(stream[1:])
+    values = np.cumsum(stream)
+    if codec == "fixed2":
+        return values / FIXED_SCALE
+    return values
+
+
+def encode_segment(columns, typecodes, timestamp_column):
+    """
+    Encodes one segment.
+
+    Args:
+        columns (dict): column name -> sequence of values, all the same length.
+        typecodes (dict): column name -> "q" (int64) or "d" (float64).
+        timestamp_column (str): the sorted epoch column, stored with "dod".
+
+    Returns:
+        bytes: the whole segment file.
+    """
+    arrays = {
+        name: np.asarray(values, dtype=np.int64 if typecodes[name] == "q" else np.float64)
+        for name, values in columns.items()
+    }
+    timestamps = arrays[timestamp_column]
+    codecs = {
+        name: "dod" if name == timestamp_column else column_codec(values, typecodes[name])
+        for name, values in arrays.items()
+    }
+
+    blocks = []
+    chunks = []
+    offset = 0
+    for lo in range(0, len(timestamps), BLOCK_SAMPLES):
+        hi = min(lo + BLOCK_SAMPLES, len(timestamps))
+        block = {"first": int(timestamps[lo]), "last": int(timestamps[hi - 1]), "count": hi - lo, "offsets": {}}
+        for name, values in arrays.items():
+            encoded = encode_column(values[lo:hi], codecs[name])
+            block["offsets"][name] = [offset, len(encoded)]
+            chunks.append(encoded)
+            offset += len(encoded)
+        blocks.append(block)
+
+    header = {
+        "count": len(timestamps),
+        "first": int(timestamps[0]) if len(timestamps) else None,
+        "last": int(timestamps[-1]) if len(timestamps) else None,
+        "codecs": codecs,
+        "blocks": blocks,
+    }
+    header_bytes = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    return b''.join([MAGIC, _HEADER_LENGTH.pack(len(header_bytes)), header_bytes] + chunks)
+
+
+def read_header(data):
+    ''' (header, offset of the column blocks) of an encoded segment. '''
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError('not a compressed segment')
+    header_start = len(MAGIC) + _HEADER_LENGTH.size
+    (header_length,) = _HEADER_LENGTH.unpack(data[len(MAGIC):header_start])
+    header = json.loads(bytes(data[header_start:header_start + header_length]))
+    return header, header_start + header_length
+
+
+def decode_segment(data, wanted, timestamp_column, start=None, end=None):
+    """
+    Decodes the rows of a segment inside [start, end].
+
+    Args:
+        data (bytes): the segment file (bytes, mmap or memoryview).
+        wanted (list): columns to return besides the timestamps.
+        timestamp_column (str): name of the epoch column.
+        start (int): first epoch second to include, None for the beginning.
+        end (int): last epoch second to include, None for the end.
+
+    Returns:
+        dict: column name -> np.ndarray, only blocks overlapping the window are decoded.
+    """
+    header, data_start = read_header(data)
+    blocks = [
+        block for block in header["blocks"]
+        if (start is None or block["last"] >= start) and (end is None or block["first"] <= end)
+    ]
+    names = [timestamp_column] + [name for name in wanted if name != timestamp_column]
+    parts = {name: [] for name in names}
+    for block in blocks:
+        for name in names:
+            offset, length = block["offsets"][name]
+            chunk = data[data_start + offset:data_start + offset + length]
+            parts[name].append(decode_column(chunk, header["codecs"][name], block["count"]))
+
+    result = {}
+    for name in names:
+        dtype = np.int64 if header["codecs"][name] in ("dod", "delta") else np.float64
+        result[name] = np.concatenate(parts[name]) if parts[name] else np.empty(0, dtype=dtype)
+    timestamps = result[timestamp_column]
+    lo = 0 if start is None else int(np.searchsorted(timestamps, start, side='left'))
+    hi = len(timestamps) if end is None else int(np.searchsorted(timestamps, end, side='right'))
+    return {name: values[lo:hi] for name, values in result.items()}
@@ -0,0 +1,145 @@
+from shared_chart_cache import default_shared_cache_dir
+import multiprocessing
+import threading
+import argparse
+import signal
+import os
+
+
+''' production entry point.
+
+    python serve.py --workers 4 --threads 8 --bind 0.0.0.0:9999
+
+    runs the app under gunicorn (workers x threads) with the chart cache in
+    a shared folder (shared_chart_cache.SharedChartCache), so every worker
+    serves the same mmap'd copy of a chart.  the pre-render scheduler runs in
+    its own process, once per host, not once per worker.
+
+    kill -HUP <master pid> reloads gracefully: new workers start (with new
+    code), old ones finish their requests, and the chart cache stays warm
+    because it never lived in worker memory.
+    what does live in worker memory (inventory, rollup heads, device windows)
+    is snapshotted by every worker into a slot file of its own and read back
+    by the workers that replace them (warm_state.py); load() does it after
+    the fork, so the master and the scheduler process never touch it.
+
+    every worker and the scheduler process publish their metrics registry
+    into a folder every few seconds (perf_metrics.start_publisher), the
+    scheduler also its job status, so /metrics and /v1/prerender_status
+    answer for the whole host whichever worker gets the request.
+
+    a live chart stream (/v1/stream_chart) keeps a gthread thread for minutes,
+    --max-streams caps them per worker so the other threads keep serving.
+
+    without gunicorn installed it falls back to the threaded werkzeug server
+    in a single process.
+'''
+
+
+def run_prerender_process(workers):
+    ''' body of the scheduler process, spawned so it never inherits a server's threads or sockets. '''
+    import app
+    scheduler = app.start_prerender_scheduler(workers)
+    app.start_metrics_publisher()
+    stopped = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopped.set())
+    stopped.wait()
+    scheduler.stop()
+
+
+def start_prerender_process(workers):
+    ''' not a daemon process: the scheduler needs to start its own pool. '''
+    process = multiprocessing.get_context('spawn').Process(
+        target=run_prerender_process, args=(workers,), name='prerender')
+    process.start()
+    return process
+
+
+def gunicorn_application(options, prerender_workers):
+    from gunicorn.app.base import BaseApplication
+
+    class InfraMonitorApplication(BaseApplication):
+
+        def __init__(self):
+            self.prerender_process = None
+            super().__init__()
+
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+            self.cfg.set('when_ready', self.when_ready)
+            self.cfg.set('on_exit', self.on_exit)
+
+        def when_ready(self, server):
+            ''' master is up: start the scheduler once, HUP reloads leave it running. '''
+            if prerender_workers is not None and self.prerender_process is None:
+                self.prerender_process = start_prerender_process(prerender_workers or None)
+
+        def on_exit(self, server):
+            if self.prerender_process is not None:
+                self.prerender_process.terminate()
+                self.prerender_process.join(timeout=30)
+
+        def load(self):
+            ''' imported in each worker (no preload), so a HUP picks up new code. '''
+            import app
+            app.app.config["DEBUG"] = False
+            app.start_warm_state()
+            app.start_metrics_publisher()
+            return app.app
+
+    return InfraMonitorApplication()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="serve the app with multiple workers and a shared chart cache.")
+    parser.add_argument('--bind', default='0.0.0.0:9999', help="host:port to listen on")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument('--threads', type=int, default=8, help="threads per worker")
+    parser.add_argument('--max-streams', type=int, default=None, help="live chart streams per worker, half the threads by default")
+    parser.add_argument('--timeout', type=int, default=120, help="seconds before a silent worker is restarted")
+    parser.add_argument('--graceful-timeout', type=int, default=30, help="seconds old workers get to finish on reload / stop")
+    parser.add_argument('--cache-dir', default=default_shared_cache_dir(), help="shared chart cache folder (tmpfs recommended)")
+    parser.add_argument('--cache-mb', type=int, default=512, help="shared chart cache budget for the whole host")
+    parser.add_argument('--prerender-workers', type=int, default=0, help="pre-render pool size, 0 = every core")
+    parser.add_argument('--no-prerender', action='store_true', help="do not run the pre-render scheduler")
+    args = parser.parse_args()
+
+    ''' read by app.py at import, in every worker and in the scheduler process. '''
+    os.environ['SHARED_CHART_CACHE_DIR'] = args.cache_dir
+    os.environ['CHART_CACHE_MAX_MB'] = str(args.cache_mb)
+    ''' a live chart stream holds a worker thread for minutes, the rest answer requests. '''
+    os.environ['STREAM_MAX_OPEN'] = str(args.max_streams if args.max_streams is not None else max(1, args.threads // 2))
+    os.makedirs(args.cache_dir, exist_ok=True)
+    prerender_workers = None if args.no_prerender else args.prerender_workers
+
+    try:
+        import gunicorn
+    except ImportError:
+        gunicorn = None
+
+    if gunicorn is None:
+        print('gunicorn is not installed, serving from one threaded werkzeug process.')
+        import app
+        app.app.config["DEBUG"] = False
+        app.start_warm_state()
+        app.start_metrics_publisher()
+        if prerender_workers is not None:
+            app.start_prerender_scheduler(prerender_workers or None)
+        host, port = args.bind.rsplit(':', 1)
+        app.app.run(host=host, port=int(port), threaded=True, debug=False, use_reloader=False)
+        return
+
+    gunicorn_application({
+        'bind': args.bind,
+        'workers': args.workers,
+        'threads': args.threads,
+        'worker_class': 'gthread',
+        'timeout': args.timeout,
+        'graceful_timeout': args.graceful_timeout,
+        'preload_app': False,
+    }, prerender_workers).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+import threading
+import tempfile
+import hashlib
+import fcntl
+import json
+import mmap
+import os
+
+
+def default_shared_cache_dir():
+    ''' tmpfs when the host has one, so cached charts live in shared memory rather than on disk. '''
+    base = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(base, 'flask_infra_monitor-charts')
+
+
+class SharedChartCache:
+    """
+    Chart payload cache shared by every worker process of one host.
+
+    Same interface as ChartCache, but each payload (encoding -> bytes) is a
+    set of files in a shared folder, normally on /dev/shm.  Workers memory
+    map those files instead of reading them, so all of them serve the same
+    page-cache pages and a chart is held in RAM once per host, not once per
+    worker.  A flock per chart makes builds single-flight across processes
+    and threads alike, and because nothing lives in worker memory a
+    graceful reload starts new workers on a warm cache.
+
+    Files per chart, <chart> being a hash of the key without its data version:
+        <chart>--<version>.key.json      the full key (for invalidate) and its encodings
+        <chart>--<version>.<encoding>    one body per encoding
+        .locks/<chart>.lock              build lock, one per chart so the folder stays bounded
+
+    Args:
+        max_bytes (int): budget for the folder, the least recently used
+            charts are deleted once the bodies add up to more than this.
+        cache_dir (str): shared folder, default_shared_cache_dir() by default.
+        size_fn (callable): unused, accepted for ChartCache compatibility.
+    """
+
+    KEY_SUFFIX = '.key.json'
+
+    def __init__(self, max_bytes, cache_dir=None, size_fn=None):
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir or default_shared_cache_dir()
+        self.lock_dir = os.path.join(self.cache_dir, '.locks')
+        os.makedirs(self.lock_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.builds = 0
+        self.evictions = 0
+
+    def _entry_base(self, key):
+        chart_digest = hashlib.sha1(repr(key[:-1]).encode('utf-8')).hexdigest()[:20]
+        version_digest = hashlib.sha1(repr(key[-1]).encode('utf-8')).hexdigest()[:12]
+        return f'{chart_digest}--{version_digest}'
+
+    def _read(self, key):
+        ''' encoding -> read-only mmap of the body, None when the chart is not cached. '''
+        entry_base = self._entry_base(key)
+        key_file = os.path.join(self.cache_dir, entry_base + self.KEY_SUFFIX)
+        entry = self._read_key_file(key_file)
+        if entry is None:
+            return None
+        payload = {}
+        for encoding in entry["encodings"]:
+            try:
+                with open(os.path.join(self.cache_dir, f'{entry_base}.{encoding}'), 'rb') as f:
+                    payload[encoding] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError):
+                ''' evicted by another worker meanwhile, or an empty body. '''
+                return None
+        if 'identity' not in payload:
+            return None
+        ''' mtime is the recency the eviction goes by. '''
+        try:
+            os.utime(key_file)
+        except OSError:
+            pass
+        return payload
+
+    def _read_key_file(self, key_file):
+        try:
+            with open(key_file, 'r', encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def get(self, key):
+        payload = self._read(key)
+        if payload is not None:
+            with self._lock:
+                self.hits += 1
+        return payload
+
+    def put(self, key, value):
+        ''' bodies first, key file last: a chart is only visible once it is complete. '''
+        entry_base = self._entry_base(key)
+        chart_digest = entry_base.split('--')[0]
+        for encoding, body in value.items():
+            self._write_atomic(os.path.join(self.cache_dir, f'{entry_base}.{encoding}'), body)
+        entry = {"key": list(key), "encodings": list(value)}
+        self._write_atomic(os.path.join(self.cache_dir, entry_base + self.KEY_SUFFIX), json.dumps(entry).encode('utf-8'))
+
+        ''' older data versions of the same chart are unreachable now. '''
+        for file_name in os.listdir(self.cache_dir):
+            if file_name.startswith(chart_digest + '--') and not file_name.startswith(entry_base + '.'):
+                self._unlink(file_name)
+        self._evict()
+
+    def get_or_build(self, key, build_fn):
+        """
+        Returns the cached payload for key, building it at most once per host.
+        Waiters block on the chart's flock and read what the builder stored.
+        """
+        payload = self._read(key)
+        if payload is not None:
+            with self._lock:
+                self.hits += 1
+            return payload
+
+        lock_file = os.path.join(self.lock_dir, self._entry_base(key).split('--')[0] + '.lock')
+        with open(lock_file, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                payload = self._read(key)
+                if payload is not None:
+                    with self._lock:
+                        self.coalesced += 1
+                    return payload
+                with self._lock:
+                    self.misses += 1
+                value = build_fn()
+                self.put(key, value)
+                with self._lock:
+                    self.builds += 1
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+        return self._read(key) or value
+
+    def invalidate(self, key_prefix=()):
+        ''' drop every chart whose key starts with key_prefix (all of them by default). '''
+        for file_name in os.listdir(self.cache_dir):
+            if not file_name.endswith(self.KEY_SUFFIX):
+                continue
+            entry = self._read_key_file(os.path.join(self.cache_dir, file_name))
+            if entry is None:
+                continue
+            key = tuple(entry["key"])
+            if key[:len(key_prefix)] == tuple(key_prefix):
+                self._remove_entry(file_name[:-len(self.KEY_SUFFIX)])
+
+    def snapshot(self):
+        ''' nothing to snapshot, the entries already outlive the worker processes. '''
+        return []
+
+    def restore(self, entries):
+        return 0
+
+    def stats(self):
+        entries, total_bytes = self._scan()
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                'entries': len(entries),
+                'bytes': total_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'builds': self.builds,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+    def _scan(self):
+        ''' entry base -> (last use, bytes), and the bytes of every body together. '''
+        entries = {}
+        sizes = {}
+        for file_name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, file_name)
+            try:
+                file_stat = os.stat(path)
+            except OSError:
+                continue
+            if file_name.endswith(self.KEY_SUFFIX):
+                entries[file_name[:-len(self.KEY_SUFFIX)]] = file_stat.st_mtime
+            elif '--' in file_name and not file_name.endswith('.tmp'):
+                entry_base = file_name.split('.')[0]
+                sizes[entry_base] = sizes.get(entry_base, 0) + file_stat.st_size
+        result = {base: (used, sizes.get(base, 0)) for base, used in entries.items()}
+        return result, sum(size for _, size in result.values())
+
+    def _evict(self):
+        entries, total_bytes = self._scan()
+        for entry_base, (_, size) in sorted(entries.items(), key=lambda item: item[1][0]):
+            if total_bytes <= self.max_bytes:
+                break
+            self._remove_entry(entry_base)
+            total_bytes -= size
+            with self._lock:
+                self.evictions += 1
+
+    def _remove_entry(self, entry_base):
+        ''' key file first so readers stop finding the chart, mapped bodies stay valid for whoever holds them. '''
+        self._unlink(entry_base + self.KEY_SUFFIX)
+        for file_name in os.listdir(self.cache_dir):
+            if file_name.startswith(entry_base + '.'):
+                self._unlink(file_name)
+
+    def _unlink(self, file_name):
+        try:
+            os.remove(os.path.join(self.cache_dir, file_name))
+        except FileNotFoundError:
+            pass
+
+    def _write_atomic(self, path, body):
+        tmp_file = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_file, 'wb') as f:
+            f.write(body)
+        os.replace(tmp_file, path)
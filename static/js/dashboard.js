@@ -0,0 +1,305 @@
+// Chart construction for the generated performance dashboards.
+// Loaded once by performance_charts.html and cached by the browser, the dashboards
+// themselves only carry their columnar data and call InfraDashboard.render().
+//
+// chart data (see performance_chart_generator.rows_to_chart_data):
+//     servers     device names, legend order
+//     colors      one color per server
+//     metrics     metric names, one chart each
+//     axes        metric -> {unit, min, max}
+//     timestamps  epoch seconds shared by every series
+//     series      server -> metric -> values aligned to timestamps, null where the server has no point
+//
+// rendering budget:
+//     the timestamp axis is parsed once and every series becomes {x, y} points on it when
+//         its chart is built, handed to Chart.js as is (parsing: false) so it can decimate them
+//     a chart is only built when its card scrolls near the viewport (IntersectionObserver)
+//     above POINT_BUDGET points per chart the lines are straight, without point markers
+//         or animations, and Chart.js decimates every line to the canvas width (LTTB)
+
+var InfraDashboard = (function () {
+
+    var POINT_BUDGET = 2000;
+    var LAZY_MARGIN = '200px';
+
+    // one formatter for every tick and tooltip, toLocaleTimeString builds a new one per call
+    var timeFormat = new Intl.DateTimeFormat('en-US', {
+        hour: '2-digit',
+        minute: '2-digit',
+        second: '2-digit'
+    });
+
+    function formatTime(epochMs) {
+        return timeFormat.format(epochMs);
+    }
+
+    function chartOptions(axis, heavy) {
+        var y = {
+            grid: {
+                color: '#f0f0f0'
+            },
+            ticks: {
+                callback: value => value + axis.unit
+            }
+        };
+        if (axis.min !== undefined) {
+            y.min = axis.min;
+        }
+        if (axis.max !== undefined) {
+            y.max = axis.max;
+        }
+        var options = {
+            responsive: true,
+            maintainAspectRatio: false,
+            parsing: false,
+            normalized: true,
+            interaction: {
+                intersect: false,
+                mode: 'nearest',
+                axis: 'x'
+            },
+            plugins: {
+                decimation: {
+                    enabled: true,
+                    algorithm: 'lttb'
+                },
+                legend: {
+                    display: true,
+                    position: 'top'
+                },
+                tooltip: {
+                    callbacks: {
+                        title: items => items.length ? formatTime(items[0].parsed.x) : ''
+                    }
+                }
+            },
+            scales: {
+                x: {
+                    type: 'linear',
+                    ticks: {
+                        callback: value => formatTime(value)
+                    },
+                    grid: {
+                        color: '#f0f0f0'
+                    }
+                },
+                y: y
+            }
+        };
+        if (heavy) {
+            options.animation = false;
+        }
+        return options;
+    }
+
+    // {x, y} points of one series on the shared axis, servers without a point are skipped (spanGaps)
+    function seriesPoints(axis, values) {
+        var points = [];
+        for (var i = 0; i < values.length; i++) {
+            if (values[i] !== null) {
+                points.push({x: axis[i], y: values[i]});
+            }
+        }
+        return points;
+    }
+
+    // a metric's points are only built once its chart (or a live update) needs them
+    function metricPoints(state, metric) {
+        if (!state.points[metric]) {
+            state.points[metric] = state.servers.map(serverName => seriesPoints(state.axis, state.series[serverName][metric] || []));
+        }
+        return state.points[metric];
+    }
+
+    function createDatasets(state, metric) {
+        var points = metricPoints(state, metric);
+        return state.servers.map((serverName, index) => {
+            var color = state.colors[index];
+            return {
+                label: serverName,
+                data: points[index],
+                spanGaps: true,
+                borderColor: color,
+                backgroundColor: color + '20',
+                borderWidth: state.heavy ? 1 : 2,
+                tension: state.heavy ? 0 : 0.4,
+                pointBackgroundColor: color,
+                pointBorderColor: '#fff',
+                pointBorderWidth: 2,
+                pointRadius: state.heavy ? 0 : 4
+            };
+        });
+    }
+
+    function buildChart(state, metric) {
+        if (state.charts[metric]) {
+            return;
+        }
+        var canvas = state.root.querySelector('canvas[data-metric="' + metric + '"]');
+        state.charts[metric] = new Chart(canvas, {
+            type: 'line',
+            data: {
+                datasets: createDatasets(state, metric)
+            },
+            options: chartOptions(state.axes[metric], state.heavy)
+        });
+    }
+
+    function buildWhenVisible(state) {
+        if (!('IntersectionObserver' in window)) {
+            state.metrics.forEach(metric => buildChart(state, metric));
+            return;
+        }
+        var observer = new IntersectionObserver(entries => {
+            entries.forEach(entry => {
+                if (entry.isIntersecting) {
+                    observer.unobserve(entry.target);
+                    buildChart(state, entry.target.getAttribute('data-metric'));
+                }
+            });
+        }, {rootMargin: LAZY_MARGIN});
+        state.metrics.forEach(metric => {
+            observer.observe(state.root.querySelector('canvas[data-metric="' + metric + '"]'));
+        });
+    }
+
+    function updateStats(state) {
+        var totalPoints = 0;
+        var oldestMs = Infinity;
+        var firstMetric = state.metrics[0];
+        if (firstMetric !== undefined) {
+            metricPoints(state, firstMetric).forEach(points => {
+                totalPoints += points.length;
+                if (points.length > 0) {
+                    oldestMs = Math.min(oldestMs, points[0].x);
+                }
+            });
+        }
+        state.root.querySelector('[data-stat="dataPoints"]').textContent = totalPoints;
+        if (totalPoints > 0) {
+            var minutes = Math.round((state.newestMs - oldestMs) / 1000 / 60);
+            state.root.querySelector('[data-stat="timeRange"]').textContent = minutes + ' min';
+        }
+    }
+
+    // Sets the point at x, in place so charts already built keep the same array
+    function insertPoint(points, x, y) {
+        var lo = points.length;
+        if (lo > 0 && points[lo - 1].x >= x) {
+            var hi = lo;
+            lo = 0;
+            while (lo < hi) {
+                var mid = (lo + hi) >> 1;
+                if (points[mid].x < x) {
+                    lo = mid + 1;
+                } else {
+                    hi = mid;
+                }
+            }
+            if (points[lo].x === x) {
+                points[lo].y = y;
+                return;
+            }
+        }
+        points.splice(lo, 0, {x: x, y: y});
+    }
+
+    function appendPoints(state, delta) {
+        Object.keys(delta.devices).forEach(serverName => {
+            var serverIndex = state.servers.indexOf(serverName);
+            if (serverIndex < 0) {
+                return;
+            }
+            var columns = delta.devices[serverName];
+            columns.timestamp.forEach((timestamp, i) => {
+                var x = timestamp * 1000;
+                state.newestMs = Math.max(state.newestMs, x);
+                state.metrics.forEach(metric => {
+                    if (columns[metric] && columns[metric][i] !== null) {
+                        insertPoint(metricPoints(state, metric)[serverIndex], x, columns[metric][i]);
+                    }
+                });
+            });
+        });
+
+        // drop what aged out of the window
+        var cutoff = state.newestMs - state.windowMs;
+        state.metrics.forEach(metric => {
+            metricPoints(state, metric).forEach(points => {
+                var aged = 0;
+                while (aged < points.length && points[aged].x < cutoff) {
+                    aged++;
+                }
+                if (aged > 0) {
+                    points.splice(0, aged);
+                }
+            });
+        });
+        Object.keys(state.charts).forEach(metric => state.charts[metric].update('none'));
+        updateStats(state);
+    }
+
+    function lastSampleEpoch(chartData) {
+        // oldest "newest point" over the servers, the stream resends from there
+        var since = Infinity;
+        chartData.servers.forEach(serverName => {
+            var values = chartData.series[serverName][chartData.metrics[0]] || [];
+            for (var i = values.length - 1; i >= 0; i--) {
+                if (values[i] !== null) {
+                    since = Math.min(since, chartData.timestamps[i]);
+                    break;
+                }
+            }
+        });
+        return since;
+    }
+
+    function startLiveUpdates(state, chartData, streamUrl) {
+        // one live stream per page, a newly loaded dashboard replaces the previous one
+        if (window.liveChartStream) {
+            window.liveChartStream.close();
+        }
+        var since = lastSampleEpoch(chartData);
+        var stream = new EventSource(streamUrl + (isFinite(since) ? '&since=' + since : ''));
+        window.liveChartStream = stream;
+        stream.addEventListener('points', event => {
+            if (!document.body.contains(state.root)) {
+                stream.close();  // dashboard was replaced
+                return;
+            }
+            appendPoints(state, JSON.parse(event.data));
+        });
+    }
+
+    function render(dataId, options) {
+        var chartData = JSON.parse(document.getElementById(dataId).textContent);
+        var axis = chartData.timestamps.map(timestamp => timestamp * 1000);  // one parsed axis for every chart
+        var state = {
+            root: document.getElementById(dataId + '-dashboard'),
+            servers: chartData.servers,
+            colors: chartData.colors,
+            metrics: chartData.metrics,
+            axes: chartData.axes,
+            axis: axis,
+            series: chartData.series,
+            heavy: chartData.servers.length * axis.length > POINT_BUDGET,
+            windowMs: options.hourLimit * 3600 * 1000,
+            newestMs: axis.length > 0 ? axis[axis.length - 1] : -Infinity,
+            points: {},
+            charts: {}
+        };
+        buildWhenVisible(state);
+        updateStats(state);
+
+        if (options.streamUrl) {
+            startLiveUpdates(state, chartData, options.streamUrl);
+        }
+        return state;
+    }
+
+    return {
+        render: render,
+        formatTime: formatTime,
+        POINT_BUDGET: POINT_BUDGET
+    };
+})();
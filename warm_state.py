@@ -0,0 +1,188 @@
+import fast_json
+import hashlib
+import struct
+import fcntl
+import glob
+import time
+import os
+
+
+''' warm restart: the app's in-memory state in one snapshot file, read back at startup.
+
+    layout:
+        MAGIC, uint32 header length, json header, bodies
+
+    the header holds every section's state as json, bytes values (prepared
+    response bodies) are moved into the body area and replaced by
+    {"$body": [offset, length]}, so loading is one sequential read and one
+    json parse.
+
+    nothing is trusted on load: every section is validated lazily by the
+    owner of the state the way it validates its live state anyway (the
+    inventory by devices.json's stat, rollup heads by heads.json's stat,
+    cache entries by the data version at the end of their keys).  sections
+    holding rendered output are only restored when the code that rendered
+    them is unchanged (code_stamp of RENDER_SOURCES).
+
+    every serving process writes its own slot file (<name>.<slot>.snapshot),
+    a slot is held by a flock for the life of the process, so workers never
+    overwrite each other and a restarted worker takes over a free one.  a new
+    process reads every slot file back, newest first.
+'''
+
+MAGIC = b'FIMWARM1\n'
+SNAPSHOT_FORMAT = 1
+RENDER_SOURCES = [
+    'chart_builder.py',
+    'performance_chart_generator.py',
+    'fleet_aggregate.py',
+    'json_reports.py',
+    'http_cache.py',
+    os.path.join('templates', 'chart_dashboard.html'),
+]
+
+_HEADER_LENGTH = struct.Struct('<I')
+_BODY_KEY = '$body'
+
+
+def code_stamp(sources=RENDER_SOURCES):
+    ''' hash of the files rendered payloads depend on, a deploy that changes one of them drops those sections. '''
+    base_folder = os.path.dirname(os.path.abspath(__file__))
+    digest = hashlib.sha1()
+    for source in sources:
+        try:
+            with open(os.path.join(base_folder, source), 'rb') as f:
+                digest.update(f.read())
+        except FileNotFoundError:
+            digest.update(b'-')
+    return digest.hexdigest()[:16]
+
+
+def slot_file(snapshot_file, slot):
+    base, extension = os.path.splitext(snapshot_file)
+    return f'{base}.{slot}{extension}'
+
+
+def claim_slot(snapshot_file):
+    """
+    Takes the lowest slot no live process holds.
+
+    Returns:
+        tuple: (slot file, open lock file), the slot is held until the lock
+            file is closed or the process exits.
+    """
+    slot = 0
+    while True:
+        path = slot_file(snapshot_file, slot)
+        lock = open(f'{path}.lock', 'a')
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return path, lock
+        except BlockingIOError:
+            lock.close()
+            slot += 1
+
+
+def slot_files(snapshot_file):
+    ''' every slot's snapshot, whichever process wrote it. '''
+    base, extension = os.path.splitext(snapshot_file)
+    return sorted(glob.glob(f'{glob.escape(base)}.[0-9]*{extension}'))
+
+
+def as_key(value):
+    ''' json turns tuples into lists, cache keys need them back as (hashable) tuples. '''
+    if isinstance(value, list):
+        return tuple(as_key(item) for item in value)
+    return value
+
+
+def _pack(value, bodies, offset):
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        body = bytes(value)
+        bodies.append(body)
+        packed = {_BODY_KEY: [offset[0], len(body)]}
+        offset[0] += len(body)
+        return packed
+    if isinstance(value, dict):
+        return {key: _pack(item, bodies, offset) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_pack(item, bodies, offset) for item in value]
+    return value
+
+
+def _unpack(value, body_area):
+    if isinstance(value, dict):
+        if len(value) == 1 and _BODY_KEY in value:
+            offset, length = value[_BODY_KEY]
+            return bytes(body_area[offset:offset + length])
+        return {key: _unpack(item, body_area) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_unpack(item, body_area) for item in value]
+    return value
+
+
+def save_snapshot(snapshot_file, sections, stamp):
+    """
+    Writes every section into snapshot_file, atomically (temp file + rename).
+
+    Args:
+        snapshot_file (str): path of the snapshot.
+        sections (dict): section name -> json-able state, bytes allowed anywhere.
+        stamp (str): code_stamp() of the process writing it.
+
+    Returns:
+        int: bytes written.
+    """
+    bodies = []
+    offset = [0]
+    header = {
+        "format": SNAPSHOT_FORMAT,
+        "created_at": time.time(),
+        "code_stamp": stamp,
+        "sections": {name: _pack(state, bodies, offset) for name, state in sections.items()},
+    }
+    header_bytes = fast_json.dumps_bytes(header)
+    tmp_file = f'{snapshot_file}.{os.getpid()}.tmp'
+    with open(tmp_file, 'wb') as f:
+        f.write(MAGIC)
+        f.write(_HEADER_LENGTH.pack(len(header_bytes)))
+        f.write(header_bytes)
+        for body in bodies:
+            f.write(body)
+        written = f.tell()
+    os.replace(tmp_file, snapshot_file)
+    return written
+
+
+def load_snapshots(snapshot_file):
+    ''' the usable snapshot of every slot, newest first. '''
+    snapshots = [load_snapshot(path) for path in slot_files(snapshot_file)]
+    return sorted((snapshot for snapshot in snapshots if snapshot is not None), key=lambda snapshot: -snapshot["created_at"])
+
+
+def load_snapshot(snapshot_file):
+    """
+    Reads a snapshot back.
+
+    Returns:
+        dict: "created_at", "code_stamp" and "sections" (name -> state),
+            None when there is no usable snapshot.
+    """
+    try:
+        with open(snapshot_file, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    header_start = len(MAGIC) + _HEADER_LENGTH.size
+    if data[:len(MAGIC)] != MAGIC or len(data) < header_start:
+        return None
+    (header_length,) = _HEADER_LENGTH.unpack(data[len(MAGIC):header_start])
+    try:
+        header = fast_json.loads(data[header_start:header_start + header_length])
+    except ValueError:
+        return None
+    if header.get("format") != SNAPSHOT_FORMAT:
+        return None
+    body_area = memoryview(data)[header_start + header_length:]
+    header["sections"] = {name: _unpack(state, body_area) for name, state in header["sections"].items()}
+    return header